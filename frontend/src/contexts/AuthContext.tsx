@@ -1,6 +1,7 @@
 import React, { createContext, useContext, useEffect, useState, useRef, useCallback } from "react";
 import { signIn, signUp, signOut, getCurrentUser, confirmSignUp as amplifyConfirmSignUp, resendSignUpCode, resetPassword as amplifyResetPassword, confirmResetPassword, fetchAuthSession, updateUserAttribute, setUpTOTP, verifyTOTPSetup, confirmSignIn, fetchUserAttributes } from "aws-amplify/auth";
 import { jwtDecode } from "jwt-decode";
+import { fileService } from "@/services/fileService";
 
 export type UserRole = "Admin" | "Editor" | "Viewer";
 
@@ -94,6 +95,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const autoLogout = useCallback(async () => {
     try {
       await signOut();
+      fileService.clearListCache();
       setUser(null);
       
       // Show logout notification
@@ -443,7 +445,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       for (let i = 0; i < 3; i++) {
         try {
           const { userService } = await import("@/services/userService");
-          const mfaStatus = await userService.checkMFAStatus();
+          const mfaStatus = await userService.checkMFAStatus(true);
           console.log(`🔍 MFA Status check (attempt ${i + 1}):`, mfaStatus);
           
           if (mfaStatus.mfaEnabled) {
@@ -690,6 +692,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const logout = async () => {
     try {
       await signOut();
+      fileService.clearListCache();
       setUser(null);
     } catch (error: any) {
       throw new Error(error.message || "Logout failed");
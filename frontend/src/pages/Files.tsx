@@ -5,6 +5,13 @@ import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Input } from "@/components/ui/input";
+import {
+  Select,
+  SelectContent,
+  SelectItem,
+  SelectTrigger,
+  SelectValue,
+} from "@/components/ui/select";
 import {
   Table,
   TableBody,
@@ -80,6 +87,7 @@ const Files = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState("");
+  const [sortOrder, setSortOrder] = useState<"desc" | "asc">("desc");
   const [expandedFolders, setExpandedFolders] = useState<Set<string>>(new Set());
   const { toast } = useToast();
 
@@ -274,14 +282,12 @@ const Files = () => {
       setLoading(true);
       setError(null);
       
-      // Load files first
-      const filesResponse = await fileService.listFiles();
+      // Filename prefix and sort order are applied by the backend
+      const filesResponse = await fileService.listFiles({
+        name: searchTerm.trim() || undefined,
+        order: sortOrder,
+      });
       setFiles(filesResponse.files || []);
-      
-      // Only load users for Admins (they need it for user management UI)
-      if (user?.role === "Admin") {
-        await loadUsers();
-      }
     } catch (err: any) {
       setError(err.message);
       toast({
@@ -295,9 +301,18 @@ const Files = () => {
   };
 
   useEffect(() => {
-    loadFiles();
+    // Only load users for Admins (they need it for user management UI)
+    if (user?.role === "Admin") {
+      loadUsers();
+    }
   }, []);
 
+  useEffect(() => {
+    // Wait for typing to pause before asking the backend again
+    const timer = setTimeout(loadFiles, searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, sortOrder]);
+
   const handleDownload = async (file: FileInfo) => {
     try {
       if (!file.key && !file.fileId) {
@@ -360,11 +375,8 @@ const Files = () => {
     }
   };
 
-  // Apply role-based filtering first, then search filtering
-  const roleFilteredFiles = getFilteredFiles(files);
-  const filteredFiles = roleFilteredFiles.filter(file =>
-    file.fileName?.toLowerCase().includes(searchTerm.toLowerCase()) ?? false
-  );
+  // Search is applied server-side; only role-based filtering remains here
+  const filteredFiles = getFilteredFiles(files);
   
   // Group files by owner for display
   const groupedFiles = groupFilesByOwner(filteredFiles);
@@ -543,12 +555,21 @@ const Files = () => {
               <div className="relative flex-1">
                 <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 text-muted-foreground h-4 w-4" />
                 <Input
-                  placeholder="Search files..."
+                  placeholder="Search files by name prefix..."
                   value={searchTerm}
                   onChange={(e) => setSearchTerm(e.target.value)}
                   className="pl-10"
                 />
               </div>
+              <Select value={sortOrder} onValueChange={(value) => setSortOrder(value as "desc" | "asc")}>
+                <SelectTrigger className="w-full sm:w-40 shrink-0">
+                  <SelectValue />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value="desc">Newest first</SelectItem>
+                  <SelectItem value="asc">Oldest first</SelectItem>
+                </SelectContent>
+              </Select>
               <Button onClick={loadFiles} variant="outline" className="w-full sm:w-auto shrink-0">
                 Refresh
               </Button>
@@ -0,0 +1,126 @@
+import { fetchAuthSession } from "aws-amplify/auth";
+import axios from "axios";
+
+const API_ENDPOINT = import.meta.env.VITE_API_ENDPOINT;
+
+export interface AuditEvent {
+  auditId: string;
+  eventType: string;
+  timestamp: string;
+  status?: string;
+  actorUserId?: string;
+  actorEmail?: string;
+  targetUserId?: string;
+  fileId?: string;
+  ipAddress?: string;
+  details?: Record<string, unknown>;
+}
+
+// At least one of actor, target or eventType is required (the API never scans)
+export interface AuditFilters {
+  actor?: string;
+  target?: string;
+  eventType?: string;
+  from?: string; // ISO date or timestamp
+  to?: string;   // ISO date (inclusive) or timestamp
+  order?: 'asc' | 'desc';
+}
+
+export interface AuditPageQuery extends AuditFilters {
+  limit?: number;
+  cursor?: string | null;
+}
+
+export interface AuditPage {
+  events: AuditEvent[];
+  count: number;
+  nextCursor: string | null;
+}
+
+export interface AuditExportPart {
+  records: number;
+  bytes: number;
+  url: string; // presigned, gzipped NDJSON
+}
+
+export interface AuditExportStatus {
+  exportId: string;
+  status: 'RUNNING' | 'COMPLETE';
+  filters?: AuditFilters;
+  createdAt?: string;
+  updatedAt?: string;
+  records?: number;
+  lastError?: string | null;
+  parts?: AuditExportPart[];
+}
+
+class AuditService {
+  private async getAuthToken(): Promise<string> {
+    const session = await fetchAuthSession();
+    const token = session.tokens?.idToken?.toString();
+    if (!token) {
+      throw new Error("No authentication token available");
+    }
+    return token;
+  }
+
+  async queryPage(query: AuditPageQuery): Promise<AuditPage> {
+    try {
+      const token = await this.getAuthToken();
+
+      const params: Record<string, string | number> = {};
+      for (const [key, value] of Object.entries(query)) {
+        if (value !== undefined && value !== null && value !== "") params[key] = value;
+      }
+
+      const response = await axios.get(`${API_ENDPOINT}/api/audit`, {
+        params,
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
+        },
+      });
+      const data = response.data;
+      return { events: data.events || [], count: data.count || 0, nextCursor: data.nextCursor || null };
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to query audit log");
+    }
+  }
+
+  async startExport(filters: AuditFilters): Promise<AuditExportStatus> {
+    try {
+      const token = await this.getAuthToken();
+
+      const response = await axios.post(`${API_ENDPOINT}/api/audit/exports`, filters, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
+        },
+      });
+      return response.data;
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to start audit export");
+    }
+  }
+
+  async getExport(exportId: string): Promise<AuditExportStatus> {
+    try {
+      const token = await this.getAuthToken();
+
+      const response = await axios.get(
+        `${API_ENDPOINT}/api/audit/exports/${encodeURIComponent(exportId)}`,
+        {
+          headers: {
+            Authorization: `Bearer ${token}`,
+            "Content-Type": "application/json",
+          },
+        }
+      );
+      return response.data;
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to load audit export");
+    }
+  }
+}
+
+export const auditService = new AuditService();
@@ -4,9 +4,27 @@ import axios from "axios";
 const API_ENDPOINT = import.meta.env.VITE_API_ENDPOINT;
 
 export interface UploadUrlResponse {
-  uploadUrl: string;
+  uploadUrl: string | null;
   fileKey: string;
+  fileId?: string;
   requiredHeaders: Record<string, string>;
+  // Content already stored: the record was created and no upload is needed
+  deduplicated?: boolean;
+}
+
+export interface PartUrl {
+  partNumber: number;
+  url: string;
+}
+
+export interface MultipartUploadResponse {
+  fileId: string;
+  fileKey: string;
+  uploadId: string;
+  partSize: number;
+  partCount: number;
+  parts: PartUrl[];
+  deduplicated?: boolean;
 }
 
 export interface FileUploadProgress {
@@ -32,6 +50,65 @@ export interface FileListResponse {
   count: number;
 }
 
+export interface DownloadUrlResult {
+  fileId: string;
+  status: number;
+  downloadUrl?: string;
+  fileName?: string;
+  error?: string;
+}
+
+export interface DeleteResult {
+  fileId: string;
+  status: number;
+  error?: string;
+}
+
+export interface FileListPage {
+  files: any[];
+  nextCursor: string | null;
+  // Delta sync only: ids of files deleted since the token
+  deleted: string[];
+  // Present on the last page of an unfiltered listing or sync
+  syncToken: string | null;
+  etag: string | null;
+  // 304: the page is unchanged since the ETag sent as ifNoneMatch
+  notModified: boolean;
+}
+
+export interface FileListQuery {
+  name?: string; // filename prefix, case-insensitive
+  owner?: string; // ownerId
+  status?: 'PENDING' | 'AVAILABLE';
+  from?: string; // uploadedAt lower bound (ISO date or timestamp)
+  to?: string; // uploadedAt upper bound; a bare date covers the whole day
+  order?: 'asc' | 'desc';
+  since?: string; // syncToken from an earlier listing: only what changed since
+  limit?: number;
+  cursor?: string | null;
+}
+
+interface FileListCache {
+  syncToken: string;
+  etag: string | null;
+  files: any[];
+}
+
+// Files above this size go up as concurrent multipart parts instead of one PUT
+const MULTIPART_THRESHOLD = 32 * 1024 * 1024;
+const MULTIPART_CONCURRENCY = 6;
+const PART_MAX_ATTEMPTS = 4;
+// Matches MULTIPART_PRESIGN_BATCH on the upload Lambda
+const PART_URL_BATCH = 100;
+// SubtleCrypto hashes in one shot, so only files up to this size are hashed for deduplication
+const DEDUP_HASH_LIMIT = 256 * 1024 * 1024;
+// Unfiltered listings are kept here per user and brought up to date with delta syncs
+const LIST_CACHE_PREFIX = "filevault.files.";
+// Matches MAX_BULK_DELETE on the delete Lambda
+const BULK_DELETE_CHUNK = 250;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
 class FileService {
   private async getAuthToken(): Promise<string> {
     const session = await fetchAuthSession();
@@ -42,7 +119,12 @@ class FileService {
     return token;
   }
 
-  async getUploadUrl(filename: string, contentType?: string, targetUserId?: string): Promise<UploadUrlResponse> {
+  async getUploadUrl(
+    filename: string,
+    contentType?: string,
+    targetUserId?: string,
+    sha256?: string
+  ): Promise<UploadUrlResponse> {
     try {
       const token = await this.getAuthToken();
 
@@ -50,6 +132,9 @@ class FileService {
       if (targetUserId) {
         payload.targetUserId = targetUserId;
       }
+      if (sha256) {
+        payload.sha256 = sha256;
+      }
 
       const response = await axios.post(
         `${API_ENDPOINT}/api/files/upload-url`,
@@ -119,15 +204,26 @@ class FileService {
     targetUserId?: string
   ): Promise<{ fileKey: string; fileName: string; fileSize: number }> {
     try {
+      const sha256 = await this.hashFile(file);
+
+      if (file.size > MULTIPART_THRESHOLD) {
+        return await this.uploadFileMultipart(file, onProgress, targetUserId, sha256);
+      }
+
       // Step 1: Get upload URL + required headers (with optional targetUserId)
-      const { uploadUrl, fileKey, requiredHeaders } = await this.getUploadUrl(
+      const { uploadUrl, fileKey, requiredHeaders, deduplicated } = await this.getUploadUrl(
         file.name,
         file.type,
-        targetUserId
+        targetUserId,
+        sha256
       );
 
-      // Step 2: Upload file to S3 with headers
-      await this.uploadFile(file, uploadUrl, requiredHeaders, onProgress);
+      // Step 2: Upload file to S3 with headers (unless the content is already stored)
+      if (deduplicated || !uploadUrl) {
+        onProgress?.({ loaded: file.size, total: file.size, percentage: 100 });
+      } else {
+        await this.uploadFile(file, uploadUrl, requiredHeaders, onProgress);
+      }
 
       return {
         fileKey,
@@ -139,26 +235,353 @@ class FileService {
     }
   }
 
-  async listFiles(): Promise<FileListResponse> {
+  /** Hex SHA-256 of the file, or undefined when it is too large or hashing is unavailable. */
+  async hashFile(file: File): Promise<string | undefined> {
+    if (file.size > DEDUP_HASH_LIMIT || !window.crypto?.subtle) {
+      return undefined;
+    }
     try {
-      const token = await this.getAuthToken();
+      const digest = await window.crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+      return Array.from(new Uint8Array(digest))
+        .map((b) => b.toString(16).padStart(2, "0"))
+        .join("");
+    } catch {
+      return undefined; // deduplication is an optimisation; upload normally
+    }
+  }
 
-      const response = await axios.get(
-        `${API_ENDPOINT}/api/files`,
-        {
-          headers: {
-            Authorization: `Bearer ${token}`,
-            "Content-Type": "application/json",
-          },
+  private async authHeaders(): Promise<Record<string, string>> {
+    const token = await this.getAuthToken();
+    return {
+      Authorization: `Bearer ${token}`,
+      "Content-Type": "application/json",
+    };
+  }
+
+  async initiateMultipartUpload(
+    file: File,
+    targetUserId?: string,
+    sha256?: string
+  ): Promise<MultipartUploadResponse> {
+    const payload: any = {
+      filename: file.name,
+      contentType: file.type || "application/octet-stream",
+      multipart: true,
+      fileSize: file.size,
+    };
+    if (targetUserId) {
+      payload.targetUserId = targetUserId;
+    }
+    if (sha256) {
+      payload.sha256 = sha256;
+    }
+
+    try {
+      const response = await axios.post(`${API_ENDPOINT}/api/files/upload-url`, payload, {
+        headers: await this.authHeaders(),
+      });
+      return response.data;
+    } catch (error: any) {
+      if (error.response?.status === 403) {
+        throw new Error("You are not authorized to upload for this user.");
+      } else if (error.response?.status === 404) {
+        throw new Error("Target user not found.");
+      }
+      throw new Error(error.response?.data?.error || "Failed to start upload");
+    }
+  }
+
+  async getPartUrls(fileId: string, partNumbers: number[]): Promise<PartUrl[]> {
+    const response = await axios.post(
+      `${API_ENDPOINT}/api/files/${encodeURIComponent(fileId)}/upload-parts`,
+      { partNumbers },
+      { headers: await this.authHeaders() }
+    );
+    return response.data.parts;
+  }
+
+  async completeMultipartUpload(fileId: string, parts: { partNumber: number; etag: string }[]): Promise<void> {
+    await axios.post(
+      `${API_ENDPOINT}/api/files/${encodeURIComponent(fileId)}/complete`,
+      { parts },
+      { headers: await this.authHeaders() }
+    );
+  }
+
+  async abortMultipartUpload(fileId: string): Promise<void> {
+    await axios.post(
+      `${API_ENDPOINT}/api/files/${encodeURIComponent(fileId)}/abort`,
+      {},
+      { headers: await this.authHeaders() }
+    );
+  }
+
+  /**
+   * Upload a large file as S3 multipart parts, MULTIPART_CONCURRENCY at a time.
+   * A failed part is retried on its own (with a fresh URL if the old one was
+   * rejected); the upload is aborted only when a part runs out of attempts.
+   */
+  async uploadFileMultipart(
+    file: File,
+    onProgress?: (progress: FileUploadProgress) => void,
+    targetUserId?: string,
+    sha256?: string
+  ): Promise<{ fileKey: string; fileName: string; fileSize: number }> {
+    const upload = await this.initiateMultipartUpload(file, targetUserId, sha256);
+    const { fileId, fileKey, partSize, partCount } = upload;
+
+    if (upload.deduplicated) {
+      onProgress?.({ loaded: file.size, total: file.size, percentage: 100 });
+      return { fileKey, fileName: file.name, fileSize: file.size };
+    }
+
+    const urls = new Map<number, string>(upload.parts.map((p) => [p.partNumber, p.url]));
+    const urlBatches = new Map<number, Promise<void>>();
+    const loadedByPart = new Map<number, number>();
+    const etags: { partNumber: number; etag: string }[] = [];
+
+    const reportProgress = () => {
+      if (!onProgress) return;
+      let loaded = 0;
+      loadedByPart.forEach((bytes) => (loaded += bytes));
+      onProgress({
+        loaded,
+        total: file.size,
+        percentage: Math.min(100, Math.round((loaded * 100) / file.size)),
+      });
+    };
+
+    // Part URLs arrive in batches; workers needing the same batch share one request
+    const urlFor = async (partNumber: number, refresh = false): Promise<string> => {
+      if (refresh) {
+        const [part] = await this.getPartUrls(fileId, [partNumber]);
+        urls.set(partNumber, part.url);
+      }
+      if (!urls.has(partNumber)) {
+        const batch = Math.floor((partNumber - 1) / PART_URL_BATCH);
+        if (!urlBatches.has(batch)) {
+          const first = batch * PART_URL_BATCH + 1;
+          const last = Math.min(first + PART_URL_BATCH - 1, partCount);
+          const numbers = Array.from({ length: last - first + 1 }, (_, i) => first + i);
+          urlBatches.set(
+            batch,
+            this.getPartUrls(fileId, numbers).then((parts) =>
+              parts.forEach((p) => urls.set(p.partNumber, p.url))
+            )
+          );
+        }
+        await urlBatches.get(batch);
+      }
+      return urls.get(partNumber)!;
+    };
+
+    const uploadPart = async (partNumber: number): Promise<void> => {
+      const start = (partNumber - 1) * partSize;
+      const blob = file.slice(start, Math.min(start + partSize, file.size));
+      let refresh = false;
+
+      for (let attempt = 1; ; attempt++) {
+        try {
+          const url = await urlFor(partNumber, refresh);
+          const response = await axios.put(url, blob, {
+            onUploadProgress: (progressEvent) => {
+              loadedByPart.set(partNumber, progressEvent.loaded);
+              reportProgress();
+            },
+          });
+          const etag = response.headers["etag"];
+          if (!etag) {
+            throw new Error("S3 did not return an ETag (check the bucket CORS ExposeHeaders)");
+          }
+          loadedByPart.set(partNumber, blob.size);
+          reportProgress();
+          etags.push({ partNumber, etag: etag.replace(/"/g, "") });
+          return;
+        } catch (error: any) {
+          loadedByPart.set(partNumber, 0);
+          if (attempt >= PART_MAX_ATTEMPTS) {
+            throw new Error(`Upload failed on part ${partNumber}: ${error.message}`);
+          }
+          // An expired or rejected signature needs a new URL; anything else just waits
+          refresh = error.response?.status === 403;
+          await sleep(500 * 2 ** (attempt - 1));
         }
+      }
+    };
+
+    let next = 1;
+    let failed = false;
+    const worker = async () => {
+      while (!failed && next <= partCount) {
+        try {
+          await uploadPart(next++);
+        } catch (error) {
+          failed = true; // stop the other workers before aborting
+          throw error;
+        }
+      }
+    };
+
+    try {
+      await Promise.all(
+        Array.from({ length: Math.min(MULTIPART_CONCURRENCY, partCount) }, () => worker())
       );
+      await this.completeMultipartUpload(fileId, etags);
+    } catch (error: any) {
+      await this.abortMultipartUpload(fileId).catch(() => undefined);
+      throw new Error(error.response?.data?.error || error.message || "Multipart upload failed");
+    }
+
+    return {
+      fileKey,
+      fileName: file.name,
+      fileSize: file.size,
+    };
+  }
+
+  async listFilesPage(query: FileListQuery = {}, ifNoneMatch?: string | null): Promise<FileListPage> {
+    const token = await this.getAuthToken();
+
+    const params: Record<string, string | number> = {};
+    if (query.name) params.name = query.name;
+    if (query.owner) params.owner = query.owner;
+    if (query.status) params.status = query.status;
+    if (query.from) params.from = query.from;
+    if (query.to) params.to = query.to;
+    if (query.order) params.order = query.order;
+    if (query.since) params.since = query.since;
+    if (query.cursor) params.cursor = query.cursor;
+    if (query.limit) params.limit = query.limit;
+
+    const response = await axios.get(
+      `${API_ENDPOINT}/api/files`,
+      {
+        params,
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
+          ...(ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {}),
+        },
+        validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+      }
+    );
+
+    const notModified = response.status === 304;
+    return {
+      files: notModified ? [] : response.data.files || [],
+      nextCursor: notModified ? null : response.data.nextCursor || null,
+      deleted: notModified ? [] : response.data.deleted || [],
+      syncToken: notModified ? null : response.data.syncToken || null,
+      etag: response.headers["etag"] || null,
+      notModified,
+    };
+  }
+
+  private async listCacheKey(): Promise<string | null> {
+    const session = await fetchAuthSession();
+    const sub = session.tokens?.idToken?.payload?.sub;
+    return sub ? `${LIST_CACHE_PREFIX}${sub}` : null;
+  }
+
+  private readListCache(key: string): FileListCache | null {
+    try {
+      const raw = localStorage.getItem(key);
+      return raw ? JSON.parse(raw) : null;
+    } catch {
+      return null;
+    }
+  }
+
+  private writeListCache(key: string, cache: FileListCache) {
+    try {
+      localStorage.setItem(key, JSON.stringify(cache));
+    } catch {
+      // Over the storage quota: the next visit lists everything again
+      localStorage.removeItem(key);
+    }
+  }
+
+  clearListCache() {
+    Object.keys(localStorage)
+      .filter((key) => key.startsWith(LIST_CACHE_PREFIX))
+      .forEach((key) => localStorage.removeItem(key));
+  }
+
+  // Every page of a listing (or of a delta sync), plus the syncToken from the last page
+  private async listAllPages(query: Omit<FileListQuery, "cursor">, first?: FileListPage): Promise<FileListPage> {
+    let page = first || (await this.listFilesPage(query));
+    const files = [...page.files];
+    const deleted = [...page.deleted];
+    // Follow nextCursor until the backend reports no more pages
+    while (page.nextCursor) {
+      page = await this.listFilesPage({ ...query, cursor: page.nextCursor });
+      files.push(...page.files);
+      deleted.push(...page.deleted);
+    }
+    return { ...page, files, deleted };
+  }
+
+  // The full, unfiltered listing: the cached copy brought up to date with a
+  // delta sync, or a fresh listing when there is no usable sync token
+  private async syncFiles(): Promise<any[]> {
+    const key = await this.listCacheKey();
+    const cache = key ? this.readListCache(key) : null;
+
+    if (key && cache) {
+      try {
+        const first = await this.listFilesPage({ since: cache.syncToken }, cache.etag);
+        if (first.notModified) {
+          // The backend may confirm a page-hash ETag with its cheaper version ETag
+          if (first.etag && first.etag !== cache.etag) {
+            this.writeListCache(key, { ...cache, etag: first.etag });
+          }
+          return cache.files;
+        }
+        const delta = await this.listAllPages({ since: cache.syncToken }, first);
+        const byId = new Map(cache.files.map((f) => [f.fileId, f]));
+        delta.files.forEach((f) => byId.set(f.fileId, f));
+        delta.deleted.forEach((fileId) => byId.delete(fileId));
+        const files = Array.from(byId.values());
+        this.writeListCache(key, {
+          syncToken: delta.syncToken || cache.syncToken,
+          // Only a single-page delta can be revalidated as a whole
+          etag: first.nextCursor ? null : first.etag,
+          files,
+        });
+        return files;
+      } catch (error: any) {
+        // 410: the token expired or the files this user can see changed
+        if (error.response?.status !== 410) throw error;
+      }
+    }
+
+    const listing = await this.listAllPages({});
+    if (key && listing.syncToken) {
+      this.writeListCache(key, { syncToken: listing.syncToken, etag: null, files: listing.files });
+    }
+    return listing.files;
+  }
+
+  async listFiles(query: Omit<FileListQuery, "cursor" | "since"> = {}): Promise<FileListResponse> {
+    try {
+      const { order, limit: _limit, ...filters } = query;
+      let rawFiles: any[];
+      if (Object.values(filters).some(Boolean)) {
+        rawFiles = (await this.listAllPages(query)).files;
+      } else {
+        // Unfiltered: served from the local cache, kept current with delta syncs
+        const direction = order === "asc" ? 1 : -1;
+        rawFiles = (await this.syncFiles()).sort(
+          (a, b) => direction * String(a.uploadedAt || "").localeCompare(String(b.uploadedAt || ""))
+        );
+      }
 
       // Map backend response into FileInfo format
-      const mappedFiles = (response.data.files || []).map((f: any) => {
+      const mappedFiles = rawFiles.map((f: any) => {
         const mappedFile = {
           key: f.s3Key || f.key || f.fileKey || f.id, // Backend returns s3Key, try multiple possible key fields
           fileName: f.fileName || f.name || (f.s3Key ? f.s3Key.split("/").pop() : 'Unknown File'),
-          size: f.size || 0,
+          size: f.sizeBytes || f.size || 0,
           lastModified: f.lastModified || f.modifiedAt || f.uploadedAt || new Date().toISOString(),
           downloadUrl: null, // We'll get this separately when downloading
           ownerEmail: f.ownerEmail || f.ownerId,
@@ -217,6 +640,25 @@ class FileService {
     }
   }
 
+  async getDownloadUrls(fileIds: string[]): Promise<DownloadUrlResult[]> {
+    try {
+      const token = await this.getAuthToken();
+      const response = await axios.post(
+        `${API_ENDPOINT}/api/files/download-urls`,
+        { fileIds },
+        {
+          headers: {
+            Authorization: `Bearer ${token}`,
+            "Content-Type": "application/json",
+          },
+        }
+      );
+      return response.data.results || [];
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to get download URLs");
+    }
+  }
+
   async downloadFile(fileKey: string, fileName: string, fileId?: string): Promise<void> {
     try {
       if (!fileKey && !fileId) {
@@ -280,6 +722,23 @@ class FileService {
     }
   }
 
+  async deleteFiles(fileIds: string[]): Promise<DeleteResult[]> {
+    try {
+      const results: DeleteResult[] = [];
+      for (let start = 0; start < fileIds.length; start += BULK_DELETE_CHUNK) {
+        const response = await axios.post(
+          `${API_ENDPOINT}/api/files/delete`,
+          { fileIds: fileIds.slice(start, start + BULK_DELETE_CHUNK) },
+          { headers: await this.authHeaders() }
+        );
+        results.push(...(response.data.results || []));
+      }
+      return results;
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to delete files");
+    }
+  }
+
   formatFileSize(bytes: number): string {
     if (bytes === 0) return "0 Bytes";
     const k = 1024;
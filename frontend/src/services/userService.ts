@@ -33,6 +33,17 @@ export interface UsersListResponse {
   count: number;
 }
 
+export interface UsersPageQuery {
+  role?: 'Admin' | 'Editor' | 'Viewer';
+  email?: string; // email prefix
+  limit?: number;
+  cursor?: string | null;
+}
+
+export interface UsersPage extends UsersListResponse {
+  nextCursor: string | null;
+}
+
 export interface RoleUpdateRequest {
   role: 'Admin' | 'Editor' | 'Viewer';
 }
@@ -42,6 +53,38 @@ export interface RoleUpdateResponse {
   user: UserInfo;
 }
 
+export interface BulkRoleChange {
+  userId: string;
+  role: 'Admin' | 'Editor' | 'Viewer';
+}
+
+export interface BulkRoleResult {
+  userId: string;
+  status: number;
+  oldRole?: string;
+  newRole?: string;
+  changed?: boolean;
+  autoCleanupTriggered?: boolean;
+  error?: string;
+}
+
+// Server-side cap per PATCH /api/users/roles (MAX_BULK_ROLE_CHANGES)
+const ROLE_CHANGES_PER_REQUEST = 75;
+
+export interface BulkDelegateResult {
+  viewerId: string;
+  status: number;
+  changed?: boolean;
+  previousEditor?: string;
+  error?: string;
+}
+
+export interface BulkDelegateResponse {
+  results: BulkDelegateResult[];
+  assigned: number;
+  failed: number;
+}
+
 export interface DelegateRequest {
   editorId?: string; // null to unlink
 }
@@ -56,6 +99,7 @@ export interface MFAStatusResponse {
   hasTotpDevice: boolean;
   preferredMfaSetting: string;
   mfaDevices: number;
+  checkedAt?: string;
 }
 
 class UserService {
@@ -88,13 +132,19 @@ class UserService {
     }
   }
 
-  async listUsers(): Promise<UsersListResponse> {
+  async listUsersPage(query: UsersPageQuery = {}): Promise<UsersPage> {
     try {
       const token = await this.getAuthToken();
 
       const url = `${API_ENDPOINT}/api/users`;
+      const params: Record<string, string | number> = {};
+      if (query.role) params.role = query.role;
+      if (query.email) params.email = query.email;
+      if (query.limit) params.limit = query.limit;
+      if (query.cursor) params.cursor = query.cursor;
 
       const response = await axios.get(url, {
+        params,
         headers: {
           Authorization: `Bearer ${token}`,
           "Content-Type": "application/json",
@@ -104,14 +154,26 @@ class UserService {
       // Handle both array response and object with users property
       const data = response.data;
       if (Array.isArray(data)) {
-        return { users: data, count: data.length };
+        return { users: data, count: data.length, nextCursor: null };
       }
-      return data;
+      return { users: data.users || [], count: data.count || 0, nextCursor: data.nextCursor || null };
     } catch (error: any) {
-      throw new Error(error.response?.data?.message || "Failed to list users");
+      throw new Error(error.response?.data?.error || error.response?.data?.message || "Failed to list users");
     }
   }
 
+  // Follows nextCursor until every matching user has been loaded
+  async listUsers(query: Omit<UsersPageQuery, "cursor"> = {}): Promise<UsersListResponse> {
+    const users: UserInfo[] = [];
+    let cursor: string | null = null;
+    do {
+      const page: UsersPage = await this.listUsersPage({ ...query, limit: query.limit || 500, cursor });
+      users.push(...page.users);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return { users, count: users.length };
+  }
+
   async listDelegatedUsers(): Promise<UsersListResponse> {
     try {
       const token = await this.getAuthToken();
@@ -176,6 +238,48 @@ class UserService {
     }
   }
 
+  async assignViewers(editorId: string, viewerIds: string[]): Promise<BulkDelegateResponse> {
+    try {
+      const token = await this.getAuthToken();
+      const response = await axios.patch(
+        `${API_ENDPOINT}/api/users/${encodeURIComponent(editorId)}/delegates`,
+        { viewerIds },
+        {
+          headers: {
+            Authorization: `Bearer ${token}`,
+            "Content-Type": "application/json",
+          },
+        }
+      );
+      return response.data;
+    } catch (error: any) {
+      throw new Error(error.response?.data?.error || "Failed to assign viewers");
+    }
+  }
+
+  async updateRoles(changes: BulkRoleChange[]): Promise<BulkRoleResult[]> {
+    const token = await this.getAuthToken();
+    const results: BulkRoleResult[] = [];
+    for (let start = 0; start < changes.length; start += ROLE_CHANGES_PER_REQUEST) {
+      try {
+        const response = await axios.patch(
+          `${API_ENDPOINT}/api/users/roles`,
+          { changes: changes.slice(start, start + ROLE_CHANGES_PER_REQUEST) },
+          {
+            headers: {
+              Authorization: `Bearer ${token}`,
+              "Content-Type": "application/json",
+            },
+          }
+        );
+        results.push(...(response.data.results || []));
+      } catch (error: any) {
+        throw new Error(error.response?.data?.error || "Failed to update user roles");
+      }
+    }
+    return results;
+  }
+
   async delegateUser(userId: string, delegateRequest: DelegateRequest): Promise<DelegateResponse> {
     try {
       if (!userId || userId === 'unknown-id') {
@@ -199,11 +303,13 @@ class UserService {
     }
   }
 
-  async checkMFAStatus(): Promise<MFAStatusResponse> {
+  // refresh=true bypasses the server-side caches; use it right after the
+  // user changes their MFA settings
+  async checkMFAStatus(refresh = false): Promise<MFAStatusResponse> {
     try {
       const token = await this.getAuthToken();
       const response = await axios.get(
-        `${API_ENDPOINT}/api/auth/mfa-status`,
+        `${API_ENDPOINT}/api/auth/mfa-status${refresh ? "?refresh=true" : ""}`,
         {
           headers: {
             Authorization: `Bearer ${token}`,
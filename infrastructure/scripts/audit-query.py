@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Query the long-term audit archive (audit/ in the files bucket).
+
+The audit_archive Lambda writes records that DynamoDB TTL removes from
+FileVaultAuditEvents / FileVaultDeletionAuditLog as gzipped NDJSON, one
+directory per day:
+
+    audit/table=<general|deletion>/date=YYYY-MM-DD/part-*.ndjson.gz
+
+Only the date partitions inside --from/--to are listed and read, so a query
+over a few days costs a few small GETs however large the archive grows. Rows
+are then filtered on any column with --where (fnmatch patterns) and cut down
+to --fields. Records archived twice by a retried batch are printed once.
+
+Reads straight from S3 (--bucket) or from a local copy made with
+`aws s3 sync s3://<bucket>/audit ./audit` (--dir ./audit).
+
+Usage: python3 audit-query.py --bucket my-files-bucket --from 2025-01-01 --to 2025-01-31 \\
+                              --where eventType=File* --where actorUserId=<sub> \\
+                              [--fields timestamp,eventType,actorEmail] [--format csv]
+       python3 audit-query.py --dir ./audit --table deletion --from 2025-03-01 --count
+"""
+import argparse
+import csv
+import fnmatch
+import glob
+import gzip
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+TIME_FIELDS = ("timestamp", "deletedAt")
+
+
+# ───────────────────────────────────────────
+# Partitions
+# ───────────────────────────────────────────
+def _partition_date(path):
+    """The YYYY-MM-DD of a .../date=YYYY-MM-DD/... path, or None."""
+    for part in path.replace("\\", "/").split("/"):
+        if part.startswith("date="):
+            return part[len("date="):]
+    return None
+
+
+def _in_range(day, args):
+    return day is not None and (not args.start or day >= args.start[:10]) and (not args.end or day <= args.end[:10])
+
+
+def list_s3(s3, args):
+    """Object keys of the partitions in range, listed from the first one on."""
+    prefix = f"{args.prefix}/table={args.table}/"
+    list_args = {"Bucket": args.bucket, "Prefix": prefix}
+    if args.start:
+        list_args["StartAfter"] = f"{prefix}date={args.start[:10]}"
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(**list_args):
+        for obj in page.get("Contents", []):
+            day = _partition_date(obj["Key"])
+            if args.end and day and day > args.end[:10]:
+                return keys
+            if _in_range(day, args) and obj["Key"].endswith(".ndjson.gz"):
+                keys.append(obj["Key"])
+    return keys
+
+
+def list_local(args):
+    pattern = os.path.join(args.dir, f"table={args.table}", "date=*", "*.ndjson.gz")
+    return sorted(p for p in glob.glob(pattern) if _in_range(_partition_date(p), args))
+
+
+# ───────────────────────────────────────────
+# Rows
+# ───────────────────────────────────────────
+def parse_where(clauses):
+    """--where col=pattern / col!=pattern -> [(column, pattern, negate)]"""
+    filters = []
+    for clause in clauses:
+        negate = "!=" in clause
+        column, separator, pattern = clause.partition("!=" if negate else "=")
+        if not column or not separator:
+            raise ValueError(f"invalid --where {clause!r}; use column=pattern or column!=pattern")
+        filters.append((column.strip(), pattern, negate))
+    return filters
+
+
+def _lookup(row, column):
+    """Column value; details.reason style paths reach into nested maps."""
+    value = row
+    for part in column.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _value(row, column):
+    """Column value as text, for matching and CSV."""
+    value = _lookup(row, column)
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+
+
+def matches(row, args, filters):
+    moment = next((row[f] for f in TIME_FIELDS if row.get(f)), "")
+    if args.start and moment < args.start:
+        return False
+    # A bare date as --to includes that whole day
+    if args.end and moment[:len(args.end)] > args.end:
+        return False
+    for column, pattern, negate in filters:
+        if fnmatch.fnmatchcase(_value(row, column), pattern) == negate:
+            return False
+    return True
+
+
+def read_rows(source, args):
+    """Decompressed lines of one archive file, from S3 or disk."""
+    if args.bucket:
+        from filevault_common import aws
+
+        body = aws.client("s3").get_object(Bucket=args.bucket, Key=source)["Body"].read()
+        data = gzip.decompress(body)
+    else:
+        with gzip.open(source, "rb") as f:
+            data = f.read()
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def fetch_all(sources, args):
+    """Yield each file's rows in order, keeping a few downloads in flight (not all of them)."""
+    workers = max(1, args.workers)
+    remaining = iter(sources)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(read_rows, s, args) for s in itertools.islice(remaining, 2 * workers))
+        while pending:
+            rows = pending.popleft().result()
+            following = next(remaining, None)
+            if following is not None:
+                pending.append(pool.submit(read_rows, following, args))
+            yield rows
+
+
+# ───────────────────────────────────────────
+# Main
+# ───────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bucket", help="files bucket to read audit/ from")
+    source.add_argument("--dir", help="local copy of the audit/ prefix")
+    parser.add_argument("--prefix", default="audit", help="archive prefix in the bucket")
+    parser.add_argument("--table", choices=["general", "deletion"], default="general")
+    parser.add_argument("--from", dest="start", help="first date or timestamp (inclusive)")
+    parser.add_argument("--to", dest="end", help="last date or timestamp (inclusive)")
+    parser.add_argument("--last-days", type=int, help="shorthand for --from <today - N days>")
+    parser.add_argument("--where", action="append", default=[], metavar="COLUMN=PATTERN",
+                        help="keep rows whose column matches the fnmatch pattern (!= to exclude; repeatable)")
+    parser.add_argument("--fields", help="comma-separated columns to output (default: all)")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--count", action="store_true", help="print only the number of matching rows")
+    parser.add_argument("--workers", type=int, default=8, help="files fetched in parallel")
+    parser.add_argument("--region", default=os.getenv("AWS_REGION", "us-east-1"))
+    args = parser.parse_args()
+
+    if args.last_days is not None and not args.start:
+        args.start = (date.today() - timedelta(days=args.last_days)).isoformat()
+    try:
+        filters = parse_where(args.where)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
+
+    if args.bucket:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        "..", "terraform", "modules", "lambdas", "shared", "python"))
+        os.environ["AWS_DEFAULT_REGION"] = args.region
+        from filevault_common import aws
+
+        sources = list_s3(aws.client("s3"), args)
+    else:
+        sources = list_local(args)
+
+    days = len({_partition_date(s) for s in sources})
+    print(f"🔍 {len(sources)} file(s) in {days} partition(s) of table={args.table}", file=sys.stderr)
+
+    writer = None
+    if args.format == "csv" and not args.count:
+        writer = csv.writer(sys.stdout)
+        if fields:
+            writer.writerow(fields)
+
+    def emit(row):
+        nonlocal fields
+        if writer:
+            if not fields:
+                fields = sorted(row)  # the first row decides the columns
+                writer.writerow(fields)
+            writer.writerow([_value(row, f) for f in fields])
+        else:
+            out = {f: _lookup(row, f) for f in fields} if fields else row
+            print(json.dumps(out, sort_keys=True))
+
+    seen, matched = set(), 0
+    files = fetch_all(sources, args)
+    for rows in files:
+        for row in rows:
+            audit_id = row.get("auditId")
+            if audit_id in seen:
+                continue
+            if audit_id:
+                seen.add(audit_id)
+            if not matches(row, args, filters):
+                continue
+            matched += 1
+            if not args.count:
+                emit(row)
+            if args.limit and matched >= args.limit:
+                break
+        if args.limit and matched >= args.limit:
+            files.close()
+            break
+
+    if args.count:
+        print(matched)
+    else:
+        print(f"✅ {matched} matching row(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the FileVault Lambda handlers against synthetic tables.
+
+Seeds FileVaultFiles, FileVaultUsers and the audit tables at the requested
+scale (see benchmarks/dataset.py), then invokes each scenario's handler (see
+benchmarks/scenarios.py) in-process with API Gateway v2 events. For every
+scenario it reports:
+
+  * latency: p50 / p90 / p99 / max over --iterations warm invocations (the
+    first, cold invocation is reported separately)
+  * memory: peak Python heap growth per invocation (tracemalloc), measured
+    in a separate pass of --memory-iterations so tracing does not skew timing
+  * AWS calls per request, by service.Operation (the most portable number:
+    it does not depend on the backend)
+
+AWS is moto's in-memory mock by default (pip install 'moto[dynamodb,s3]').
+--dynamodb-endpoint sends DynamoDB to DynamoDB Local instead, which is closer
+to the real service for scans and queries over large tables; S3, Lambda and
+Cognito stay mocked. Neither models network latency, so compare runs with
+each other, not with production.
+
+Results go to bench-results/<time>-<commit>.json; --compare prints the change
+against an earlier result file.
+
+Usage: python3 benchmark.py --list
+       python3 benchmark.py [--files 100000 --editors 500 --viewers 5000] [--scenario list-*]
+       python3 benchmark.py --files 1000000 --editors 5000 --viewers 50000 \\
+                            --dynamodb-endpoint http://localhost:8000 --skip-seed
+       python3 benchmark.py --compare bench-results/before.json [bench-results/after.json]
+"""
+import argparse
+import contextlib
+import fnmatch
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS = os.path.join(HERE, "..", "terraform", "modules", "lambdas")
+LAYER = os.path.join(LAMBDAS, "shared", "python")
+sys.path.insert(0, LAYER)
+sys.path.insert(0, HERE)
+
+BUCKET = "filevault-bench"
+
+# Environment the handlers read at import time (table names come from benchmarks.dataset.TABLES)
+HANDLER_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "BUCKET_NAME": BUCKET,
+    "FILES_BUCKET": BUCKET,
+    "USER_POOL_ID": "us-east-1_bench",
+}
+
+
+# ───────────────────────────────────────────
+# AWS call counting
+# ───────────────────────────────────────────
+class CallCounter:
+    """Counts every botocore API call (service.Operation), from any thread."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        from botocore.client import BaseClient
+
+        original = BaseClient._make_api_call
+        counter = self
+
+        def counted(client, operation_name, api_params):
+            service = client.meta.service_model.service_name
+            with counter._lock:
+                counter.calls[f"{service}.{operation_name}"] += 1
+            return original(client, operation_name, api_params)
+
+        BaseClient._make_api_call = counted
+
+    def take(self):
+        with self._lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+
+class FakeContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, function_name, timeout_ms=30000):
+        self.function_name = function_name
+        self.aws_request_id = "bench"
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+# ───────────────────────────────────────────
+# Handlers
+# ───────────────────────────────────────────
+_handlers = {}
+
+
+def load_handler(name):
+    """Import lambdas/<name>/main.py under its own module name; returns (entry point, import ms)."""
+    if name not in _handlers:
+        path = os.path.join(LAMBDAS, name, "main.py")
+        spec = importlib.util.spec_from_file_location(f"bench_{name.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        start = time.perf_counter()
+        spec.loader.exec_module(module)
+        elapsed = (time.perf_counter() - start) * 1000
+        entry = getattr(module, "handler", None) or getattr(module, "lambda_handler")
+        _handlers[name] = (entry, elapsed)
+    return _handlers[name]
+
+
+def invoke(entry, name, event, verbose):
+    """Run one invocation; returns (status code, ms). Handler output is swallowed unless verbose."""
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with sink:
+        try:
+            result = entry(event, FakeContext(f"filevault-{name}"))
+            status = (result or {}).get("statusCode", 200)
+        except Exception as e:
+            print(f"⚠️ {name} raised {type(e).__name__}: {e}", file=sys.stderr)
+            status = "exception"
+    return status, (time.perf_counter() - start) * 1000
+
+
+# ───────────────────────────────────────────
+# Statistics
+# ───────────────────────────────────────────
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(values, digits=3):
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {
+        "p50": round(percentile(ordered, 50), digits),
+        "p90": round(percentile(ordered, 90), digits),
+        "p99": round(percentile(ordered, 99), digits),
+        "max": round(ordered[-1], digits),
+        "mean": round(sum(ordered) / len(ordered), digits),
+    }
+
+
+def run_scenario(spec, ds, args, counter):
+    entry, import_ms = load_handler(spec.handler)
+    rng = random.Random(f"{args.seed}-{spec.name}")
+    statuses = Counter()
+
+    counter.take()
+    status, cold_ms = invoke(entry, spec.handler, spec.build(ds, rng), args.verbose)
+    statuses[str(status)] += 1
+    for _ in range(args.warmup):
+        invoke(entry, spec.handler, spec.build(ds, rng), args.verbose)
+    counter.take()
+
+    latencies = []
+    for _ in range(args.iterations):
+        status, ms = invoke(entry, spec.handler, spec.build(ds, rng), args.verbose)
+        statuses[str(status)] += 1
+        latencies.append(ms)
+    calls = counter.take()
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(args.memory_iterations):
+            event = spec.build(ds, rng)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            invoke(entry, spec.handler, event, args.verbose)
+            peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+    counter.take()
+
+    per_request = {op: round(n / args.iterations, 2) for op, n in sorted(calls.items())} if args.iterations else {}
+    return {
+        "handler": spec.handler,
+        "description": spec.description,
+        "iterations": args.iterations,
+        "statusCodes": dict(sorted(statuses.items())),
+        "importMs": round(import_ms, 3),
+        "coldMs": round(cold_ms, 3),
+        "latencyMs": summarize(latencies),
+        "peakKiB": summarize(peaks, digits=1),
+        "awsCallsPerRequest": round(sum(calls.values()) / args.iterations, 2) if args.iterations else 0,
+        "awsCalls": per_request,
+    }
+
+
+# ───────────────────────────────────────────
+# Results
+# ───────────────────────────────────────────
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _delta(before, after):
+    if before in (None, 0) or after is None:
+        return "   n/a"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def compare(baseline, current):
+    """Print per-scenario changes in p50/p99 latency, AWS calls and peak memory."""
+    print(f"📊 {baseline.get('commit')} ({baseline.get('createdAt')}) → {current.get('commit')} ({current.get('createdAt')})")
+    if baseline.get("dataset") != current.get("dataset"):
+        print(f"⚠️ Datasets differ: {baseline.get('dataset')} vs {current.get('dataset')}")
+    print(f"{'scenario':<26}" + "".join(f"{title:^30}" for title in ("p50 ms", "p99 ms", "AWS calls/req"))
+          + f"{'peak KiB':>10}")
+    for name in sorted(set(baseline["scenarios"]) | set(current["scenarios"])):
+        old, new = baseline["scenarios"].get(name), current["scenarios"].get(name)
+        if not old or not new:
+            print(f"{name:<26}{'only in ' + ('current' if new else 'baseline'):>22}")
+            continue
+        row = f"{name:<26}"
+        for before, after in (
+            (old["latencyMs"].get("p50"), new["latencyMs"].get("p50")),
+            (old["latencyMs"].get("p99"), new["latencyMs"].get("p99")),
+            (old["awsCallsPerRequest"], new["awsCallsPerRequest"]),
+        ):
+            row += f"{before!s:>10} → {after!s:<10}{_delta(before, after)} "
+        row += f"{_delta(old['peakKiB'].get('max'), new['peakKiB'].get('max')):>10}"
+        print(row)
+
+
+def _load_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ───────────────────────────────────────────
+# Main
+# ───────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    parser.add_argument("--scenario", action="append", default=[], metavar="PATTERN",
+                        help="run scenarios matching this fnmatch pattern (repeatable; default: all)")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--editors", type=int, default=200)
+    parser.add_argument("--viewers", type=int, default=2000)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--audit-events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1, help="seed for the dataset and the request mix")
+    parser.add_argument("--seed-workers", type=int, default=8, help="threads writing the dataset")
+    parser.add_argument("--skip-seed", action="store_true",
+                        help="reuse tables already seeded at this scale (--dynamodb-endpoint only)")
+    parser.add_argument("--dynamodb-endpoint", help="DynamoDB Local URL, e.g. http://localhost:8000")
+    parser.add_argument("--iterations", type=int, default=200, help="timed invocations per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed invocations after the cold one")
+    parser.add_argument("--memory-iterations", type=int, default=20, help="invocations traced for peak memory")
+    parser.add_argument("--output", help="result file (default: bench-results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT",
+                        help="BASELINE [CURRENT]: compare two result files, or BASELINE with this run")
+    parser.add_argument("--verbose", action="store_true", help="show handler output")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        sys.exit("❌ --compare takes a baseline and at most one other result file")
+    if args.compare and len(args.compare) == 2:
+        compare(_load_json(args.compare[0]), _load_json(args.compare[1]))
+        return
+
+    for name, value in HANDLER_ENV.items():
+        os.environ.setdefault(name, value)
+
+    import benchmarks
+    from benchmarks import dataset
+
+    for env_name, (table_name, _keys, _indexes) in dataset.TABLES.items():
+        os.environ.setdefault(env_name, table_name)
+    os.environ.setdefault("AUDIT_TABLE", os.environ["DELETION_AUDIT_TABLE"])
+
+    scenarios = benchmarks.load_all()
+    if args.list:
+        for spec in scenarios.values():
+            print(f"{spec.name:<26} {spec.handler:<20} {spec.description}")
+        return
+    selected = [s for s in scenarios.values()
+                if not args.scenario or any(fnmatch.fnmatchcase(s.name, p) for p in args.scenario)]
+    if not selected:
+        sys.exit("❌ No scenario matches; see --list")
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("❌ benchmark.py needs moto: pip install 'moto[dynamodb,s3]'")
+    mock_config = {}
+    if args.dynamodb_endpoint:
+        # boto3 picks the endpoint up from the environment; moto lets those requests through
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.dynamodb_endpoint
+        mock_config = {"core": {"passthrough": {"urls": [re.escape(args.dynamodb_endpoint) + ".*"]}}}
+    elif args.skip_seed:
+        sys.exit("❌ --skip-seed needs --dynamodb-endpoint: moto starts empty every run")
+
+    ds = dataset.Dataset(files=args.files, editors=args.editors, viewers=args.viewers,
+                         admins=args.admins, audit_events=args.audit_events, seed=args.seed)
+    counter = CallCounter()
+
+    with mock_aws(config=mock_config):
+        from filevault_common import aws
+
+        aws.client("s3").create_bucket(Bucket=BUCKET)
+        dataset.create_tables()
+        if not args.skip_seed:
+            print(f"🌱 Seeding {ds.describe()}")
+            started = time.perf_counter()
+            dataset.seed(ds, workers=args.seed_workers)
+            print(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
+
+        counter.install()
+        results = {}
+        for spec in selected:
+            print(f"⏱️  {spec.name} ({spec.handler})")
+            result = run_scenario(spec, ds, args, counter)
+            results[spec.name] = result
+            bad = {code: n for code, n in result["statusCodes"].items() if not code.startswith("2")}
+            print(f"   p50 {result['latencyMs'].get('p50')} ms, p99 {result['latencyMs'].get('p99')} ms, "
+                  f"{result['awsCallsPerRequest']} AWS calls/req, peak {result['peakKiB'].get('max')} KiB"
+                  + (f"  ⚠️ non-2xx: {bad}" if bad else ""))
+
+    commit = git_commit()
+    report = {
+        "createdAt": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": commit,
+        "backend": "dynamodb-local" if args.dynamodb_endpoint else "moto",
+        "python": platform.python_version(),
+        "dataset": ds.describe(),
+        "settings": {"iterations": args.iterations, "warmup": args.warmup,
+                     "memoryIterations": args.memory_iterations},
+        "scenarios": results,
+    }
+    path = args.output or os.path.join(
+        "bench-results", f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"💾 Results written to {path}")
+
+    if args.compare:
+        compare(_load_json(args.compare[0]), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Scenarios for benchmark.py.
+
+A scenario is a function registered with @scenario. benchmark.py loads the
+named Lambda's main.py, then calls the scenario once per iteration to build
+the API Gateway v2 event it invokes the handler with:
+
+    @scenario("list-editor", handler="list")
+    def list_editor(ds, rng):
+        return api_event("GET /api/files", ds.editor(rng), query={"limit": "100"})
+
+ds is the seeded Dataset (see dataset.py): it knows the scale of every table
+and hands out users and file ids by role, so events can be built without
+reading the tables back. rng is a random.Random seeded from --seed, so two
+runs over the same dataset send the same requests.
+
+Scenarios that write (update_delegate, upload) change the dataset as they
+go; that is fine for timing, but their rows of a result are only comparable
+with runs of the same --iterations.
+"""
+
+import importlib
+import json
+import pkgutil
+from dataclasses import dataclass
+from typing import Callable
+
+SCENARIOS = {}
+
+GROUPS = {"Admin": "Admins", "Editor": "Editors", "Viewer": "Viewers"}
+
+
+@dataclass
+class Scenario:
+    name: str
+    handler: str    # Lambda directory under terraform/modules/lambdas
+    build: Callable  # build(ds, rng) -> event
+    description: str = ""
+    writes: bool = False
+
+
+def scenario(name, handler, writes=False):
+    """Register an event builder under `name` for the `handler` Lambda."""
+    def register(build):
+        if name in SCENARIOS:
+            raise ValueError(f"Duplicate scenario name: {name}")
+        SCENARIOS[name] = Scenario(
+            name=name,
+            handler=handler,
+            build=build,
+            description=(build.__doc__ or "").strip().splitlines()[0] if build.__doc__ else "",
+            writes=writes,
+        )
+        return build
+    return register
+
+
+def load_all():
+    for module in pkgutil.iter_modules(__path__):
+        importlib.import_module(f"{__name__}.{module.name}")
+    return SCENARIOS
+
+
+def api_event(route_key, user, path=None, query=None, body=None):
+    """An HTTP API (payload v2) event from `user` (a FileVaultUsers item) for route_key."""
+    method, raw_path = route_key.split(" ", 1)
+    for name, value in (path or {}).items():
+        raw_path = raw_path.replace(f"{{{name}}}", value)
+    event = {
+        "version": "2.0",
+        "routeKey": route_key,
+        "rawPath": raw_path,
+        "headers": {"content-type": "application/json"},
+        "requestContext": {
+            "http": {"method": method, "path": raw_path, "sourceIp": "203.0.113.10"},
+            "authorizer": {"jwt": {"claims": {
+                "sub": user["userId"],
+                "email": user["email"],
+                "cognito:username": user["email"],
+                "cognito:groups": f"[{GROUPS[user['role']]}]",
+            }}},
+        },
+    }
+    if path:
+        event["pathParameters"] = dict(path)
+    if query:
+        event["queryStringParameters"] = dict(query)
+    if body is not None:
+        event["body"] = json.dumps(body)
+    return event
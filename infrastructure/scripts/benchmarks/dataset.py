@@ -0,0 +1,249 @@
+"""
+Synthetic FileVault tables for benchmark.py.
+
+The key schemas and indexes mirror terraform/modules/storage/*.tf. Everything
+is derived from the scale and the seed, so the Dataset can hand out valid
+user and file ids without keeping a million items in memory:
+
+  * users are <role>-NNNNNNN; the email's first letter rotates through
+    FIRST_NAMES so email-prefix-index partitions are spread out
+  * file i belongs to owner i % (editors + viewers), editors first
+  * viewer v starts delegated to editor v % editors
+  * audit events are spread over the last AUDIT_DAYS days
+"""
+
+import itertools
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from filevault_common import audit, aws, catalog, directory
+from filevault_common.batch import WRITE_CHUNK, batch_write
+
+FIRST_NAMES = ["alice", "bruno", "chen", "dana", "emeka", "fatima", "gus", "hana", "ivan", "jo",
+               "kofi", "lena", "mateo", "nia", "omar", "priya", "quinn", "rosa", "sven", "tariq",
+               "uma", "vera", "wen", "xavi", "yara", "zoe"]
+EVENT_TYPES = ["FilesListed", "FileDownloaded", "FileUploadInitiated", "FilesDownloaded",
+               "DelegationAssigned", "DelegationRemoved", "RoleUpdated", "FileDeleted"]
+AUDIT_DAYS = 90
+EMAIL_DOMAIN = "bench.filevault.test"
+
+
+def _gsi(name, hash_key, range_key=None, include=None):
+    schema = [{"AttributeName": hash_key, "KeyType": "HASH"}]
+    if range_key:
+        schema.append({"AttributeName": range_key, "KeyType": "RANGE"})
+    projection = {"ProjectionType": "INCLUDE", "NonKeyAttributes": include} if include else {"ProjectionType": "ALL"}
+    return {"IndexName": name, "KeySchema": schema, "Projection": projection}
+
+
+# env variable -> (table name, key schema, GSIs)
+TABLES = {
+    "FILES_TABLE": ("FileVaultFiles", ["fileId"], [
+        _gsi("ownerEmail-index", "ownerEmail"),
+        _gsi("ownerId-index", "ownerId"),
+        _gsi(catalog.LIST_INDEX, "ownerId", "uploadedAt",
+             include=["ownerEmail", "fileName", "fileNameLower", "s3Key", "status", "sizeBytes", "uploadedBy"]),
+        _gsi(catalog.SYNC_INDEX, "ownerId", "updatedAt",
+             include=["ownerEmail", "fileName", "s3Key", "uploadedAt", "status", "sizeBytes", "uploadedBy", "deletedFileId"]),
+        _gsi("editor-index", "delegatedEditor"),
+    ]),
+    "USERS_TABLE": ("FileVaultUsers", ["userId"], [
+        _gsi("delegatedEditor-index", "delegatedEditor"),
+        _gsi("role-index", "role", "createdAt",
+             include=["email", "name", "fullName", "delegatedEditor", "lastLogin", "status"]),
+        _gsi("email-prefix-index", "emailInitial", "emailLower",
+             include=["email", "name", "fullName", "role", "delegatedEditor", "createdAt", "lastLogin", "status"]),
+    ]),
+    "BLOBS_TABLE": ("FileVaultBlobs", ["blobId"], []),
+    "GENERAL_AUDIT_TABLE": ("FileVaultAuditEvents", ["eventShard", "eventKey"], [
+        _gsi("actorUserId-index", "actorUserId", "eventKey"),
+        _gsi("targetUserId-index", "targetUserId", "eventKey"),
+    ]),
+    "DELETION_AUDIT_TABLE": ("FileVaultDeletionAuditLog", ["auditId"], []),
+}
+
+
+@dataclass
+class Dataset:
+    files: int
+    editors: int
+    viewers: int
+    admins: int
+    audit_events: int
+    seed: int = 1
+
+    def __post_init__(self):
+        if self.editors < 1 or self.viewers < 1 or self.admins < 1:
+            raise ValueError("need at least one admin, editor and viewer")
+        self.now = datetime(2025, 1, 1) + timedelta(days=AUDIT_DAYS)
+
+    @property
+    def owners(self):
+        return self.editors + self.viewers
+
+    def describe(self):
+        return {"files": self.files, "editors": self.editors, "viewers": self.viewers,
+                "admins": self.admins, "auditEvents": self.audit_events, "seed": self.seed}
+
+    # ── Users ──
+    def user(self, role, i):
+        user_id = f"{role.lower()}-{i:07d}"
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        return {"userId": user_id, "email": f"{first}.{user_id}@{EMAIL_DOMAIN}", "role": role}
+
+    def pick(self, role, rng):
+        """Index of a random user of `role`."""
+        return rng.randrange({"Admin": self.admins, "Editor": self.editors, "Viewer": self.viewers}[role])
+
+    def admin(self, rng):
+        return self.user("Admin", self.pick("Admin", rng))
+
+    def editor(self, rng):
+        return self.user("Editor", self.pick("Editor", rng))
+
+    def viewer(self, rng):
+        return self.user("Viewer", self.pick("Viewer", rng))
+
+    def owner(self, j):
+        return self.user("Editor", j) if j < self.editors else self.user("Viewer", j - self.editors)
+
+    def viewers_of(self, editor_index):
+        """Viewer indexes delegated to an editor when the dataset was seeded."""
+        return range(editor_index, self.viewers, self.editors)
+
+    # ── Files ──
+    @staticmethod
+    def file_id(i):
+        return f"file-{i:09d}"
+
+    def files_of(self, owner_index, rng, count=1):
+        """Up to `count` random file ids owned by owner `owner_index`."""
+        owned = (self.files - owner_index + self.owners - 1) // self.owners
+        picks = rng.sample(range(owned), min(count, owned)) if owned > 0 else []
+        return [self.file_id(owner_index + k * self.owners) for k in picks]
+
+    # ── Items ──
+    def user_items(self, start, stop):
+        """Users start..stop of admins, then editors, then viewers."""
+        stamp = (self.now - timedelta(days=365)).isoformat()
+        for n in range(start, stop):
+            if n < self.admins:
+                yield self._user_item("Admin", n, stamp)
+            elif n < self.admins + self.editors:
+                yield self._user_item("Editor", n - self.admins, stamp)
+            else:
+                i = n - self.admins - self.editors
+                yield self._user_item("Viewer", i, stamp, delegated_editor=self.user("Editor", i % self.editors)["userId"])
+
+    def _user_item(self, role, i, stamp, delegated_editor=None):
+        user = self.user(role, i)
+        name = user["email"].split(".", 1)[0].title()
+        return directory.user_record(user["userId"], user["email"], name, role=role,
+                                     delegated_editor=delegated_editor, now=stamp)
+
+    def file_items(self, start, stop):
+        epoch = self.now - timedelta(days=365)
+        for i in range(start, stop):
+            owner = self.owner(i % self.owners)
+            uploaded = epoch + timedelta(seconds=(i * 7919) % (365 * 86400))
+            yield {
+                "fileId": self.file_id(i),
+                "ownerId": owner["userId"],
+                "ownerEmail": owner["email"],
+                "fileName": f"report-{i}.pdf",
+                "fileNameLower": f"report-{i}.pdf",
+                "s3Key": f"uploads/{owner['userId']}/report-{i}.pdf",
+                "uploadedAt": uploaded.isoformat(),
+                "updatedAt": uploaded.isoformat(),
+                "status": "AVAILABLE",
+                "uploadedBy": owner["email"],
+                "uploadedById": owner["userId"],
+                "roleAtUpload": owner["role"],
+                "sizeBytes": 1024 + (i * 104729) % (50 * 1024 * 1024),
+            }
+
+    def audit_items(self, start, stop):
+        rng = random.Random(f"{self.seed}-audit-{start}")
+        users = self.admins + self.owners
+        for _ in range(start, stop):
+            j = rng.randrange(users)
+            actor = self.user("Admin", j) if j < self.admins else self.owner(j - self.admins)
+            target = self.owner(rng.randrange(self.owners))
+            moment = self.now - timedelta(seconds=rng.randrange(AUDIT_DAYS * 86400))
+            record = {
+                "auditId": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "eventType": rng.choice(EVENT_TYPES),
+                "timestamp": moment.isoformat(),
+                "actorUserId": actor["userId"],
+                "actorEmail": actor["email"],
+                "targetUserId": target["userId"],
+                "fileId": self.file_id(rng.randrange(self.files)) if self.files else None,
+                "status": "SUCCESS",
+                "ipAddress": "203.0.113.10",
+                "details": {},
+                "ttl": int((datetime.utcnow() + timedelta(days=AUDIT_DAYS)).timestamp()),
+            }
+            yield audit.with_keys({k: v for k, v in record.items() if v is not None})
+
+
+# ───────────────────────────────────────────
+# Tables
+# ───────────────────────────────────────────
+def create_tables():
+    """Create every table that does not exist yet (PAY_PER_REQUEST, like production)."""
+    client = aws.client("dynamodb")
+    existing = set(client.list_tables().get("TableNames", []))
+    for env_name, (default_name, keys, indexes) in TABLES.items():
+        name = aws.table_name(env_name)
+        if name in existing:
+            continue
+        attributes = set(keys)
+        for index in indexes:
+            attributes.update(k["AttributeName"] for k in index["KeySchema"])
+        kwargs = {
+            "TableName": name,
+            "KeySchema": [{"AttributeName": k, "KeyType": kind} for k, kind in zip(keys, ("HASH", "RANGE"))],
+            "AttributeDefinitions": [{"AttributeName": a, "AttributeType": "S"} for a in sorted(attributes)],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if indexes:
+            kwargs["GlobalSecondaryIndexes"] = indexes
+        client.create_table(**kwargs)
+        client.get_waiter("table_exists").wait(TableName=name)
+        print(f"🗂️  Created {name}")
+
+
+def count_items(env_name):
+    return aws.client("dynamodb").describe_table(TableName=aws.table_name(env_name))["Table"].get("ItemCount", 0)
+
+
+def _write_all(env_name, items):
+    table_name = aws.table_name(env_name)
+    dynamodb = aws.thread_resource("dynamodb")
+    written = 0
+    while True:
+        chunk = list(itertools.islice(items, WRITE_CHUNK))
+        if not chunk:
+            return written
+        batch_write({table_name: [{"PutRequest": {"Item": item}} for item in chunk]}, dynamodb=dynamodb)
+        written += len(chunk)
+
+
+def _load(env_name, make_items, total, workers, slice_size=5000):
+    slices = [(start, min(start + slice_size, total)) for start in range(0, total, slice_size)]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for n, written in enumerate(pool.map(lambda s: _write_all(env_name, make_items(*s)), slices), 1):
+            done += written
+            if n % 20 == 0 or n == len(slices):
+                print(f"   {aws.table_name(env_name)}: {done:,}/{total:,}")
+
+
+def seed(ds, workers=8):
+    """Write the dataset's users, files and audit events (idempotent: items are overwritten)."""
+    _load("USERS_TABLE", ds.user_items, ds.admins + ds.editors + ds.viewers, workers)
+    _load("FILES_TABLE", ds.file_items, ds.files, workers)
+    _load("GENERAL_AUDIT_TABLE", ds.audit_items, ds.audit_events, workers)
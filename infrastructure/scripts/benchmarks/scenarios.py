@@ -0,0 +1,199 @@
+"""The standard scenarios: one or more per API route, per role where access differs."""
+
+import hashlib
+from datetime import datetime, timedelta
+
+from filevault_common.pagination import encode_cursor
+
+from . import api_event, scenario
+from .dataset import EVENT_TYPES
+
+PAGE = "100"
+BATCH_DOWNLOAD = 50
+BULK_DELEGATIONS = 50
+
+
+def _editor_with_viewers(ds, rng):
+    """(editor index, editor user) for an editor that had viewers at seed time."""
+    index = ds.pick("Editor", rng) if ds.viewers >= ds.editors else rng.randrange(ds.viewers)
+    return index, ds.user("Editor", index)
+
+
+def _sync_token(owner_ids, age=timedelta(hours=1)):
+    """A since token as list would have issued it `age` ago for these owners (see list/main.py)."""
+    scope = hashlib.sha256(",".join(sorted(owner_ids)).encode()).hexdigest()[:16]
+    return encode_cursor({"at": (datetime.utcnow() - age).isoformat(), "scope": scope})
+
+
+# ───────────────────────────────────────────
+# list: GET /api/files
+# ───────────────────────────────────────────
+@scenario("list-admin", handler="list")
+def list_admin(ds, rng):
+    """First page of every file (scan)."""
+    return api_event("GET /api/files", ds.admin(rng), query={"limit": PAGE})
+
+
+@scenario("list-admin-export", handler="list")
+def list_admin_export(ds, rng):
+    """First page of the segmented export scan."""
+    return api_event("GET /api/files", ds.admin(rng), query={"limit": PAGE, "mode": "export"})
+
+
+@scenario("list-editor", handler="list")
+def list_editor(ds, rng):
+    """Own files plus every delegated viewer's, newest first."""
+    _, editor = _editor_with_viewers(ds, rng)
+    return api_event("GET /api/files", editor, query={"limit": PAGE})
+
+
+@scenario("list-editor-filtered", handler="list")
+def list_editor_filtered(ds, rng):
+    """Editor listing narrowed by filename prefix and the last 30 days, oldest first."""
+    _, editor = _editor_with_viewers(ds, rng)
+    start = (ds.now - timedelta(days=30)).isoformat()
+    return api_event("GET /api/files", editor,
+                     query={"limit": PAGE, "name": f"report-{rng.randrange(1, 10)}", "from": start, "order": "asc"})
+
+
+@scenario("list-viewer", handler="list")
+def list_viewer(ds, rng):
+    """A viewer's own files."""
+    return api_event("GET /api/files", ds.viewer(rng), query={"limit": PAGE})
+
+
+@scenario("list-viewer-sync", handler="list")
+def list_viewer_sync(ds, rng):
+    """Delta sync of a viewer's files from an hour ago (ownerId-updatedAt-index)."""
+    viewer = ds.viewer(rng)
+    return api_event("GET /api/files", viewer, query={"limit": PAGE, "since": _sync_token([viewer["userId"]])})
+
+
+@scenario("list-editor-sync", handler="list")
+def list_editor_sync(ds, rng):
+    """Delta sync across an editor's own and delegated owners from an hour ago."""
+    index, editor = _editor_with_viewers(ds, rng)
+    owners = [editor["userId"]] + [ds.user("Viewer", v)["userId"] for v in ds.viewers_of(index)]
+    return api_event("GET /api/files", editor, query={"limit": PAGE, "since": _sync_token(owners)})
+
+
+# ───────────────────────────────────────────
+# download: GET /api/files/{id}/download, POST /api/files/download-urls
+# ───────────────────────────────────────────
+@scenario("download-viewer", handler="download")
+def download_viewer(ds, rng):
+    """One presigned URL for a viewer's own file."""
+    index = ds.pick("Viewer", rng)
+    file_ids = ds.files_of(ds.editors + index, rng) or [ds.file_id(0)]
+    return api_event("GET /api/files/{id}/download", ds.user("Viewer", index), path={"id": file_ids[0]})
+
+
+@scenario("download-editor", handler="download")
+def download_editor(ds, rng):
+    """One presigned URL for a delegated viewer's file (delegation lookup)."""
+    index, editor = _editor_with_viewers(ds, rng)
+    viewers = ds.viewers_of(index)
+    owner = ds.editors + rng.choice(viewers) if viewers else index
+    file_ids = ds.files_of(owner, rng) or [ds.file_id(0)]
+    return api_event("GET /api/files/{id}/download", editor, path={"id": file_ids[0]})
+
+
+@scenario("download-batch-editor", handler="download")
+def download_batch_editor(ds, rng):
+    """A batch of presigned URLs across the editor's own and delegated files."""
+    index, editor = _editor_with_viewers(ds, rng)
+    owners = [index] + [ds.editors + v for v in ds.viewers_of(index)]
+    file_ids = []
+    for owner in owners:
+        file_ids.extend(ds.files_of(owner, rng, BATCH_DOWNLOAD))
+    rng.shuffle(file_ids)
+    return api_event("POST /api/files/download-urls", editor,
+                     body={"fileIds": file_ids[:BATCH_DOWNLOAD] or [ds.file_id(0)]})
+
+
+# ───────────────────────────────────────────
+# upload: POST /api/files/upload-url
+# ───────────────────────────────────────────
+@scenario("upload-editor-for-viewer", handler="upload", writes=True)
+def upload_editor_for_viewer(ds, rng):
+    """Presigned PUT for a delegated viewer (target lookup + metadata write)."""
+    index, editor = _editor_with_viewers(ds, rng)
+    viewers = ds.viewers_of(index)
+    target = ds.user("Viewer", rng.choice(viewers)) if viewers else editor
+    return api_event("POST /api/files/upload-url", editor,
+                     body={"filename": f"bench-{rng.getrandbits(32):08x}.pdf", "contentType": "application/pdf",
+                           "targetUserId": target["userId"]})
+
+
+# ───────────────────────────────────────────
+# update_delegate: PATCH /api/users/{id}/delegate(s)
+# ───────────────────────────────────────────
+@scenario("delegate-assign", handler="update_delegate", writes=True)
+def delegate_assign(ds, rng):
+    """Move one viewer to another editor."""
+    viewer = ds.viewer(rng)
+    return api_event("PATCH /api/users/{id}/delegate", ds.admin(rng), path={"id": viewer["userId"]},
+                     body={"delegatedEditor": ds.editor(rng)["userId"]})
+
+
+@scenario("delegate-unlink", handler="update_delegate", writes=True)
+def delegate_unlink(ds, rng):
+    """Remove one viewer's delegation."""
+    viewer = ds.viewer(rng)
+    return api_event("PATCH /api/users/{id}/delegate", ds.admin(rng), path={"id": viewer["userId"]},
+                     body={"delegatedEditor": None})
+
+
+@scenario("delegate-bulk", handler="update_delegate", writes=True)
+def delegate_bulk(ds, rng):
+    """Assign a batch of viewers to one editor in one request."""
+    viewers = rng.sample(range(ds.viewers), min(BULK_DELEGATIONS, ds.viewers))
+    return api_event("PATCH /api/users/{id}/delegates", ds.admin(rng), path={"id": ds.editor(rng)["userId"]},
+                     body={"viewerIds": [ds.user("Viewer", v)["userId"] for v in viewers]})
+
+
+# ───────────────────────────────────────────
+# users: GET /api/users, get_delegated_users
+# ───────────────────────────────────────────
+@scenario("users-page", handler="users")
+def users_page(ds, rng):
+    """First page of the user directory (projected scan)."""
+    return api_event("GET /api/users", ds.admin(rng), query={"limit": "50"})
+
+
+@scenario("users-role", handler="users")
+def users_role(ds, rng):
+    """First page of one role (role-index)."""
+    return api_event("GET /api/users", ds.admin(rng), query={"limit": "50", "role": rng.choice(["Editor", "Viewer"])})
+
+
+@scenario("users-email-prefix", handler="users")
+def users_email_prefix(ds, rng):
+    """Email type-ahead (email-prefix-index)."""
+    prefix = ds.viewer(rng)["email"][:3]
+    return api_event("GET /api/users", ds.admin(rng), query={"limit": "20", "email": prefix})
+
+
+@scenario("delegated-users", handler="get_delegated_users")
+def delegated_users(ds, rng):
+    """An editor's delegated viewers (delegatedEditor-index)."""
+    _, editor = _editor_with_viewers(ds, rng)
+    return api_event("GET /api/users/delegated", editor)
+
+
+# ───────────────────────────────────────────
+# audit: GET /api/audit
+# ───────────────────────────────────────────
+@scenario("audit-event-type", handler="audit")
+def audit_event_type(ds, rng):
+    """One event type over the last week, merged across shards."""
+    start = (ds.now - timedelta(days=7)).isoformat()
+    return api_event("GET /api/audit", ds.admin(rng),
+                     query={"eventType": rng.choice(EVENT_TYPES), "from": start, "limit": "50"})
+
+
+@scenario("audit-actor", handler="audit")
+def audit_actor(ds, rng):
+    """One user's recent actions (actorUserId-index)."""
+    actor = ds.owner(rng.randrange(ds.owners))
+    return api_event("GET /api/audit", ds.admin(rng), query={"actor": actor["userId"], "limit": "50"})
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Run a per-item migration over a FileVault DynamoDB table.
+
+The table is scanned as --segments parallel scan segments spread over
+--workers processes. Each process applies the migration's transform to every
+item (see migrations/__init__.py) and writes the resulting updates from a
+small thread pool (--write-concurrency). Writes are paced by an adaptive
+token bucket that halves on throttling and creeps back up to --max-wps, on
+top of botocore's adaptive retry mode.
+
+After every scan page has been written, the segment's LastEvaluatedKey is
+checkpointed under --checkpoint-dir, so an interrupted run picks up where
+each segment stopped (rerun the same command). Updates are conditional, so
+replaying the last page of a segment is harmless. Keys whose transform or
+write failed (e.g. still throttled after MAX_WRITE_ATTEMPTS) are kept in the
+checkpoint, and a rerun reads those items again and retries them first.
+
+Copy migrations (registered with target=) write each transformed item to
+another table instead, with a put-if-absent, e.g. to move data to a table
+with a new key schema.
+
+Usage: python3 migrate.py --list
+       python3 migrate.py user-role-default [--dry-run] [--segments 16 --workers 4]
+       python3 migrate.py files-legacy-pending --option bucket=my-files-bucket
+       python3 migrate.py audit-shard-keys [--target FileVaultAuditEvents]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAYER = os.path.join(HERE, "..", "terraform", "modules", "lambdas", "shared", "python")
+sys.path.insert(0, LAYER)
+sys.path.insert(0, HERE)
+
+import migrations  # noqa: E402
+
+THROTTLE_CODES = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"}
+MAX_WRITE_ATTEMPTS = 5
+PROGRESS_SECONDS = 5
+SAMPLE_CHANGES = 5  # per segment, printed in --dry-run
+
+
+class Context:
+    """What a transform sees besides the item: options and lazily created clients."""
+
+    def __init__(self, options):
+        self.options = dict(options)
+
+    def client(self, service):
+        from filevault_common import aws
+
+        return aws.client(service)
+
+
+# ───────────────────────────────────────────
+# Checkpoints
+# ───────────────────────────────────────────
+def _checkpoint_path(directory, segment):
+    return os.path.join(directory, f"segment-{segment:04d}.json")
+
+
+def new_checkpoint():
+    # "failed" is always len(retry): the keys a rerun still has to retry
+    return {"lastKey": None, "done": False, "scanned": 0, "changed": 0, "written": 0, "skipped": 0, "failed": 0,
+            "retry": []}
+
+
+# LastEvaluatedKey may hold DynamoDB numbers (Decimal); keep them exact
+def _encode(o):
+    if isinstance(o, Decimal):
+        return {"__decimal__": str(o)}
+    raise TypeError(f"Cannot checkpoint {type(o).__name__}")
+
+
+def _decode(d):
+    return Decimal(d["__decimal__"]) if set(d) == {"__decimal__"} else d
+
+
+def load_checkpoint(directory, segment):
+    try:
+        with open(_checkpoint_path(directory, segment), encoding="utf-8") as f:
+            return json.load(f, object_hook=_decode)
+    except FileNotFoundError:
+        return new_checkpoint()
+
+
+def save_checkpoint(directory, segment, checkpoint):
+    path = _checkpoint_path(directory, segment)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, default=_encode)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def check_manifest(directory, args, table_name, target_name=None):
+    """Refuse to resume with a different table or segment count: checkpoints would not line up."""
+    manifest = {"migration": args.migration, "table": table_name, "segments": args.segments}
+    if target_name:
+        manifest["target"] = target_name
+    path = os.path.join(directory, "manifest.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != manifest:
+            sys.exit(f"❌ {directory} holds checkpoints for {previous}; use --restart or another --checkpoint-dir")
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+# ───────────────────────────────────────────
+# Updates
+# ───────────────────────────────────────────
+def build_update(change, key_names):
+    """UpdateItem arguments (minus Key) for a Change."""
+    names, values, clauses = {}, dict(change.values), []
+    if change.set:
+        parts = []
+        for attr, value in change.set.items():
+            names[f"#{attr}"] = attr
+            values[f":{attr}"] = value
+            parts.append(f"#{attr} = :{attr}")
+        clauses.append("SET " + ", ".join(parts))
+    if change.remove:
+        for attr in change.remove:
+            names[f"#{attr}"] = attr
+        clauses.append("REMOVE " + ", ".join(f"#{a}" for a in change.remove))
+
+    condition = " AND ".join(f"attribute_exists(#{k})" for k in key_names)
+    for k in key_names:
+        names[f"#{k}"] = k
+    if change.condition:
+        condition = f"({condition}) AND ({change.condition})"
+        for token in re.findall(r"#(\w+)", change.condition):
+            names[f"#{token}"] = token
+
+    kwargs = {
+        "UpdateExpression": " ".join(clauses),
+        "ConditionExpression": condition,
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        kwargs["ExpressionAttributeValues"] = values
+    return kwargs
+
+
+def build_put(change, key_names):
+    """PutItem arguments for a copy: never overwrites an item already in the target."""
+    return {
+        "Item": change.put,
+        "ConditionExpression": " AND ".join(f"attribute_not_exists(#{k})" for k in key_names),
+        "ExpressionAttributeNames": {f"#{k}": k for k in key_names},
+    }
+
+
+def _error_code(exc):
+    return getattr(exc, "response", {}).get("Error", {}).get("Code")
+
+
+def write_change(table_name, key, kwargs, limiter):
+    """Returns "written", "skipped" (condition failed) or "failed"."""
+    from filevault_common import aws
+
+    table = aws.thread_table(table_name)
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        limiter.acquire()
+        try:
+            if "Item" in kwargs:
+                table.put_item(**kwargs)
+            else:
+                table.update_item(Key=key, **kwargs)
+            limiter.succeeded()
+            return "written"
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            return "skipped"
+        except Exception as e:
+            if _error_code(e) in THROTTLE_CODES:
+                limiter.throttled()
+                continue
+            print(f"⚠️ Update of {key} failed: {e}")
+            return "failed"
+    print(f"⚠️ Update of {key} still throttled after {MAX_WRITE_ATTEMPTS} attempts")
+    return "failed"
+
+
+# ───────────────────────────────────────────
+# Worker process
+# ───────────────────────────────────────────
+_progress = None
+
+
+def _init_worker(progress_queue):
+    global _progress
+    _progress = progress_queue
+
+
+def run_segment(job):
+    """Scan one segment to completion (or from its checkpoint) and apply the transform."""
+    from filevault_common import aws
+    from filevault_common.batch import batch_get_items
+    from filevault_common.ratelimit import AdaptiveRateLimiter
+
+    migrations.load_all()
+    if job["plugin"]:
+        _load_plugin(job["plugin"])
+    spec = migrations.MIGRATIONS[job["migration"]]
+    ctx = Context(job["options"])
+    if spec.setup:
+        spec.setup(ctx)
+
+    segment = job["segment"]
+    table = aws.table(job["table"])
+    key_names = [k["AttributeName"] for k in table.key_schema]
+    write_table = job["target"] or job["table"]
+    target_keys = [k["AttributeName"] for k in aws.table(job["target"]).key_schema] if job["target"] else None
+    checkpoint = new_checkpoint() if job["dry_run"] else load_checkpoint(job["checkpoint_dir"], segment)
+    checkpoint.setdefault("retry", [])
+    if checkpoint["done"] and not checkpoint["retry"]:
+        return segment, checkpoint
+
+    scan_args = {"Segment": segment, "TotalSegments": job["segments"]}
+    if job["page_size"]:
+        scan_args["Limit"] = job["page_size"]
+    if spec.projection:
+        attrs = list(dict.fromkeys(key_names + spec.projection))
+        scan_args["ProjectionExpression"] = ", ".join(f"#p{i}" for i in range(len(attrs)))
+        scan_args["ExpressionAttributeNames"] = {f"#p{i}": a for i, a in enumerate(attrs)}
+
+    limiter = AdaptiveRateLimiter(job["wps"], floor=1, ceiling=job["wps"])
+    samples = 0
+
+    def apply(pool, items):
+        """Transform and write `items`; returns the outcome counts and the keys that failed."""
+        nonlocal samples
+        changes, failed_keys = [], []
+        for item in items:
+            key = {k: item[k] for k in key_names}
+            try:
+                change = spec.transform(item, ctx)
+            except Exception as e:
+                print(f"⚠️ Transform failed for {key}: {e}")
+                failed_keys.append(key)
+                continue
+            if change is None:
+                continue
+            if target_keys:
+                if change.put is None:
+                    print(f"⚠️ Transform returned no item to copy for {key}")
+                    failed_keys.append(key)
+                    continue
+                changes.append((key, build_put(change, target_keys)))
+            else:
+                changes.append((key, build_update(change, key_names)))
+
+        if job["dry_run"]:
+            for key, kwargs in changes[:max(0, SAMPLE_CHANGES - samples)]:
+                if "Item" in kwargs:
+                    print(f"🔎 segment {segment}: would copy {json.dumps(key, default=str)} to {write_table} as "
+                          f"{json.dumps({k: kwargs['Item'][k] for k in target_keys}, default=str)}")
+                else:
+                    print(f"🔎 segment {segment}: would update {json.dumps(key, default=str)}: "
+                          f"{kwargs['UpdateExpression']} "
+                          f"{json.dumps(kwargs.get('ExpressionAttributeValues', {}), default=str)}")
+            samples += len(changes)
+            outcomes = []
+        else:
+            outcomes = list(pool.map(lambda c: write_change(write_table, c[0], c[1], limiter), changes))
+        failed_keys += [key for (key, _), outcome in zip(changes, outcomes) if outcome == "failed"]
+        counts = {
+            # Items whose transform failed count as changes that failed
+            "changed": len(changes) + len(failed_keys) - outcomes.count("failed"),
+            "written": outcomes.count("written"),
+            "skipped": outcomes.count("skipped"),
+        }
+        return counts, failed_keys
+
+    def record(delta, retry):
+        for k, v in delta.items():
+            checkpoint[k] += v
+        checkpoint["retry"] = retry
+        if not job["dry_run"]:
+            save_checkpoint(job["checkpoint_dir"], segment, checkpoint)
+        if _progress is not None:
+            _progress.put(delta)
+
+    with ThreadPoolExecutor(max_workers=max(1, job["write_concurrency"])) as pool:
+        # Items that failed on an earlier run go first. They were counted as
+        # scanned and changed then; only their outcome changes now. Items
+        # deleted since are simply not found.
+        if checkpoint["retry"]:
+            retry = checkpoint["retry"]
+            items = batch_get_items(job["table"], retry, scan_args.get("ProjectionExpression"),
+                                    scan_args.get("ExpressionAttributeNames"))
+            counts, still_failed = apply(pool, items)
+            print(f"🔁 segment {segment}: retried {len(retry)} failed item(s), {len(still_failed)} still failing")
+            record({"written": counts["written"], "skipped": counts["skipped"],
+                    "failed": len(still_failed) - len(retry)}, still_failed)
+
+        while not checkpoint["done"]:
+            if checkpoint["lastKey"]:
+                scan_args["ExclusiveStartKey"] = checkpoint["lastKey"]
+            page = table.scan(**scan_args)
+            items = page.get("Items", [])
+            counts, failed_keys = apply(pool, items)
+            checkpoint["lastKey"] = page.get("LastEvaluatedKey")
+            checkpoint["done"] = not checkpoint["lastKey"]
+            record(dict(counts, scanned=len(items), failed=len(failed_keys)), checkpoint["retry"] + failed_keys)
+    return segment, checkpoint
+
+
+_plugins = set()
+
+
+def _load_plugin(path):
+    import importlib.util
+
+    path = os.path.abspath(path)
+    if path in _plugins:
+        return
+    _plugins.add(path)
+    module_spec = importlib.util.spec_from_file_location(f"migration_plugin_{abs(hash(path))}", path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+
+
+# ───────────────────────────────────────────
+# Main
+# ───────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("migration", nargs="?")
+    parser.add_argument("--list", action="store_true", help="list the available migrations")
+    parser.add_argument("--plugin", help="Python file registering extra migrations")
+    parser.add_argument("--table", help="override the migration's table name")
+    parser.add_argument("--target", help="override a copy migration's target table name")
+    parser.add_argument("--region", default=os.getenv("AWS_REGION", "us-east-1"))
+    parser.add_argument("--segments", type=int, default=16, help="parallel scan segments")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1), help="worker processes")
+    parser.add_argument("--write-concurrency", type=int, default=8, help="update threads per worker")
+    parser.add_argument("--max-wps", type=float, default=200, help="writes per second across all workers")
+    parser.add_argument("--page-size", type=int, help="items per scan page (default: 1 MB pages)")
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                        help="option passed to the transform (repeatable)")
+    parser.add_argument("--checkpoint-dir", help="default: .migrate/<migration>-<table>")
+    parser.add_argument("--restart", action="store_true", help="discard checkpoints and start over")
+    parser.add_argument("--dry-run", action="store_true", help="scan and transform but write nothing")
+    args = parser.parse_args()
+
+    os.environ["AWS_DEFAULT_REGION"] = args.region
+    os.environ.setdefault("AWS_RETRY_MODE", "adaptive")
+    os.environ.setdefault("AWS_MAX_ATTEMPTS", "8")
+
+    migrations.load_all()
+    if args.plugin:
+        _load_plugin(args.plugin)
+    if args.list or not args.migration:
+        for name, spec in sorted(migrations.MIGRATIONS.items()):
+            table = f"{spec.table} -> {spec.target}" if spec.target else spec.table
+            print(f"{name:28} {table:18} {spec.description}")
+        return
+    if args.migration not in migrations.MIGRATIONS:
+        sys.exit(f"❌ Unknown migration {args.migration}; see --list")
+
+    spec = migrations.MIGRATIONS[args.migration]
+    from filevault_common import aws
+
+    table_name = args.table or aws.table_name(spec.table)
+    target_name = (args.target or aws.table_name(spec.target)) if spec.target else None
+    options = dict(o.split("=", 1) for o in args.option)
+    checkpoint_dir = args.checkpoint_dir or os.path.join(".migrate", f"{args.migration}-{table_name}")
+    if args.restart and os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    if not args.dry_run:
+        check_manifest(checkpoint_dir, args, table_name, target_name)
+
+    workers = max(1, min(args.workers, args.segments))
+    jobs = [{
+        "migration": args.migration,
+        "plugin": args.plugin,
+        "table": table_name,
+        "target": target_name,
+        "segment": segment,
+        "segments": args.segments,
+        "page_size": args.page_size,
+        "options": options,
+        "checkpoint_dir": checkpoint_dir,
+        "dry_run": args.dry_run,
+        "write_concurrency": args.write_concurrency,
+        # Each segment runs in one process at a time; split the budget across the busy ones
+        "wps": max(1.0, args.max_wps / workers),
+    } for segment in range(args.segments)]
+
+    resumed = 0 if args.dry_run else sum(
+        1 for s in range(args.segments) if os.path.exists(_checkpoint_path(checkpoint_dir, s))
+    )
+    print(f"🚀 {args.migration} on {table_name}{f' -> {target_name}' if target_name else ''}: "
+          f"{args.segments} segment(s), {workers} worker(s)"
+          f"{', dry run' if args.dry_run else ''}{f', resuming {resumed} segment(s)' if resumed else ''}")
+
+    totals = {"scanned": 0, "changed": 0, "written": 0, "skipped": 0, "failed": 0}
+    started = last_report = time.monotonic()
+    progress = multiprocessing.Queue()
+
+    def drain():
+        while True:
+            try:
+                delta = progress.get_nowait()
+            except queue.Empty:
+                return
+            for k, v in delta.items():
+                totals[k] += v
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(progress,)) as pool:
+        futures = [pool.submit(run_segment, job) for job in jobs]
+        while not all(f.done() for f in futures):
+            time.sleep(0.5)
+            drain()
+            if time.monotonic() - last_report >= PROGRESS_SECONDS:
+                last_report = time.monotonic()
+                rate = totals["scanned"] / (last_report - started)
+                print(f"⏳ {sum(f.done() for f in futures)}/{len(futures)} segment(s) done, "
+                      f"{totals['scanned']} scanned ({rate:.0f}/s), {totals['changed']} to change, "
+                      f"{totals['written']} written, {totals['failed']} failed")
+        drain()
+        errors = [f.exception() for f in futures if f.exception()]
+        finished = [f.result() for f in futures if not f.exception()]
+
+    overall = {k: sum(cp[k] for _, cp in finished) for k in totals}
+    elapsed = time.monotonic() - started
+    print(f"✅ {overall['scanned']} scanned, {overall['changed']} to change, {overall['written']} written, "
+          f"{overall['skipped']} skipped ({'already in target' if target_name else 'changed since scan'}), "
+          f"{overall['failed']} failed in {elapsed:.0f}s"
+          + (" (totals include earlier runs)" if resumed else ""))
+    for e in errors[:5]:
+        print(f"❌ segment error: {e}")
+    if errors or overall["failed"]:
+        print("Rerun the same command to resume; failed items are retried first")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
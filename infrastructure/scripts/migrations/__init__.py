@@ -0,0 +1,77 @@
+"""
+Per-item transforms for migrate.py.
+
+A migration is a function registered with @migration. migrate.py scans its
+table and calls it once per item; it returns None to leave the item alone or
+a Change describing the update:
+
+    @migration("user-role-default", table="FileVaultUsers")
+    def role_default(item, ctx):
+        if not item.get("role"):
+            return Change(set={"role": "Viewer"}, condition="attribute_not_exists(#role)")
+
+Changes are written with UpdateItem, always guarded by attribute_exists on
+the key so items deleted since the scan are not recreated. A transform's own
+condition is ANDed on; it may refer to any attribute as #<name> and to the
+values it sets as :<name>. A failed condition counts as "skipped".
+
+A migration registered with target= copies instead: its transform returns
+Change(put=item) and the item is written to the target table with PutItem,
+guarded by attribute_not_exists so items already there (copied earlier or
+written since by the application) are skipped, never overwritten.
+
+ctx carries the options passed with --option key=value (ctx.options) and
+lazily created AWS clients (ctx.client("s3")). Modules in this package are
+imported automatically; --plugin loads transforms from any other file.
+"""
+
+import importlib
+import pkgutil
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+MIGRATIONS = {}
+
+
+@dataclass
+class Change:
+    set: Dict[str, object] = field(default_factory=dict)
+    remove: List[str] = field(default_factory=list)
+    condition: Optional[str] = None
+    values: Dict[str, object] = field(default_factory=dict)  # extra :placeholders for condition
+    put: Optional[Dict[str, object]] = None  # whole item for a copy to the migration's target table
+
+
+@dataclass
+class Migration:
+    name: str
+    table: str
+    transform: Callable
+    description: str = ""
+    projection: Optional[List[str]] = None  # attributes the transform reads (key attributes are added)
+    setup: Optional[Callable] = None        # setup(ctx), run once per worker process
+    target: Optional[str] = None            # table Change.put items are copied to
+
+
+def migration(name, table, projection=None, setup=None, target=None):
+    """Register a transform under `name` for `table` (a table name or env variable name)."""
+    def register(transform):
+        if name in MIGRATIONS:
+            raise ValueError(f"Duplicate migration name: {name}")
+        MIGRATIONS[name] = Migration(
+            name=name,
+            table=table,
+            transform=transform,
+            description=(transform.__doc__ or "").strip().splitlines()[0] if transform.__doc__ else "",
+            projection=list(projection) if projection else None,
+            setup=setup,
+            target=target,
+        )
+        return transform
+    return register
+
+
+def load_all():
+    for module in pkgutil.iter_modules(__path__):
+        importlib.import_module(f"{__name__}.{module.name}")
+    return MIGRATIONS
@@ -0,0 +1,19 @@
+"""FileVaultAuditLog -> FileVaultAuditEvents (sharded keys)."""
+
+import time
+
+from filevault_common import audit
+
+from . import Change, migration
+
+
+@migration("audit-shard-keys", table="FileVaultAuditLog", target="FileVaultAuditEvents")
+def shard_keys(item, ctx):
+    """Copy audit records to the sharded table, adding eventShard/eventKey."""
+    # TTL deletion lags expiry by up to days; do not resurrect expired records
+    if "ttl" in item and int(item["ttl"]) <= time.time():
+        return None
+    if not item.get("auditId") or not item.get("timestamp"):
+        raise ValueError("record has no auditId or timestamp")
+    # Shard count comes from AUDIT_SHARDS, as in the Lambdas; export it if they override it
+    return Change(put=audit.with_keys(dict(item)))
@@ -0,0 +1,77 @@
+"""FileVaultFiles backfills."""
+
+from datetime import datetime, timedelta
+
+from filevault_common import catalog
+
+from . import Change, migration
+
+
+def _setup_pending(ctx):
+    if not ctx.options.get("bucket"):
+        raise ValueError("files-legacy-pending needs --option bucket=<files bucket>")
+    hours = float(ctx.options.get("min_age_hours", "24"))
+    ctx.options["cutoff"] = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+
+
+@migration(
+    "files-legacy-pending",
+    table="FileVaultFiles",
+    projection=["status", "uploadId", "uploadedAt", "s3Key"],
+    setup=_setup_pending,
+)
+def legacy_pending(item, ctx):
+    """Mark single-PUT uploads stuck in PENDING from before finalize_upload existed as AVAILABLE."""
+    if item.get("status") != "PENDING" or item.get("uploadId"):
+        return None  # multipart uploads are completed or aborted by their own routes
+    if (item.get("uploadedAt") or "") > ctx.options["cutoff"]:
+        return None  # may still be in flight
+    try:
+        head = ctx.client("s3").head_object(Bucket=ctx.options["bucket"], Key=item["s3Key"])
+    except Exception as e:
+        if getattr(e, "response", {}).get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None  # never uploaded; list hides it while LIST_HIDE_PENDING is on
+        raise
+    return Change(
+        set={
+            "status": "AVAILABLE",
+            "sizeBytes": head["ContentLength"],
+            "etag": head.get("ETag", "").strip('"'),
+            "completedAt": datetime.utcnow().isoformat(),
+            "updatedAt": datetime.utcnow().isoformat(),
+        },
+        condition="#status = :pending AND attribute_not_exists(#uploadId)",
+        values={":pending": "PENDING"},
+    )
+
+
+@migration(
+    "files-list-keys",
+    table="FileVaultFiles",
+    projection=["fileName", "fileNameLower", "uploadedAt", "completedAt", "deletedFileId"],
+)
+def list_keys(item, ctx):
+    """Add fileNameLower (and uploadedAt where missing) so the file appears in ownerId-uploadedAt-index."""
+    if catalog.is_tombstone(item):
+        return None
+    wanted = {k: v for k, v in catalog.name_keys(item.get("fileName")).items() if item.get(k) != v}
+    if not item.get("uploadedAt"):
+        wanted["uploadedAt"] = item.get("completedAt") or datetime.utcnow().isoformat()
+    if not wanted:
+        return None
+    if "uploadedAt" in wanted:
+        return Change(set=wanted, condition="attribute_not_exists(#uploadedAt)")
+    return Change(set=wanted, condition="#fileName = :fileName", values={":fileName": item["fileName"]})
+
+
+@migration(
+    "files-updated-at",
+    table="FileVaultFiles",
+    projection=["updatedAt", "uploadedAt", "completedAt"],
+)
+def updated_at(item, ctx):
+    """Add updatedAt to records written before delta sync, so they appear in ownerId-updatedAt-index."""
+    if item.get("updatedAt"):
+        return None
+    value = item.get("completedAt") or item.get("uploadedAt") or datetime.utcnow().isoformat()
+    return Change(set={"updatedAt": value}, condition="attribute_not_exists(#updatedAt)")
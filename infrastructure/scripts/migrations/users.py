@@ -0,0 +1,37 @@
+"""FileVaultUsers backfills."""
+
+from datetime import datetime
+
+from filevault_common import directory
+
+from . import Change, migration
+
+
+@migration("user-role-default", table="FileVaultUsers", projection=["role"])
+def role_default(item, ctx):
+    """Give users without a role the Viewer role (formerly migrate-user.py)."""
+    if item.get("role"):
+        return None
+    # delegatedEditor is left absent: it is a GSI key and cannot be written as NULL
+    return Change(
+        set={"role": "Viewer", "updatedAt": datetime.utcnow().isoformat()},
+        condition="attribute_not_exists(#role)",
+    )
+
+
+@migration("user-email-keys", table="FileVaultUsers", projection=["email", "emailLower", "emailInitial"])
+def email_keys(item, ctx):
+    """Add emailLower/emailInitial so the user appears in email-prefix-index."""
+    wanted = directory.email_keys(item.get("email"))
+    if not wanted or all(item.get(k) == v for k, v in wanted.items()):
+        return None
+    return Change(set=wanted, condition="#email = :email", values={":email": item["email"]})
+
+
+@migration("user-created-at", table="FileVaultUsers", projection=["createdAt", "updatedAt"])
+def created_at(item, ctx):
+    """Add createdAt to users written without one, so they appear in role-index."""
+    if item.get("createdAt"):
+        return None
+    value = item.get("updatedAt") or datetime.utcnow().isoformat()
+    return Change(set={"createdAt": value}, condition="attribute_not_exists(#createdAt)")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Bulk-provision FileVault users from a CSV or NDJSON file.
+
+Each input row becomes a Cognito user (username = email) in the group for
+its role plus a FileVaultUsers record shaped by filevault_common.directory,
+the same code the post-confirmation trigger uses. Cognito calls run on a
+thread pool paced by token buckets (--create-rps, --group-rps) with
+botocore adaptive retries behind them; records are written with
+batch_write_item, 25 at a time.
+
+Input columns / keys (only email is required):
+    email, name | fullName | given_name + family_name, role, delegatedEditor
+
+The run is resumable: every user whose record is written is appended to the
+--state file, and a rerun skips them. A user created in Cognito by an
+interrupted run is looked up instead of created, and (like post-confirmation)
+users already in a group keep their groups, so rerunning never changes an
+existing user's access. Existing FileVaultUsers records are never overwritten.
+
+Throughput is bounded by the account's Cognito quotas: at the default 25
+creations/s, 50k users take about half an hour; raise --create-rps and
+--group-rps after raising the quotas.
+
+Usage: python3 provision-users.py users.csv --user-pool-id us-east-1_XXXX
+                                  [--state users.csv.state] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+LAYER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "lambdas", "shared", "python")
+sys.path.insert(0, LAYER)
+
+ROLE_GROUPS = {"Admin": "Admins", "Editor": "Editors", "Viewer": "Viewers"}
+PROGRESS_EVERY = 500
+
+
+# ───────────────────────────────────────────
+# Input
+# ───────────────────────────────────────────
+def read_rows(path, fmt):
+    """Yield (line number, raw dict) from a CSV or NDJSON file."""
+    if fmt == "auto":
+        fmt = "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+
+
+def normalize(raw):
+    """Validate one input row; returns {email, fullName, role, delegatedEditor}."""
+    row = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items() if k}
+    email = (row.get("email") or "").lower()
+    if "@" not in email:
+        raise ValueError(f"invalid email: {row.get('email')!r}")
+    role = (row.get("role") or "Viewer").capitalize()
+    if role not in ROLE_GROUPS:
+        raise ValueError(f"invalid role: {row.get('role')!r}")
+    full_name = (
+        row.get("name") or row.get("fullName") or row.get("full_name")
+        or f"{row.get('given_name') or ''} {row.get('family_name') or ''}".strip()
+    )
+    return {
+        "email": email,
+        "fullName": full_name,
+        "role": role,
+        "delegatedEditor": row.get("delegatedEditor") or None,
+    }
+
+
+# ───────────────────────────────────────────
+# Resume state
+# ───────────────────────────────────────────
+class StateFile:
+    """Append-only NDJSON of {"email", "userId"} for users fully provisioned."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["email"])
+                    except (ValueError, KeyError):
+                        pass  # torn last line from an interrupted run
+        self._file = None
+
+    def mark_done(self, records):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        for record in records:
+            self._file.write(json.dumps({"email": record["email"], "userId": record["userId"]}) + "\n")
+            self.done.add(record["email"])
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+# ───────────────────────────────────────────
+# Cognito
+# ───────────────────────────────────────────
+def _attribute(attributes, name):
+    return next((a["Value"] for a in attributes if a["Name"] == name), None)
+
+
+def provision_cognito(cognito, user, args, create_limiter, group_limiter):
+    """
+    Create (or find) the Cognito user and place it in its role's group.
+
+    Returns (sub, username, created, role); role differs from the requested
+    one when an existing user keeps the groups they already had.
+    """
+    username = user["email"]
+    attributes = [
+        {"Name": "email", "Value": user["email"]},
+        {"Name": "email_verified", "Value": "true"},
+    ]
+    if user["fullName"]:
+        attributes.append({"Name": "name", "Value": user["fullName"]})
+
+    create_args = {"UserPoolId": args.user_pool_id, "Username": username, "UserAttributes": attributes}
+    if args.suppress_invite:
+        create_args["MessageAction"] = "SUPPRESS"
+    else:
+        create_args["DesiredDeliveryMediums"] = ["EMAIL"]
+
+    created = True
+    create_limiter.acquire()
+    try:
+        cognito_user = cognito.admin_create_user(**create_args)["User"]
+        sub = _attribute(cognito_user.get("Attributes", []), "sub")
+    except cognito.exceptions.UsernameExistsException:
+        created = False
+        create_limiter.acquire()
+        existing = cognito.admin_get_user(UserPoolId=args.user_pool_id, Username=username)
+        sub = _attribute(existing.get("UserAttributes", []), "sub")
+    if not sub:
+        raise RuntimeError("Cognito returned no sub")
+
+    # Same rule as post-confirmation: only users without any group get one
+    if not created:
+        group_limiter.acquire()
+        groups = {g["GroupName"] for g in cognito.admin_list_groups_for_user(
+            UserPoolId=args.user_pool_id, Username=username
+        ).get("Groups", [])}
+        if groups:
+            role = next((r for r, g in ROLE_GROUPS.items() if g in groups), user["role"])
+            return sub, username, False, role
+
+    group_limiter.acquire()
+    cognito.admin_add_user_to_group(
+        UserPoolId=args.user_pool_id, Username=username, GroupName=ROLE_GROUPS[user["role"]]
+    )
+    return sub, username, created, user["role"]
+
+
+# ───────────────────────────────────────────
+# DynamoDB
+# ───────────────────────────────────────────
+def write_records(records, args, state):
+    """batch_write the records that do not exist yet, then mark the whole chunk done."""
+    from filevault_common.batch import batch_get_items, batch_write
+
+    existing = {
+        item["userId"] for item in batch_get_items(
+            args.users_table, [{"userId": r["userId"]} for r in records], projection="userId"
+        )
+    }
+    fresh = [r for r in records if r["userId"] not in existing]
+    if fresh:
+        batch_write({args.users_table: [{"PutRequest": {"Item": r}} for r in fresh]})
+    state.mark_done(records)
+    return len(fresh), len(records) - len(fresh)
+
+
+# ───────────────────────────────────────────
+# Main
+# ───────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="CSV or NDJSON file of users")
+    parser.add_argument("--format", choices=["auto", "csv", "ndjson"], default="auto")
+    parser.add_argument("--user-pool-id", required=True)
+    parser.add_argument("--users-table", default="FileVaultUsers")
+    parser.add_argument("--region", default=os.getenv("AWS_REGION", "us-east-1"))
+    parser.add_argument("--state", help="resume file (default: <input>.state)")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--create-rps", type=float, default=25, help="AdminCreateUser/AdminGetUser calls per second")
+    parser.add_argument("--group-rps", type=float, default=25, help="group calls per second")
+    parser.add_argument("--suppress-invite", action="store_true", help="do not email temporary passwords")
+    parser.add_argument("--dry-run", action="store_true", help="validate the input and report what would be done")
+    args = parser.parse_args()
+
+    # Picked up by every botocore client created below
+    os.environ["AWS_DEFAULT_REGION"] = args.region
+    os.environ.setdefault("AWS_RETRY_MODE", "adaptive")
+    os.environ.setdefault("AWS_MAX_ATTEMPTS", "10")
+
+    from filevault_common import aws, directory
+    from filevault_common.batch import WRITE_CHUNK
+    from filevault_common.ratelimit import RateLimiter
+
+    state = StateFile(args.state or args.input + ".state")
+
+    users, invalid, seen = [], [], set()
+    for line_no, raw in read_rows(args.input, args.format):
+        try:
+            user = normalize(raw)
+        except (ValueError, AttributeError) as e:
+            invalid.append((line_no, str(e)))
+            continue
+        if user["email"] in seen:
+            invalid.append((line_no, f"duplicate email {user['email']}"))
+            continue
+        seen.add(user["email"])
+        if user["email"] not in state.done:
+            users.append(user)
+
+    print(f"🔍 {len(seen)} user(s) in {args.input}: {len(seen) - len(users)} already provisioned, "
+          f"{len(users)} to go, {len(invalid)} invalid row(s)")
+    for line_no, reason in invalid[:20]:
+        print(f"⚠️  line {line_no}: {reason}")
+    if args.dry_run or not users:
+        return
+
+    cognito = aws.client("cognito-idp")
+    create_limiter = RateLimiter(args.create_rps)
+    group_limiter = RateLimiter(args.group_rps)
+
+    started = time.monotonic()
+    pending, failed = [], []
+    counts = {"created": 0, "written": 0, "kept": 0}
+
+    def provision(user):
+        sub, username, created, role = provision_cognito(cognito, user, args, create_limiter, group_limiter)
+        record = directory.user_record(
+            sub, user["email"], user["fullName"], role=role,
+            delegated_editor=user["delegatedEditor"], cognito_username=username,
+        )
+        return record, created
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(provision, user): user for user in users}
+        for done, future in enumerate(as_completed(futures), start=1):
+            user = futures[future]
+            try:
+                record, created = future.result()
+            except Exception as e:
+                failed.append((user["email"], str(e)))
+            else:
+                counts["created"] += created
+                pending.append(record)
+            # DynamoDB writes stay on this thread: boto3 resources are not thread-safe
+            if len(pending) >= WRITE_CHUNK:
+                written, kept = write_records(pending[:WRITE_CHUNK], args, state)
+                del pending[:WRITE_CHUNK]
+                counts["written"] += written
+                counts["kept"] += kept
+            if done % PROGRESS_EVERY == 0:
+                rate = done / (time.monotonic() - started)
+                print(f"⏳ {done}/{len(users)} processed ({rate:.0f}/s), {len(failed)} failed")
+
+    while pending:
+        written, kept = write_records(pending[:WRITE_CHUNK], args, state)
+        del pending[:WRITE_CHUNK]
+        counts["written"] += written
+        counts["kept"] += kept
+
+    elapsed = time.monotonic() - started
+    print(f"✅ {counts['written']} record(s) written, {counts['kept']} existing record(s) kept, "
+          f"{counts['created']} Cognito user(s) created in {elapsed:.0f}s")
+    if failed:
+        for email, reason in failed[:20]:
+            print(f"❌ {email}: {reason}")
+        print(f"{len(failed)} user(s) failed; rerun with the same --state to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Cold-start import budget check for every FileVault Lambda.
+
+Each handler module is imported in a fresh interpreter with the shared layer
+on sys.path (as /opt/python would be in Lambda). The check fails if an import
+exceeds the budget or pulls in boto3 or botocore - AWS clients, and botocore
+exceptions, must be loaded lazily.
+
+Usage: python3 test-import-budget.py [--budget-ms 150]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "lambdas")
+LAYER = os.path.join(ROOT, "shared", "python")
+
+HANDLERS = [
+    "admin_delete", "audit", "audit_archive", "check_mfa_status", "delete", "download",
+    "finalize_upload", "get_delegated_users", "list", "post-confirmation", "update_delegate",
+    "update-role", "upload", "users",
+]
+
+# Dummy values for the environment variables read at import time
+FAKE_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "BUCKET_NAME": "budget-bucket",
+    "FILES_BUCKET": "budget-bucket",
+    "FILES_TABLE": "FileVaultFiles",
+    "USERS_TABLE": "FileVaultUsers",
+    "GENERAL_AUDIT_TABLE": "FileVaultAuditLog",
+    "DELETION_AUDIT_TABLE": "FileVaultDeletionAuditLog",
+    "AUDIT_TABLE": "FileVaultDeletionAuditLog",
+    "USER_POOL_ID": "us-east-1_budget",
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "loaded": [m for m in ("boto3", "botocore") if m in sys.modules]}))
+"""
+
+
+def measure(name):
+    env = dict(os.environ, **FAKE_ENV)
+    env["PYTHONPATH"] = os.pathsep.join([os.path.join(ROOT, name), LAYER])
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    proc = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    failures = 0
+    for name in HANDLERS:
+        result = measure(name)
+        if "error" in result:
+            print(f"❌ {name}: {result['error']}")
+            failures += 1
+        elif result["loaded"]:
+            print(f"❌ {name}: imports {' and '.join(result['loaded'])} at module load ({result['ms']:.1f} ms)")
+            failures += 1
+        elif result["ms"] > args.budget_ms:
+            print(f"❌ {name}: {result['ms']:.1f} ms > {args.budget_ms:.0f} ms budget")
+            failures += 1
+        else:
+            print(f"✅ {name}: {result['ms']:.1f} ms")
+
+    if failures:
+        print(f"{failures} handler(s) over the import budget")
+        sys.exit(1)
+    print("🎉 All handlers within the import budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,12 @@ $root = Join-Path $PSScriptRoot "..\terraform\modules\lambdas"
 # Map folder names to zip file names (handles hyphens vs underscores)
 $lambdaMapping = @{
     "admin_delete"        = "admin_delete"
+    "audit"               = "audit"
+    "audit_archive"       = "audit_archive"
     "check_mfa_status"    = "check_mfa_status"
     "delete"              = "delete"
     "download"            = "download"
+    "finalize_upload"     = "finalize_upload"
     "get_delegated_users" = "get_delegated_users"
     "list"                = "list"
     "post-confirmation"   = "post_confirmation"
@@ -40,4 +43,14 @@ foreach ($folder in $lambdaMapping.Keys) {
     }
 }
 
+# Shared runtime layer: Lambda expects packages under python/
+$layerZip = Join-Path $root "filevault_common_layer.zip"
+$layerSrc = Join-Path $root "shared\python"
+if (Test-Path $layerZip) {
+    Remove-Item $layerZip -Force
+}
+Get-ChildItem -Path $layerSrc -Recurse -Directory -Filter "__pycache__" | Remove-Item -Recurse -Force
+Compress-Archive -Path $layerSrc -DestinationPath $layerZip -CompressionLevel Optimal
+Write-Host "Zipped shared layer -> filevault_common_layer.zip" -ForegroundColor Green
+
 Write-Host "All Lambda zips created." -ForegroundColor Green
\ No newline at end of file
@@ -1,13 +1,36 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-ROOT="$(dirname "$0")/../terraform/modules/lambdas"
+ROOT="$(cd "$(dirname "$0")/../terraform/modules/lambdas" && pwd)"
 
 echo "📦 Zipping Lambda functions..."
 
-for fn in upload list download delete; do
-  zip -j "$ROOT/${fn}.zip" "$ROOT/$fn/main.py"
-  echo "✅ Zipped $fn -> ${fn}.zip"
+# folder:zip name (handles hyphens vs underscores)
+for entry in \
+  admin_delete:admin_delete \
+  audit:audit \
+  audit_archive:audit_archive \
+  check_mfa_status:check_mfa_status \
+  delete:delete \
+  download:download \
+  finalize_upload:finalize_upload \
+  get_delegated_users:get_delegated_users \
+  list:list \
+  post-confirmation:post_confirmation \
+  update_delegate:update_delegate \
+  update-role:update_role \
+  upload:upload \
+  users:users; do
+  folder="${entry%%:*}"
+  name="${entry##*:}"
+  rm -f "$ROOT/${name}.zip"
+  zip -j "$ROOT/${name}.zip" "$ROOT/$folder/main.py"
+  echo "✅ Zipped $folder -> ${name}.zip"
 done
 
+# Shared runtime layer: Lambda expects packages under python/
+rm -f "$ROOT/filevault_common_layer.zip"
+(cd "$ROOT/shared" && zip -r "$ROOT/filevault_common_layer.zip" python -x "*__pycache__*")
+echo "✅ Zipped shared layer -> filevault_common_layer.zip"
+
 echo "🎉 All Lambda zips created."
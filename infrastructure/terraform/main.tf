@@ -56,6 +56,7 @@ module "api" {
   get_delegated_users_lambda_arn = module.lambdas.get_delegated_users_lambda_arn
   admin_delete_lambda_arn    = module.lambdas.admin_delete_lambda_arn
   check_mfa_status_lambda_arn = module.lambdas.check_mfa_status_lambda_arn
+  audit_lambda_arn           = module.lambdas.audit_lambda_arn
 }
 
 
@@ -72,12 +73,16 @@ module "lambdas" {
   user_pool_arn     = module.auth.user_pool_arn
   files_table_name  = module.storage.filevault_files_name
   files_table_arn   = module.storage.filevault_files_arn
+  blobs_table_name  = module.storage.filevault_blobs_name
+  blobs_table_arn   = module.storage.filevault_blobs_arn
   api_id            = module.api.api_id
   api_execution_arn = module.api.execution_arn
   general_audit_table_name  = module.storage.general_audit_table_name
   general_audit_table_arn   = module.storage.general_audit_table_arn
   deletion_audit_table_name = module.storage.deletion_audit_table_name
   deletion_audit_table_arn  = module.storage.deletion_audit_table_arn
+  general_audit_stream_arn  = module.storage.general_audit_stream_arn
+  deletion_audit_stream_arn = module.storage.deletion_audit_stream_arn
 }
 
 # ───────────────────────────────────────────
@@ -6,9 +6,10 @@ resource "aws_apigatewayv2_api" "this" {
   protocol_type = "HTTP"
 
   cors_configuration {
-    allow_headers = ["Authorization", "Content-Type"]
-    allow_methods = ["GET", "PATCH", "POST", "DELETE", "OPTIONS"]
-    allow_origins =  var.allowed_origins
+    allow_headers  = ["Authorization", "Content-Type", "If-None-Match"]
+    expose_headers = ["ETag"]
+    allow_methods  = ["GET", "PATCH", "POST", "DELETE", "OPTIONS"]
+    allow_origins  = var.allowed_origins
   }
 }
 
@@ -98,6 +99,30 @@ resource "aws_apigatewayv2_route" "upload" {
   authorization_type = "JWT"
 }
 
+resource "aws_apigatewayv2_route" "upload_parts" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "POST /api/files/{id}/upload-parts"
+  target             = "integrations/${aws_apigatewayv2_integration.upload.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
+resource "aws_apigatewayv2_route" "upload_complete" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "POST /api/files/{id}/complete"
+  target             = "integrations/${aws_apigatewayv2_integration.upload.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
+resource "aws_apigatewayv2_route" "upload_abort" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "POST /api/files/{id}/abort"
+  target             = "integrations/${aws_apigatewayv2_integration.upload.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
 resource "aws_apigatewayv2_route" "list" {
   api_id             = aws_apigatewayv2_api.this.id
   route_key          = "GET /api/files"
@@ -114,6 +139,14 @@ resource "aws_apigatewayv2_route" "download" {
   authorization_type = "JWT"
 }
 
+resource "aws_apigatewayv2_route" "download_urls" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "POST /api/files/download-urls"
+  target             = "integrations/${aws_apigatewayv2_integration.download.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
 resource "aws_apigatewayv2_route" "delete" {
   api_id             = aws_apigatewayv2_api.this.id
   route_key          = "DELETE /api/files/{id}"
@@ -121,6 +154,14 @@ resource "aws_apigatewayv2_route" "delete" {
   authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
   authorization_type = "JWT"
 }
+
+resource "aws_apigatewayv2_route" "bulk_delete" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "POST /api/files/delete"
+  target             = "integrations/${aws_apigatewayv2_integration.delete.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
 # Users API Route
 resource "aws_apigatewayv2_route" "list_users" {
   api_id             = aws_apigatewayv2_api.this.id
@@ -149,6 +190,15 @@ resource "aws_apigatewayv2_route" "update_role" {
   authorization_type = "JWT"
 }
 
+# PATCH /api/users/roles (bulk)
+resource "aws_apigatewayv2_route" "update_roles_bulk" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "PATCH /api/users/roles"
+  target             = "integrations/${aws_apigatewayv2_integration.update_role.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
 # PATCH /api/users/{id}/delegate
 resource "aws_apigatewayv2_integration" "update_delegate" {
   api_id                  = aws_apigatewayv2_api.this.id
@@ -166,6 +216,15 @@ resource "aws_apigatewayv2_route" "update_delegate" {
   authorization_type = "JWT"
 }
 
+# PATCH /api/users/{id}/delegates (bulk: many viewers to one editor)
+resource "aws_apigatewayv2_route" "bulk_delegate" {
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = "PATCH /api/users/{id}/delegates"
+  target             = "integrations/${aws_apigatewayv2_integration.update_delegate.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
+
 
 #############################################
 # Get Delegated Users Route (Editor Access)
@@ -226,3 +285,28 @@ resource "aws_apigatewayv2_route" "check_mfa_status" {
   authorization_type = "JWT"
 }
 
+
+#############################################
+# Audit Query & Export Routes (Admin)
+#############################################
+resource "aws_apigatewayv2_integration" "audit" {
+  api_id                 = aws_apigatewayv2_api.this.id
+  integration_type       = "AWS_PROXY"
+  integration_uri        = var.audit_lambda_arn
+  integration_method     = "POST"
+  payload_format_version = "2.0"
+}
+
+resource "aws_apigatewayv2_route" "audit" {
+  for_each = toset([
+    "GET /api/audit",
+    "POST /api/audit/exports",
+    "GET /api/audit/exports/{id}",
+  ])
+
+  api_id             = aws_apigatewayv2_api.this.id
+  route_key          = each.key
+  target             = "integrations/${aws_apigatewayv2_integration.audit.id}"
+  authorizer_id      = aws_apigatewayv2_authorizer.cognito.id
+  authorization_type = "JWT"
+}
@@ -45,6 +45,10 @@ variable "check_mfa_status_lambda_arn" {
   description = "ARN of the check MFA status Lambda function"
   type        = string
 }
+variable "audit_lambda_arn" {
+  description = "ARN of the audit query and export Lambda function"
+  type        = string
+}
 variable "allowed_origins" {
   description = "List of allowed CORS origins"
   type        = list(string)
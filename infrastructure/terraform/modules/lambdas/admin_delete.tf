@@ -46,15 +46,26 @@ resource "aws_iam_policy" "admin_delete_policy" {
         Effect = "Allow",
         Action = [
           "dynamodb:GetItem",
-          "dynamodb:DeleteItem"
+          "dynamodb:DeleteItem",
+          "dynamodb:BatchWriteItem"
         ],
         Resource = var.files_table_arn
       },
+      {
+        Sid    = "AllowBlobRefcounts",
+        Effect = "Allow",
+        Action = [
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = var.blobs_table_arn
+      },
       {
         Sid    = "AllowAuditLogging",
         Effect = "Allow",
         Action = [
-          "dynamodb:PutItem"
+          "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem"
         ],
         Resource = var.deletion_audit_table_arn
       }
@@ -78,13 +89,15 @@ resource "aws_lambda_function" "admin_delete" {
 
   filename         = "${path.module}/admin_delete.zip"
   source_code_hash = filebase64sha256("${path.module}/admin_delete/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, local.sync_env, {
       BUCKET_NAME = var.bucket_name
       FILES_TABLE = var.files_table_name
+      BLOBS_TABLE = var.blobs_table_name
       AUDIT_TABLE = var.deletion_audit_table_name
-    }
+    })
   }
 
   timeout     = 15
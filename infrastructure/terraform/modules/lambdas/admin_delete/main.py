@@ -1,45 +1,45 @@
-import json, boto3, os, datetime
-from botocore.exceptions import ClientError
+import os, datetime
 
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
+from filevault_common import RequestContext, audit, aws, blobs, catalog, flush_after, instrumented, response
 
 BUCKET = os.environ["BUCKET_NAME"]
-FILES_TABLE = os.environ["FILES_TABLE"]
-AUDIT_TABLE = os.environ["AUDIT_TABLE"]
-
-files_table = dynamodb.Table(FILES_TABLE)
-audit_table = dynamodb.Table(AUDIT_TABLE)
 
+@instrumented
+@flush_after
 def handler(event, context):
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    user_id = claims.get("sub")
-    email = claims.get("email")
-    groups = claims.get("cognito:groups", [])
-    if isinstance(groups, str):
-        groups = [g.strip() for g in groups.strip("[]").replace('"','').replace("'",'').split(",") if g.strip()]
+    ctx = RequestContext.from_event(event)
+    user_id = ctx.user_id
+    email = ctx.email
 
-    if "Admins" not in groups:
+    if not ctx.is_admin:
         return _response(403, {"error": "Admins only – audit route"})
 
-    file_id = event.get("pathParameters", {}).get("id")
+    file_id = (event.get("pathParameters") or {}).get("id")
     if not file_id:
         return _response(400, {"error": "Missing file ID"})
 
+    files_table = aws.table("FILES_TABLE")
     file_item = files_table.get_item(Key={"fileId": file_id}).get("Item")
-    if not file_item:
+    if not file_item or catalog.is_tombstone(file_item):
         return _response(404, {"error": "File not found"})
 
     owner_id = file_item.get("ownerId", "unknown")
 
     try:
-        s3.delete_object(Bucket=BUCKET, Key=f"uploads/{file_id}")
-        files_table.delete_item(Key={"fileId": file_id})
-    except ClientError as e:
+        removed = catalog.delete_record(file_id)
+        if removed is None:
+            # A concurrent or retried delete removed it and released its blob
+            return _response(404, {"error": "File not found"})
+        catalog.record_deletions([removed])
+        # Deduplicated content is shared: only the last reference removes the object
+        if not removed.get("blobId") or blobs.release(removed["blobId"]):
+            s3_key = removed.get("s3Key", f"uploads/{file_id}")
+            aws.client("s3").delete_object(Bucket=BUCKET, Key=s3_key)
+    except aws.client_error() as e:
         return _response(500, {"error": str(e)})
 
     # 🔒 Audit record
-    audit_table.put_item(Item={
+    audit.enqueue({
         "auditId": f"{file_id}-{datetime.datetime.utcnow().isoformat()}",
         "fileId": file_id,
         "deletedBy": user_id,
@@ -47,18 +47,10 @@ def handler(event, context):
         "deletedAt": datetime.datetime.utcnow().isoformat(),
         "ownerId": owner_id,
         "action": "DELETE"
-    })
+    }, "AUDIT_TABLE")
 
     return _response(200, {"deleted": file_id, "auditLogged": True})
 
 
 def _response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "DELETE,OPTIONS"
-        },
-        "body": json.dumps(body)
-    }
+    return response(status, body, methods="DELETE,OPTIONS")
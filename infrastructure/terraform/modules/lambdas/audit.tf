@@ -0,0 +1,153 @@
+#############################################
+# Secure File Vault - Audit Query & Export Lambda (Admin)
+#############################################
+
+# ───────────────────────────────────────────
+# IAM Role for Audit Lambda
+# ───────────────────────────────────────────
+resource "aws_iam_role" "audit_role" {
+  name = "filevault-audit-query-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect    = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" },
+      Action    = "sts:AssumeRole"
+    }]
+  })
+}
+
+# ───────────────────────────────────────────
+# Attach Basic Logging Policy
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy_attachment" "audit_logs" {
+  role       = aws_iam_role.audit_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+# ───────────────────────────────────────────
+# Custom Inline Policy for Audit Queries and Exports
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy" "audit_policy" {
+  role = aws_iam_role.audit_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      # DynamoDB: key-condition queries only (no Scan)
+      {
+        Effect = "Allow",
+        Action = ["dynamodb:Query"],
+        Resource = [
+          var.general_audit_table_arn,
+          "${var.general_audit_table_arn}/index/*"
+        ]
+      },
+
+      # S3: export manifests and parts
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:PutObject",
+          "s3:GetObject"
+        ],
+        Resource = "arn:aws:s3:::${var.bucket_name}/exports/audit/*"
+      },
+
+      # Without ListBucket S3 reports a missing manifest as AccessDenied
+      # instead of NoSuchKey, and an unknown export id would answer 500, not 404
+      {
+        Effect   = "Allow",
+        Action   = ["s3:ListBucket"],
+        Resource = "arn:aws:s3:::${var.bucket_name}"
+      },
+
+      # KMS Encryption Permissions
+      {
+        Effect = "Allow",
+        Action = [
+          "kms:Encrypt",
+          "kms:Decrypt",
+          "kms:GenerateDataKey*",
+          "kms:DescribeKey"
+        ],
+        Resource = "arn:aws:kms:${var.region}:${var.account_id}:key/${var.kms_key_id}"
+      }
+    ]
+  })
+}
+
+# Exports continue in fresh asynchronous invocations of this function
+resource "aws_iam_role_policy" "audit_invoke_self" {
+  name = "filevault-audit-invoke-self"
+  role = aws_iam_role.audit_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect   = "Allow",
+      Action   = ["lambda:InvokeFunction"],
+      Resource = aws_lambda_function.audit.arn
+    }]
+  })
+}
+
+# ───────────────────────────────────────────
+# Attach Shared Audit Logging Policy
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy_attachment" "audit_audit_logging" {
+  role       = aws_iam_role.audit_role.name
+  policy_arn = aws_iam_policy.audit_logging_policy.arn
+}
+
+# ───────────────────────────────────────────
+# Lambda Function Definition
+# ───────────────────────────────────────────
+resource "aws_lambda_function" "audit" {
+  function_name = "filevault-audit-query"
+  runtime       = "python3.11"
+  role          = aws_iam_role.audit_role.arn
+  handler       = "main.lambda_handler"
+  timeout       = 300
+  memory_size   = 512
+
+  filename         = "${path.module}/audit.zip"
+  source_code_hash = filebase64sha256("${path.module}/audit/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
+
+  environment {
+    variables = merge(local.logging_env, {
+      GENERAL_AUDIT_TABLE = var.general_audit_table_name
+      FILES_BUCKET        = var.bucket_name
+      KMS_KEY_ID          = var.kms_key_id
+      AUDIT_PAGE_SIZE     = "50"
+      AUDIT_MAX_PAGE_SIZE = "500"
+
+      # Exports
+      AUDIT_EXPORT_PART_RECORDS   = "50000"
+      AUDIT_EXPORT_PAGE_SIZE      = "1000"
+      AUDIT_EXPORT_TIME_MARGIN_MS = "30000"
+      AUDIT_EXPORT_URL_TTL        = "3600"
+    })
+  }
+}
+
+# ───────────────────────────────────────────
+# Lambda Permission for API Gateway Invocation
+# ───────────────────────────────────────────
+resource "aws_lambda_permission" "allow_apigw_audit" {
+  statement_id  = "AllowAPIGatewayInvokeAudit"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.audit.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${var.api_execution_arn}/*/*"
+}
+
+# ───────────────────────────────────────────
+# Output (ARN for API Gateway Integration)
+# ───────────────────────────────────────────
+output "audit_lambda_arn" {
+  description = "ARN of the filevault-audit-query Lambda function"
+  value       = aws_lambda_function.audit.arn
+}
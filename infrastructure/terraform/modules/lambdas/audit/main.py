@@ -0,0 +1,335 @@
+import os
+import io
+import gzip
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from filevault_common import RequestContext, audit, aws, flush_after, instrumented, log, log_event
+from filevault_common import response as _http_response
+from filevault_common.pagination import PaginationError, collect_page, decode_cursor, encode_cursor, parse_limit
+
+# Pagination settings
+DEFAULT_PAGE_SIZE = int(os.getenv("AUDIT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("AUDIT_MAX_PAGE_SIZE", "500"))
+
+# Exports: gzipped NDJSON parts under exports/audit/<exportId>/ in the files bucket
+EXPORT_PREFIX = "exports/audit"
+EXPORT_PART_RECORDS = int(os.getenv("AUDIT_EXPORT_PART_RECORDS", "50000"))
+EXPORT_PAGE_SIZE = int(os.getenv("AUDIT_EXPORT_PAGE_SIZE", "1000"))
+# Stop starting new pages this close to the Lambda timeout and continue in a new invocation
+EXPORT_TIME_MARGIN_MS = int(os.getenv("AUDIT_EXPORT_TIME_MARGIN_MS", "30000"))
+EXPORT_URL_TTL = int(os.getenv("AUDIT_EXPORT_URL_TTL", "3600"))
+FILES_BUCKET = os.getenv("FILES_BUCKET")
+KMS_KEY_ID = os.getenv("KMS_KEY_ID")
+
+
+@instrumented
+@flush_after
+def lambda_handler(event, context):
+    # Continuations of an export are invoked directly, never through API Gateway
+    if "auditExport" in event:
+        return _run_export(event["auditExport"]["exportId"], context)
+
+    ctx = RequestContext.from_event(event)
+    if not ctx.is_admin:
+        log_event("UnauthorizedAuditAccessAttempt", actor=ctx.actor, status="DENIED",
+                  details={"route": event.get("routeKey")}, ip=ctx.ip)
+        return response(403, {"error": "Forbidden – Admins only"})
+
+    route = event.get("routeKey")
+    if route == "POST /api/audit/exports":
+        return _start_export(event, ctx, context)
+    if route == "GET /api/audit/exports/{id}":
+        return _export_status(event)
+    return _query(event, ctx)
+
+
+# ───────────────────────────────────────────
+# Filters → key conditions
+# ───────────────────────────────────────────
+def _parse_filters(source):
+    filters = {
+        "actor": source.get("actor") or None,
+        "target": source.get("target") or None,
+        "eventType": source.get("eventType") or None,
+        "from": source.get("from") or None,
+        "to": source.get("to") or None,
+        "order": (source.get("order") or "desc").lower(),
+    }
+    if filters["order"] not in ("asc", "desc"):
+        raise ValueError("order must be asc or desc")
+    for bound in ("from", "to"):
+        value = filters[bound]
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Invalid {bound} timestamp: {value}")
+            # A bare date as the upper bound means "through the end of that day"
+            if bound == "to" and len(value) == 10:
+                filters["to"] = value + "T23:59:59.999999"
+    if not (filters["actor"] or filters["target"] or filters["eventType"]):
+        raise ValueError("Filter by at least one of actor, target or eventType")
+    return filters
+
+
+def _plan(filters):
+    """
+    Pick the key condition: actorUserId-index or targetUserId-index (eventKey
+    range), or else the event type's shards, read with audit.query_event_type.
+    The remaining filters become a FilterExpression.
+    """
+    if filters["actor"]:
+        mode, hash_attr = "actor", "actorUserId"
+    elif filters["target"]:
+        mode, hash_attr = "target", "targetUserId"
+    else:
+        return "eventType", {}
+
+    residual = None
+    for attr, name in (("targetUserId", "target"), ("eventType", "eventType")):
+        if filters[name] and attr != hash_attr:
+            clause = aws.attr(attr).eq(filters[name])
+            residual = clause if residual is None else residual & clause
+
+    condition = aws.key(hash_attr).eq(filters[mode])
+    bounds = audit.range_condition(filters["from"], filters["to"])
+    if bounds is not None:
+        condition &= bounds
+    kwargs = {
+        "IndexName": f"{hash_attr}-index",
+        "KeyConditionExpression": condition,
+        "ScanIndexForward": filters["order"] == "asc",
+    }
+    if residual is not None:
+        kwargs["FilterExpression"] = residual
+    return mode, kwargs
+
+
+def _fetch(filters, mode, kwargs, limit, position):
+    """
+    One page for a plan; `position` is where the previous page stopped (a
+    LastEvaluatedKey for the indexes, an eventKey for the sharded table).
+    Returns (items, next position or None).
+    """
+    if mode == "eventType":
+        return audit.query_event_type(
+            filters["eventType"], limit, start=filters["from"], end=filters["to"],
+            ascending=filters["order"] == "asc", after=position,
+        )
+    return collect_page(aws.table("GENERAL_AUDIT_TABLE").query, kwargs, limit, position)
+
+
+# ───────────────────────────────────────────
+# GET /api/audit
+# ───────────────────────────────────────────
+def _query(event, ctx):
+    params = event.get("queryStringParameters") or {}
+    try:
+        filters = _parse_filters(params)
+        limit = parse_limit(params.get("limit"), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        cursor = decode_cursor(params.get("cursor"))
+    except (ValueError, PaginationError) as e:
+        return response(400, {"error": str(e)})
+
+    mode, kwargs = _plan(filters)
+    if cursor and cursor.get("mode") != mode:
+        return response(400, {"error": "Cursor does not belong to this query"})
+
+    try:
+        items, position = _fetch(filters, mode, kwargs, limit, (cursor or {}).get("pos"))
+    except Exception as e:
+        log.error("ERROR querying audit log: %s", e)
+        return response(500, {"error": "Internal server error", "details": str(e)})
+
+    log.debug("audit query returned %s event(s) (mode=%s, more=%s)", len(items), mode, position is not None)
+    return response(200, {
+        "events": items,
+        "count": len(items),
+        "nextCursor": encode_cursor({"mode": mode, "pos": position}) if position else None,
+    })
+
+
+# ───────────────────────────────────────────
+# Exports: POST /api/audit/exports, GET /api/audit/exports/{id}
+# ───────────────────────────────────────────
+def _manifest_key(export_id):
+    return f"{EXPORT_PREFIX}/{export_id}/manifest.json"
+
+
+def _put_object(key, body, content_type, content_encoding=None):
+    params = {
+        "Bucket": FILES_BUCKET,
+        "Key": key,
+        "Body": body,
+        "ContentType": content_type,
+        "ServerSideEncryption": "aws:kms",
+    }
+    if KMS_KEY_ID:
+        params["SSEKMSKeyId"] = KMS_KEY_ID
+    if content_encoding:
+        params["ContentEncoding"] = content_encoding
+    aws.client("s3").put_object(**params)
+
+
+def _save_manifest(manifest):
+    manifest["updatedAt"] = datetime.utcnow().isoformat()
+    _put_object(_manifest_key(manifest["exportId"]), json.dumps(manifest, default=_json_default).encode(),
+                "application/json")
+
+
+def _load_manifest(export_id):
+    s3 = aws.client("s3")
+    try:
+        body = s3.get_object(Bucket=FILES_BUCKET, Key=_manifest_key(export_id))["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(body)
+
+
+def _start_export(event, ctx, context):
+    try:
+        body = json.loads(event.get("body") or "{}")
+        filters = _parse_filters(body)
+    except ValueError as e:
+        return response(400, {"error": str(e)})
+
+    export_id = str(uuid.uuid4())
+    manifest = {
+        "exportId": export_id,
+        "status": "RUNNING",
+        "filters": filters,
+        "requestedBy": ctx.actor,
+        "createdAt": datetime.utcnow().isoformat(),
+        "records": 0,
+        "parts": [],
+        "lastKey": None,
+    }
+    try:
+        _save_manifest(manifest)
+        _continue_export(export_id, context)
+    except Exception as e:
+        log.error("❌ ERROR starting audit export: %s", e)
+        return response(500, {"error": "Failed to start export", "details": str(e)})
+
+    log_event("AuditExportStarted", actor=ctx.actor, details={"exportId": export_id, "filters": filters}, ip=ctx.ip)
+    return response(202, {"exportId": export_id, "status": "RUNNING"})
+
+
+def _continue_export(export_id, context):
+    aws.client("lambda").invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({"auditExport": {"exportId": export_id}}),
+    )
+
+
+def _run_export(export_id, context):
+    """
+    Write the export's query results as gzipped NDJSON parts of about
+    EXPORT_PART_RECORDS records each. Progress (parts written and the
+    position after the last one) lives in the manifest, so a retried or
+    continued invocation picks up after the last finished part.
+    """
+    manifest = _load_manifest(export_id)
+    if not manifest or manifest["status"] != "RUNNING":
+        return {"status": (manifest or {}).get("status", "MISSING")}
+
+    filters = manifest["filters"]
+    mode, kwargs = _plan(filters)
+    buffer, part, records = None, None, 0
+    last_key = manifest["lastKey"]
+
+    def flush_part():
+        # The manifest only ever records keys whose items are safely in S3
+        nonlocal buffer, part, records
+        if part is not None:
+            part.close()
+            number = len(manifest["parts"]) + 1
+            key = f"{EXPORT_PREFIX}/{export_id}/part-{number:05d}.ndjson.gz"
+            _put_object(key, buffer.getvalue(), "application/x-ndjson", content_encoding="gzip")
+            manifest["parts"].append({"key": key, "records": records, "bytes": buffer.tell()})
+            manifest["records"] += records
+            buffer, part, records = None, None, 0
+        manifest["lastKey"] = last_key
+
+    try:
+        while True:
+            items, last_key = _fetch(filters, mode, kwargs, EXPORT_PAGE_SIZE, last_key)
+            for item in items:
+                if part is None:
+                    buffer = io.BytesIO()
+                    part = gzip.GzipFile(fileobj=buffer, mode="wb")
+                part.write(json.dumps(item, default=_json_default).encode() + b"\n")
+                records += 1
+
+            # Parts end on page boundaries, so a saved lastKey always matches what was written
+            if not last_key:
+                flush_part()
+                break
+            if records >= EXPORT_PART_RECORDS:
+                flush_part()
+                _save_manifest(manifest)
+            if context and context.get_remaining_time_in_millis() < EXPORT_TIME_MARGIN_MS:
+                flush_part()
+                _save_manifest(manifest)
+                _continue_export(export_id, context)
+                log.info("⏳ Audit export %s continues after %s record(s)", export_id, manifest["records"])
+                return {"status": "RUNNING"}
+    except Exception as e:
+        log.error("❌ ERROR in audit export %s: %s", export_id, e)
+        manifest["lastError"] = str(e)
+        try:
+            _save_manifest(manifest)
+        except Exception:
+            pass
+        raise  # async invocation: Lambda retries from the saved manifest
+
+    manifest["status"] = "COMPLETE"
+    manifest.pop("lastError", None)
+    _save_manifest(manifest)
+    log_event("AuditExportCompleted", actor=manifest["requestedBy"],
+              details={"exportId": export_id, "records": manifest["records"], "parts": len(manifest["parts"])})
+    log.info("✅ Audit export %s: %s record(s) in %s part(s)", export_id, manifest["records"], len(manifest["parts"]))
+    return {"status": "COMPLETE"}
+
+
+def _export_status(event):
+    export_id = (event.get("pathParameters") or {}).get("id")
+    try:
+        uuid.UUID(str(export_id))
+    except ValueError:
+        return response(400, {"error": "Invalid export id"})
+
+    manifest = _load_manifest(export_id)
+    if not manifest:
+        return response(404, {"error": f"Export {export_id} not found"})
+
+    result = {k: manifest.get(k) for k in ("exportId", "status", "filters", "createdAt", "updatedAt", "records", "lastError")}
+    if manifest["status"] == "COMPLETE":
+        s3 = aws.client("s3")
+        result["parts"] = [
+            {
+                "records": p["records"],
+                "bytes": p["bytes"],
+                "url": s3.generate_presigned_url(
+                    "get_object", Params={"Bucket": FILES_BUCKET, "Key": p["key"]}, ExpiresIn=EXPORT_URL_TTL
+                ),
+            }
+            for p in manifest["parts"]
+        ]
+    return response(200, result)
+
+
+def _json_default(o):
+    # DynamoDB numbers come back as Decimal
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    return str(o)
+
+
+# ✅ Helper for clean responses
+def response(status, body):
+    return _http_response(status, body, methods="GET,POST,OPTIONS")
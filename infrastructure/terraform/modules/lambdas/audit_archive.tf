@@ -0,0 +1,126 @@
+#############################################
+# Secure File Vault - Audit Archive Lambda
+#############################################
+
+# ───────────────────────────────────────────
+# IAM Role for Audit Archive Lambda
+# ───────────────────────────────────────────
+resource "aws_iam_role" "audit_archive_role" {
+  name = "filevault-audit-archive-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect    = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" },
+      Action    = "sts:AssumeRole"
+    }]
+  })
+}
+
+# ───────────────────────────────────────────
+# Attach Basic Logging Policy
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy_attachment" "audit_archive_logs" {
+  role       = aws_iam_role.audit_archive_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+# ───────────────────────────────────────────
+# Custom Inline Policy for Stream Reads and Archive Writes
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy" "audit_archive_policy" {
+  role = aws_iam_role.audit_archive_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      # DynamoDB Streams: audit tables (TTL deletions)
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ],
+        Resource = [
+          var.general_audit_stream_arn,
+          var.deletion_audit_stream_arn
+        ]
+      },
+
+      # S3: archive partitions
+      {
+        Effect   = "Allow",
+        Action   = ["s3:PutObject"],
+        Resource = "arn:aws:s3:::${var.bucket_name}/audit/*"
+      },
+
+      # KMS Encryption Permissions
+      {
+        Effect = "Allow",
+        Action = [
+          "kms:Encrypt",
+          "kms:GenerateDataKey*",
+          "kms:DescribeKey"
+        ],
+        Resource = "arn:aws:kms:${var.region}:${var.account_id}:key/${var.kms_key_id}"
+      }
+    ]
+  })
+}
+
+# ───────────────────────────────────────────
+# Lambda Function Definition
+# ───────────────────────────────────────────
+resource "aws_lambda_function" "audit_archive" {
+  function_name = "filevault-audit-archive"
+  runtime       = "python3.11"
+  role          = aws_iam_role.audit_archive_role.arn
+  handler       = "main.lambda_handler"
+  timeout       = 120
+  memory_size   = 512
+
+  filename         = "${path.module}/audit_archive.zip"
+  source_code_hash = filebase64sha256("${path.module}/audit_archive/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
+
+  environment {
+    variables = merge(local.logging_env, {
+      FILES_BUCKET         = var.bucket_name
+      KMS_KEY_ID           = var.kms_key_id
+      GENERAL_AUDIT_TABLE  = var.general_audit_table_name
+      DELETION_AUDIT_TABLE = var.deletion_audit_table_name
+      AUDIT_ARCHIVE_PREFIX = "audit"
+    })
+  }
+}
+
+# ───────────────────────────────────────────
+# Stream Triggers (TTL deletions only)
+# ───────────────────────────────────────────
+resource "aws_lambda_event_source_mapping" "audit_archive" {
+  for_each = {
+    general  = var.general_audit_stream_arn
+    deletion = var.deletion_audit_stream_arn
+  }
+
+  event_source_arn  = each.value
+  function_name     = aws_lambda_function.audit_archive.arn
+  starting_position = "TRIM_HORIZON"
+
+  # Few, larger archive files: up to 10k records or 5 minutes per batch
+  batch_size                         = 10000
+  maximum_batching_window_in_seconds = 300
+  bisect_batch_on_function_error     = true
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        eventName    = ["REMOVE"]
+        userIdentity = { type = ["Service"], principalId = ["dynamodb.amazonaws.com"] }
+      })
+    }
+  }
+}
@@ -0,0 +1,94 @@
+import os
+import io
+import gzip
+import json
+from decimal import Decimal
+
+from filevault_common import aws, instrumented, log
+
+# Archived records land in date partitions that the audit-query.py tool prunes on:
+#   audit/table=<general|deletion>/date=YYYY-MM-DD/part-<eventID>.ndjson.gz
+ARCHIVE_PREFIX = os.getenv("AUDIT_ARCHIVE_PREFIX", "audit")
+FILES_BUCKET = os.getenv("FILES_BUCKET")
+KMS_KEY_ID = os.getenv("KMS_KEY_ID")
+
+# Source table name -> table= partition value
+TABLE_PARTITIONS = {
+    os.getenv("GENERAL_AUDIT_TABLE"): "general",
+    os.getenv("DELETION_AUDIT_TABLE"): "deletion",
+}
+
+# TTL deletions are REMOVE records made by the DynamoDB service itself
+TTL_PRINCIPAL = "dynamodb.amazonaws.com"
+
+
+@instrumented
+def lambda_handler(event, context):
+    """
+    Archive audit records as DynamoDB TTL removes them.
+
+    Invoked by the FileVaultAuditEvents and FileVaultDeletionAuditLog streams
+    (OLD_IMAGE, filtered to TTL deletions). Each batch becomes one gzipped
+    NDJSON file per (table, date) partition, named after the first stream
+    record in it, so a retried batch overwrites its own files instead of
+    adding duplicates.
+    """
+    partitions = {}  # (table, date) -> (first eventID, [items])
+    skipped = 0
+    for record in event.get("Records", []):
+        if record.get("eventName") != "REMOVE" or record.get("userIdentity", {}).get("principalId") != TTL_PRINCIPAL:
+            skipped += 1  # deleted by the application, not aged out
+            continue
+        source = record["eventSourceARN"].split(":table/", 1)[1].split("/", 1)[0]
+        table = TABLE_PARTITIONS.get(source, source)
+        item = _deserialize(record["dynamodb"]["OldImage"])
+        date = str(item.get("timestamp") or item.get("deletedAt") or "")[:10] or "undated"
+        partitions.setdefault((table, date), (record["eventID"], []))[1].append(item)
+
+    for (table, date), (first_id, items) in sorted(partitions.items()):
+        items.sort(key=lambda i: str(i.get("timestamp") or i.get("deletedAt") or ""))
+        key = f"{ARCHIVE_PREFIX}/table={table}/date={date}/part-{first_id}.ndjson.gz"
+        _put_object(key, _ndjson_gz(items))
+        log.info("✅ Archived %s %s record(s) for %s to %s", len(items), table, date, key)
+
+    if skipped:
+        log.debug("Skipped %s stream record(s) that were not TTL deletions", skipped)
+    return {"archived": sum(len(items) for _, items in partitions.values()), "files": len(partitions)}
+
+
+def _deserialize(image):
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in image.items()}
+
+
+def _ndjson_gz(items):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as part:
+        for item in items:
+            part.write(json.dumps(item, default=_json_default, sort_keys=True).encode() + b"\n")
+    return buffer.getvalue()
+
+
+def _put_object(key, body):
+    params = {
+        "Bucket": FILES_BUCKET,
+        "Key": key,
+        "Body": body,
+        "ContentType": "application/x-ndjson",
+        "ContentEncoding": "gzip",
+        "ServerSideEncryption": "aws:kms",
+    }
+    if KMS_KEY_ID:
+        params["SSEKMSKeyId"] = KMS_KEY_ID
+    aws.client("s3").put_object(**params)
+
+
+def _json_default(o):
+    # DynamoDB numbers come back as Decimal, string sets as set
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    if isinstance(o, (set, frozenset)):
+        return sorted(o, key=str)
+    return str(o)
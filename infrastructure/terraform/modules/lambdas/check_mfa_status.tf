@@ -48,6 +48,28 @@ resource "aws_iam_role_policy" "check_mfa_status_cognito" {
   })
 }
 
+# ───────────────────────────────────────────
+# DynamoDB Access (materialized MFA status on the user item)
+# ───────────────────────────────────────────
+resource "aws_iam_role_policy" "check_mfa_status_dynamodb" {
+  name = "filevault-check-mfa-status-dynamodb"
+  role = aws_iam_role.check_mfa_status_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem"
+        ],
+        Resource = var.users_table_arn
+      }
+    ]
+  })
+}
+
 # ───────────────────────────────────────────
 # Lambda Function Definition
 # ───────────────────────────────────────────
@@ -59,11 +81,16 @@ resource "aws_lambda_function" "check_mfa_status" {
 
   filename         = "${path.module}/check_mfa_status.zip"
   source_code_hash = filebase64sha256("${path.module}/check_mfa_status/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
-      USER_POOL_ID = var.user_pool_id
-    }
+    variables = merge(local.logging_env, {
+      USER_POOL_ID             = var.user_pool_id
+      USERS_TABLE              = var.users_table_name
+      MFA_STATUS_TTL           = "3600"
+      MFA_CACHE_TTL            = "60"
+      MFA_REFRESH_MIN_INTERVAL = "1"
+    })
   }
 }
 
@@ -1,127 +1,172 @@
 import os
-import boto3
-import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from filevault_common import RequestContext, aws, instrumented, log, response
 
-cognito = boto3.client("cognito-idp")
 USER_POOL_ID = os.environ["USER_POOL_ID"]
 
+# MFA state is materialized on the user's FileVaultUsers item (mfaStatus,
+# cognitoUsername) and additionally cached per warm instance, so most checks
+# cost at most one GetItem and no Cognito call.
+MFA_STATUS_TTL = int(os.getenv("MFA_STATUS_TTL", "3600"))        # stored status, seconds
+# Other warm instances may answer from their cache for this long after a refresh
+MFA_CACHE_TTL = float(os.getenv("MFA_CACHE_TTL", "60"))          # warm-instance cache, seconds
+MFA_CACHE_SIZE = int(os.getenv("MFA_CACHE_SIZE", "1024"))
+# ?refresh=true (sent right after the user changes MFA) re-reads Cognito,
+# but at most this often per user
+MFA_REFRESH_MIN_INTERVAL = float(os.getenv("MFA_REFRESH_MIN_INTERVAL", "1"))
+
+_cache = OrderedDict()  # sub -> (status, cached at)
+
+
+@instrumented
 def lambda_handler(event, context):
     """
     Check if a user has MFA enabled by checking their MFA devices.
     This endpoint is called by authenticated users to check their own MFA status.
     """
-    print("DEBUG full event:", json.dumps(event, indent=2))
-
     # Extract user ID from JWT claims
-    claims = {}
-    if "requestContext" in event and "authorizer" in event["requestContext"]:
-        auth_ctx = event["requestContext"]["authorizer"]
-        if "jwt" in auth_ctx:
-            claims = auth_ctx.get("jwt", {}).get("claims", {})
-        elif "claims" in auth_ctx:
-            claims = auth_ctx.get("claims", {})
-
-    user_sub = claims.get("sub")
-    user_email = claims.get("email")
-    username = claims.get("cognito:username") or claims.get("username")
-    
-    print(f"DEBUG Claims: sub={user_sub}, email={user_email}, username={username}")
-    print(f"DEBUG Full claims: {json.dumps(claims, indent=2)}")
-    
+    ctx = RequestContext.from_event(event)
+    user_sub = ctx.user_id
+
     if not user_sub:
-        print("ERROR: No user sub found in claims")
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "User identifier not found in token"})
-        }
+        log.error("ERROR: No user sub found in claims")
+        return response(400, {"error": "User identifier not found in token"})
+
+    params = event.get("queryStringParameters") or {}
+    refresh = str(params.get("refresh", "")).lower() == "true"
+
+    # --- Step 1: warm-instance cache ---
+    if not refresh:
+        status = _cache_get(user_sub)
+        if status is not None:
+            return response(200, status)
 
+    # --- Step 2: status materialized on the user item ---
+    table = aws.table("USERS_TABLE")
     try:
-        # For Cognito admin API, try email first (most reliable), then username, then sub
-        # The username in Cognito is typically the email address
-        user_identifier = user_email or username or user_sub
-        print(f"DEBUG Using user identifier: {user_identifier}")
-        
-        # Get user details to check MFA status
-        user_response = cognito.admin_get_user(
-            UserPoolId=USER_POOL_ID,
-            Username=user_identifier
+        item = table.get_item(
+            Key={"userId": user_sub},
+            ProjectionExpression="mfaStatus, cognitoUsername",
+        ).get("Item") or {}
+    except Exception as e:
+        log.warning("⚠️ Could not read stored MFA status for %s: %s", user_sub, e)
+        item = {}
+
+    stored = item.get("mfaStatus")
+    if stored and _age(stored) < (MFA_REFRESH_MIN_INTERVAL if refresh else MFA_STATUS_TTL):
+        status = _public(stored)
+        _cache_put(user_sub, status)
+        return response(200, status)
+
+    # --- Step 3: Cognito, with a single lookup once the username is known ---
+    cognito = aws.client("cognito-idp")
+    # cognito:username / username claims carry the exact username; email and
+    # sub are only guesses for tokens without them
+    candidates = [item.get("cognitoUsername") or ctx.username or ctx.email, user_sub]
+    user_response = None
+    try:
+        for identifier in dict.fromkeys(c for c in candidates if c):
+            try:
+                user_response = cognito.admin_get_user(UserPoolId=USER_POOL_ID, Username=identifier)
+                break
+            except cognito.exceptions.UserNotFoundException:
+                log.debug("User %s not found, trying next identifier", identifier)
+    except Exception as e:
+        log.error("ERROR checking MFA status: %s", e)
+        if stored:
+            # Cognito is throttling or down: a stale answer beats none
+            return response(200, _public(stored))
+        return response(500, {"error": "Failed to check MFA status", "details": str(e)})
+
+    if user_response is None:
+        return response(404, {"error": "User not found"})
+
+    stored = _mfa_status(user_response)
+    log.debug("MFA status for %s: %s", user_sub, stored)
+    _store(table, user_sub, stored, user_response["Username"], item)
+
+    status = _public(stored)
+    _cache_put(user_sub, status)
+    return response(200, status)
+
+
+def _mfa_status(user_response):
+    # Check MFA settings from user response
+    user_mfa_settings = user_response.get("UserMFASettingList", [])
+    preferred_mfa_setting = user_response.get("PreferredMfaSetting", "")
+    mfa_options = user_response.get("MFAOptions", [])
+
+    # User has MFA enabled if:
+    # 1. SOFTWARE_TOKEN_MFA is in their MFA settings list, OR
+    # 2. Preferred MFA setting is SOFTWARE_TOKEN_MFA
+    # 3. MFAOptions contains software token option
+    has_totp = (
+        "SOFTWARE_TOKEN_MFA" in user_mfa_settings or
+        preferred_mfa_setting == "SOFTWARE_TOKEN_MFA" or
+        any(
+            opt.get("DeliveryMedium") == "SOFTWARE_TOKEN" if isinstance(opt, dict) else False
+            for opt in mfa_options
         )
-        
-        print(f"DEBUG Full user_response keys: {list(user_response.keys())}")
-        print(f"DEBUG Full user_response: {json.dumps(user_response, indent=2, default=str)}")
-        
-        # Check MFA settings from user response
-        user_mfa_settings = user_response.get("UserMFASettingList", [])
-        preferred_mfa_setting = user_response.get("PreferredMfaSetting", "")
-        mfa_options = user_response.get("MFAOptions", [])
-        
-        print(f"DEBUG UserMFASettingList: {user_mfa_settings}")
-        print(f"DEBUG PreferredMfaSetting: {preferred_mfa_setting}")
-        print(f"DEBUG MFAOptions: {mfa_options}")
-        
-        # User has MFA enabled if:
-        # 1. SOFTWARE_TOKEN_MFA is in their MFA settings list, OR
-        # 2. Preferred MFA setting is SOFTWARE_TOKEN_MFA
-        # 3. MFAOptions contains software token option
-        has_totp = (
-            "SOFTWARE_TOKEN_MFA" in user_mfa_settings or
-            preferred_mfa_setting == "SOFTWARE_TOKEN_MFA" or
-            any(
-                opt.get("DeliveryMedium") == "SOFTWARE_TOKEN" if isinstance(opt, dict) else False
-                for opt in mfa_options
-            )
+    )
+    return {
+        "mfaEnabled": has_totp,
+        "hasTotpDevice": has_totp,
+        "preferredMfaSetting": preferred_mfa_setting,
+        "mfaDevices": len(user_mfa_settings),
+        "checkedAt": datetime.utcnow().isoformat(),
+    }
+
+
+def _store(table, user_sub, status, username, item):
+    """Materialize the status (and the username Cognito resolved) on the user item."""
+    updates = "SET mfaStatus = :m"
+    values = {":m": status}
+    if item.get("cognitoUsername") != username:
+        updates += ", cognitoUsername = :u"
+        values[":u"] = username
+    try:
+        table.update_item(
+            Key={"userId": user_sub},
+            UpdateExpression=updates,
+            ConditionExpression="attribute_exists(userId)",
+            ExpressionAttributeValues=values,
         )
-        is_enabled = has_totp
-        
-        print(f"DEBUG MFA status: user_mfa_settings={user_mfa_settings}, preferred_mfa={preferred_mfa_setting}, has_totp={has_totp}, enabled={is_enabled}")
-        
-        return {
-            "statusCode": 200,
-            "body": json.dumps({
-                "mfaEnabled": is_enabled,
-                "hasTotpDevice": has_totp,
-                "preferredMfaSetting": preferred_mfa_setting,
-                "mfaDevices": len(user_mfa_settings)
-            })
-        }
-
-    except cognito.exceptions.UserNotFoundException:
-        print(f"ERROR: User {user_identifier} not found")
-        # Try with sub if email/username didn't work
-        if user_identifier != user_sub and user_sub:
-            print(f"DEBUG Retrying with sub: {user_sub}")
-            try:
-                user_response = cognito.admin_get_user(
-                    UserPoolId=USER_POOL_ID,
-                    Username=user_sub
-                )
-                user_mfa_settings = user_response.get("UserMFASettingList", [])
-                preferred_mfa_setting = user_response.get("PreferredMfaSetting", "")
-                has_totp = "SOFTWARE_TOKEN_MFA" in user_mfa_settings
-                is_enabled = has_totp or preferred_mfa_setting == "SOFTWARE_TOKEN_MFA"
-                
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({
-                        "mfaEnabled": is_enabled,
-                        "hasTotpDevice": has_totp,
-                        "preferredMfaSetting": preferred_mfa_setting,
-                        "mfaDevices": len(user_mfa_settings)
-                    })
-                }
-            except Exception as e2:
-                print(f"ERROR retry with sub also failed: {str(e2)}")
-        
-        return {
-            "statusCode": 404,
-            "body": json.dumps({"error": "User not found"})
-        }
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass  # no FileVaultUsers item to materialize onto
     except Exception as e:
-        print(f"ERROR checking MFA status: {str(e)}")
-        import traceback
-        print(f"ERROR traceback: {traceback.format_exc()}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Failed to check MFA status", "details": str(e)})
-        }
+        log.warning("⚠️ Failed to store MFA status for %s: %s", user_sub, e)
+
+
+def _public(stored):
+    status = dict(stored)
+    status["mfaDevices"] = int(status.get("mfaDevices", 0))
+    return status
+
+
+def _age(stored):
+    try:
+        checked = datetime.fromisoformat(stored["checkedAt"])
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+    return (datetime.utcnow() - checked) / timedelta(seconds=1)
+
+
+def _cache_get(user_sub):
+    entry = _cache.get(user_sub)
+    if entry is None:
+        return None
+    status, cached_at = entry
+    if time.monotonic() - cached_at > MFA_CACHE_TTL:
+        del _cache[user_sub]
+        return None
+    return status
+
 
+def _cache_put(user_sub, status):
+    _cache[user_sub] = (status, time.monotonic())
+    _cache.move_to_end(user_sub)
+    while len(_cache) > max(1, MFA_CACHE_SIZE):
+        _cache.popitem(last=False)
@@ -50,12 +50,22 @@ resource "aws_iam_role_policy" "delete_policy" {
           "dynamodb:GetItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:Scan",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem"
         ],
         Resource = [
           "arn:aws:dynamodb:${var.region}:${var.account_id}:table/${var.files_table_name}",
           "arn:aws:dynamodb:${var.region}:${var.account_id}:table/${var.users_table_name}"
         ]
+      },
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = var.blobs_table_arn
       }
     ]
   })
@@ -72,18 +82,25 @@ resource "aws_lambda_function" "delete" {
   runtime          = "python3.11"
   role             = aws_iam_role.delete_role.arn
   handler          = "main.handler"
+  # A full bulk delete (MAX_BULK_DELETE ids) runs its batches one after another
+  timeout          = 30
+  memory_size      = 256
 
   filename         = "${path.module}/delete.zip"
   source_code_hash = filebase64sha256("${path.module}/delete/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
-      BUCKET_NAME          = var.bucket_name
-      FILES_TABLE          = var.files_table_name
-      USERS_TABLE          = var.users_table_name
-      GENERAL_AUDIT_TABLE  = var.general_audit_table_name
-      DELETION_AUDIT_TABLE = var.deletion_audit_table_name
-    }
+    variables = merge(local.logging_env, local.sync_env, {
+      BUCKET_NAME             = var.bucket_name
+      FILES_TABLE             = var.files_table_name
+      USERS_TABLE             = var.users_table_name
+      BLOBS_TABLE             = var.blobs_table_name
+      GENERAL_AUDIT_TABLE     = var.general_audit_table_name
+      DELETION_AUDIT_TABLE    = var.deletion_audit_table_name
+      MAX_BULK_DELETE         = "250"
+      BULK_DELETE_CONCURRENCY = "16"
+    })
   }
 }
 
@@ -92,6 +109,7 @@ resource "aws_lambda_permission" "allow_apigw_delete" {
   action        = "lambda:InvokeFunction"
   function_name = aws_lambda_function.delete.function_name
   principal     = "apigateway.amazonaws.com"
+  # Covers DELETE /api/files/{id} and POST /api/files/delete
   source_arn    = "${var.api_execution_arn}/*/*/api/files/*"
 }
 
@@ -1,87 +1,71 @@
 import os
 import json
-import boto3
-import uuid
-from datetime import datetime, timedelta
-from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+from filevault_common import RequestContext, aws, blobs, catalog, flush_after, instrumented, log
+from filevault_common import log_event as _log_event
+from filevault_common import response
+from filevault_common.batch import batch_get_items
 
 # ───────────────────────────────────────────
-# AWS Clients & Environment
+# Environment
 # ───────────────────────────────────────────
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
-
 BUCKET = os.environ["BUCKET_NAME"]
-FILES_TABLE = os.environ["FILES_TABLE"]
-USERS_TABLE = os.environ["USERS_TABLE"]
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
-DELETION_AUDIT_TABLE = os.getenv("DELETION_AUDIT_TABLE")
-
-files_table = dynamodb.Table(FILES_TABLE)
-users_table = dynamodb.Table(USERS_TABLE)
+# Each id costs a conditional delete, a blob release and an audit record on
+# top of the batched reads; 250 fits comfortably inside the 30 s timeout
+MAX_BULK_DELETE = int(os.getenv("MAX_BULK_DELETE", "250"))
+BULK_DELETE_CONCURRENCY = int(os.getenv("BULK_DELETE_CONCURRENCY", "16"))
+S3_DELETE_CHUNK = 1000  # delete_objects limit
 
 # ───────────────────────────────────────────
 # Audit Logger
 # ───────────────────────────────────────────
 def log_event(event_type, actor, target=None, file_id=None, status="SUCCESS", details=None, ip=None, is_admin=False):
-    table_name = DELETION_AUDIT_TABLE if is_admin else GENERAL_AUDIT_TABLE
-    table = dynamodb.Table(table_name)
-
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "targetUserId": target.get("id") if target else None,
-        "fileId": file_id,
-        "status": status,
-        "ipAddress": ip,
-        "details": details or {},
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-
-    print("AUDIT_LOG:", json.dumps(record))
-    try:
-        table.put_item(Item=record)
-    except Exception as e:
-        print(f"⚠️ Failed to write audit log: {e}")
+    table_name = "DELETION_AUDIT_TABLE" if is_admin else "GENERAL_AUDIT_TABLE"
+    _log_event(event_type, actor, target=target, file_id=file_id, status=status,
+               details=details, ip=ip, table_name=table_name)
 
 # ───────────────────────────────────────────
 # Lambda Handler
 # ───────────────────────────────────────────
+@instrumented
+@flush_after
 def handler(event, context):
-    print("DEBUG event:", json.dumps(event))
+    log.debug_event(event)
 
     # Handle CORS preflight
     if event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
         return _response(200, {"message": "CORS preflight OK"})
 
     # Extract identity & IP
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    user_id = claims.get("sub")
-    email = claims.get("email", "unknown")
-    raw_groups = claims.get("cognito:groups", [])
-    groups = _normalize_groups(raw_groups)
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+    ctx = RequestContext.from_event(event)
+    user_id = ctx.user_id
+    email = ctx.email or "unknown"
+    groups = ctx.groups
+    ip = ctx.ip
 
     if not user_id:
         return _response(403, {"error": "Unauthorized – missing user identity"})
 
-    file_id = event.get("pathParameters", {}).get("id")
+    if event.get("routeKey") == "POST /api/files/delete":
+        return _bulk_delete(event, ctx)
+
+    file_id = (event.get("pathParameters") or {}).get("id")
     if not file_id:
         return _response(400, {"error": "Missing file ID"})
 
+    files_table = aws.table("FILES_TABLE")
+
     # Lookup file owner
     try:
         file_item = files_table.get_item(Key={"fileId": file_id}).get("Item")
-    except ClientError as e:
+    except aws.client_error() as e:
         log_event("FileDeleteFailed", {"id": user_id, "email": email},
                   file_id=file_id, status="FAILED",
                   details={"error": str(e)}, ip=ip, is_admin=("Admins" in groups))
         return _response(500, {"error": "Failed to read file metadata"})
 
-    if not file_item:
+    if not file_item or catalog.is_tombstone(file_item):
         log_event("FileDeleteFailed", {"id": user_id, "email": email},
                   file_id=file_id, status="FAILED",
                   details={"reason": "File not found"}, ip=ip, is_admin=("Admins" in groups))
@@ -95,11 +79,11 @@ def handler(event, context):
         authorized = True
     elif "Editors" in groups:
         try:
-            owner = users_table.get_item(Key={"userId": owner_id}).get("Item", {})
+            owner = aws.table("USERS_TABLE").get_item(Key={"userId": owner_id}).get("Item", {})
             if owner_id == user_id or owner.get("delegatedEditor") == user_id:
                 authorized = True
-        except ClientError as e:
-            print("Error checking delegated editor:", e)
+        except aws.client_error() as e:
+            log.error("Error checking delegated editor: %s", e)
     elif "Viewers" in groups and owner_id == user_id:
         authorized = True
 
@@ -111,13 +95,25 @@ def handler(event, context):
 
     # Perform Deletion
     try:
-        s3_key = file_item.get("s3Key", f"uploads/{owner_id}/{file_id}")
-        s3.delete_object(Bucket=BUCKET, Key=s3_key)
-        files_table.delete_item(Key={"fileId": file_id})
+        removed = catalog.delete_record(file_id)
+        if removed is None:
+            # A concurrent or retried delete removed it and released its blob
+            log_event("FileDeleteFailed", {"id": user_id, "email": email},
+                      target={"id": owner_id}, file_id=file_id, status="FAILED",
+                      details={"reason": "Already deleted"}, ip=ip, is_admin=("Admins" in groups))
+            return _response(404, {"error": f"File not found: {file_id}"})
+        s3_key = removed.get("s3Key", f"uploads/{owner_id}/{file_id}")
+        blob_id = removed.get("blobId")
+        catalog.record_deletions([removed])
+        # Deduplicated content is shared: only the last reference removes the object
+        object_deleted = not blob_id or blobs.release(blob_id)
+        if object_deleted:
+            aws.client("s3").delete_object(Bucket=BUCKET, Key=s3_key)
         log_event("FileDeleted", {"id": user_id, "email": email},
                   target={"id": owner_id}, file_id=file_id,
+                  details={"blobId": blob_id, "objectDeleted": object_deleted} if blob_id else None,
                   ip=ip, is_admin=("Admins" in groups))
-    except ClientError as e:
+    except aws.client_error() as e:
         log_event("FileDeleteFailed", {"id": user_id, "email": email},
                   target={"id": owner_id}, file_id=file_id,
                   status="FAILED", details={"error": str(e)}, ip=ip,
@@ -131,22 +127,159 @@ def handler(event, context):
     })
 
 # ───────────────────────────────────────────
-# Helpers
+# Bulk Delete
 # ───────────────────────────────────────────
-def _normalize_groups(raw):
-    if isinstance(raw, list):
-        return raw
-    if isinstance(raw, str):
-        return [g.strip() for g in raw.strip("[]").replace('"', '').replace("'", '').split(",") if g.strip()]
-    return []
+def _bulk_delete(event, ctx):
+    actor = {"id": ctx.user_id, "email": ctx.email or "unknown"}
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+        file_ids = body["fileIds"]
+        if not isinstance(file_ids, list) or not all(isinstance(f, str) and f for f in file_ids):
+            raise ValueError("fileIds must be a list of file ids")
+    except Exception as e:
+        return _response(400, {"error": f"Invalid request body: {str(e)}"})
+
+    file_ids = list(dict.fromkeys(file_ids))  # dedupe, keep order
+    if not file_ids:
+        return _response(400, {"error": "fileIds must not be empty"})
+    if len(file_ids) > MAX_BULK_DELETE:
+        return _response(400, {"error": f"At most {MAX_BULK_DELETE} files per request"})
+
+    try:
+        items = batch_get_items(
+            "FILES_TABLE",
+            [{"fileId": f} for f in file_ids],
+            projection="fileId, ownerId, s3Key, blobId, deletedFileId",
+        )
+        by_id = {item["fileId"]: item for item in items if not catalog.is_tombstone(item)}
+        allowed_owners = _deletable_owners(ctx, {item.get("ownerId") for item in items})
+    except Exception as e:
+        log.error("❌ ERROR preparing bulk delete: %s", e)
+        log_event("BulkDeleteFailed", actor, status="FAILED",
+                  details={"error": str(e), "requested": len(file_ids)},
+                  ip=ctx.ip, is_admin=ctx.is_admin)
+        return _response(500, {"error": "Failed to read file metadata"})
+
+    outcomes = {}
+    targets = []
+    for file_id in file_ids:
+        item = by_id.get(file_id)
+        if not item:
+            outcomes[file_id] = (404, "File not found")
+        elif allowed_owners is not None and item.get("ownerId") not in allowed_owners:
+            outcomes[file_id] = (403, "Not authorized to delete this file")
+        else:
+            targets.append(item)
+
+    # --- Metadata first, so a failed object delete never leaves a dangling record ---
+    # One conditional delete per record (BatchWriteItem takes no conditions):
+    # a record another request removed meanwhile comes back as None, and only
+    # records this request removed release their blob below
+    def delete(item):
+        try:
+            return item, catalog.delete_record(item["fileId"]), None
+        except Exception as e:
+            return item, None, e
+
+    removed = []
+    workers = max(1, min(len(targets), BULK_DELETE_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item, old, error in pool.map(delete, targets):
+            if error is not None:
+                log.error("❌ ERROR deleting metadata for %s: %s", item["fileId"], error)
+                outcomes[item["fileId"]] = (500, "Failed to delete file metadata")
+            elif old is None:
+                outcomes[item["fileId"]] = (404, "File not found")
+            else:
+                removed.append(old)
+    catalog.record_deletions(removed)
 
+    # --- Objects: shared (deduplicated) content only goes with its last reference ---
+    keys = {}
+    for item in removed:
+        s3_key = _object_key(item)
+        try:
+            if item.get("blobId") and not blobs.release(item["blobId"]):
+                continue
+        except Exception as e:
+            log.warning("⚠️ Failed to release blob %s: %s", item["blobId"], e)
+            continue  # keep the object; an orphan is safer than a dangling reference
+        keys.setdefault(s3_key, []).append(item["fileId"])
+
+    failed_keys = _delete_objects(list(keys))
+    for item in removed:
+        s3_key = _object_key(item)
+        if s3_key in failed_keys:
+            outcomes[item["fileId"]] = (500, f"Metadata removed but object deletion failed: {failed_keys[s3_key]}")
+        else:
+            outcomes[item["fileId"]] = (200, None)
+            log_event("FileDeleted", actor, target={"id": item.get("ownerId")},
+                      file_id=item["fileId"], details={"bulk": True},
+                      ip=ctx.ip, is_admin=ctx.is_admin)
+
+    denied = [f for f, (status, _) in outcomes.items() if status == 403]
+    if denied:
+        log_event("UnauthorizedDeleteAttempt", actor, status="DENIED",
+                  details={"bulk": True, "fileIds": denied}, ip=ctx.ip)
+
+    results = []
+    for file_id in file_ids:
+        status, error = outcomes[file_id]
+        result = {"fileId": file_id, "status": status}
+        if error:
+            result["error"] = error
+        results.append(result)
+
+    succeeded = sum(1 for r in results if r["status"] == 200)
+    return _response(200, {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+    })
+
+
+def _deletable_owners(ctx, owner_ids):
+    """Owner ids the caller may delete from, or None for every owner (Admins)."""
+    if ctx.is_admin:
+        return None
+    if ctx.is_editor:
+        owners = batch_get_items(
+            "USERS_TABLE",
+            [{"userId": o} for o in owner_ids if o and o != ctx.user_id],
+            projection="userId, delegatedEditor",
+        )
+        return {ctx.user_id} | {o["userId"] for o in owners if o.get("delegatedEditor") == ctx.user_id}
+    if ctx.is_viewer:
+        return {ctx.user_id}
+    return set()
+
+
+def _object_key(item):
+    return item.get("s3Key", f"uploads/{item.get('ownerId')}/{item['fileId']}")
+
+
+def _delete_objects(keys):
+    """delete_objects in chunks of 1000; returns {key: error message} for failures."""
+    s3 = aws.client("s3")
+    failed = {}
+    for start in range(0, len(keys), S3_DELETE_CHUNK):
+        chunk = keys[start:start + S3_DELETE_CHUNK]
+        try:
+            resp = s3.delete_objects(
+                Bucket=BUCKET,
+                Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+            )
+        except aws.client_error() as e:
+            failed.update({k: str(e) for k in chunk})
+            continue
+        for error in resp.get("Errors", []):
+            failed[error["Key"]] = error.get("Message") or error.get("Code", "unknown error")
+    return failed
+
+
+# ───────────────────────────────────────────
+# Helpers
+# ───────────────────────────────────────────
 def _response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "GET,POST,PATCH,DELETE,OPTIONS",
-        },
-        "body": json.dumps(body),
-    }
+    return response(status, body, methods="GET,POST,PATCH,DELETE,OPTIONS")
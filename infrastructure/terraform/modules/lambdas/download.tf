@@ -43,7 +43,7 @@ resource "aws_iam_role_policy" "download_policy" {
       },
       {
         Effect = "Allow",
-        Action = ["dynamodb:GetItem", "dynamodb:Query", "dynamodb:Scan"],
+        Action = ["dynamodb:GetItem", "dynamodb:BatchGetItem", "dynamodb:Query", "dynamodb:Scan"],
         Resource = [
           var.files_table_arn,
           var.users_table_arn,
@@ -69,15 +69,16 @@ resource "aws_lambda_function" "download" {
 
   filename         = "${path.module}/download.zip"
   source_code_hash = filebase64sha256("${path.module}/download/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, {
       BUCKET_NAME         = var.bucket_name
       KMS_KEY_ID          = var.kms_key_id
       FILES_TABLE         = var.files_table_name
       USERS_TABLE         = var.users_table_name
       GENERAL_AUDIT_TABLE = var.general_audit_table_name
-    }
+    })
   }
 }
 
@@ -89,6 +90,14 @@ resource "aws_lambda_permission" "allow_apigw_download" {
   source_arn    = "${var.api_execution_arn}/*/*/api/files/*/download"
 }
 
+resource "aws_lambda_permission" "allow_apigw_download_urls" {
+  statement_id  = "AllowAPIGatewayInvokeDownloadUrls"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.download.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${var.api_execution_arn}/*/*/api/files/download-urls"
+}
+
 output "download_lambda_arn" {
   description = "ARN of the secure-file-download Lambda function"
   value       = aws_lambda_function.download.arn
@@ -1,61 +1,38 @@
-import os, json, uuid, boto3
-from datetime import datetime, timedelta
-from boto3.dynamodb.conditions import Key
+import os, json
+from urllib.parse import quote
 
-# AWS resources
-s3 = boto3.client("s3", config=boto3.session.Config(signature_version="s3v4"))
-dynamodb = boto3.resource("dynamodb")
+from filevault_common import RequestContext, aws, catalog, delegation, flush_after, instrumented, log, log_event
+from filevault_common import response as _http_response
+from filevault_common.batch import batch_get_items
 
 BUCKET = os.environ["BUCKET_NAME"]
-FILES_TABLE = os.environ["FILES_TABLE"]
-USERS_TABLE = os.environ["USERS_TABLE"]
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
-
-files_table = dynamodb.Table(FILES_TABLE)
-users_table = dynamodb.Table(USERS_TABLE)
-audit_table = dynamodb.Table(GENERAL_AUDIT_TABLE)
-
-# ---------- Audit Logger ----------
-def log_event(event_type, actor, target=None, file_id=None, status="SUCCESS", details=None, ip=None):
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "targetUserId": target.get("id") if target else None,
-        "fileId": file_id,
-        "status": status,
-        "ipAddress": ip,
-        "details": details or {},
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-    print("AUDIT_LOG:", json.dumps(record))
-    try:
-        audit_table.put_item(Item=record)
-    except Exception as e:
-        print(f"⚠️ Audit log failure: {e}")
+MAX_BATCH_DOWNLOAD = int(os.getenv("MAX_BATCH_DOWNLOAD", "500"))
+URL_EXPIRY_SECONDS = 3600
 
 # ---------- Lambda Handler ----------
+@instrumented
+@flush_after
 def handler(event, context):
-    print("DEBUG event:", json.dumps(event))
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+    log.debug_event(event)
+    ctx = RequestContext.from_event(event)
+    ip = ctx.ip
+
+    if event.get("routeKey") == "POST /api/files/download-urls":
+        return _batch_download(event, ctx)
 
     try:
-        claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-        user_id = claims.get("sub")
-        user_email = claims.get("email", "unknown")
-        raw_groups = claims.get("cognito:groups", [])
-        groups = _normalize_groups(raw_groups)
-
-        print(f"DEBUG User: {user_email}, Groups: {groups}")
-        file_id = event.get("pathParameters", {}).get("id")
+        user_id = ctx.user_id
+        user_email = ctx.email or "unknown"
+        groups = ctx.groups
+
+        log.debug("User: %s, Groups: %s", user_email, groups)
+        file_id = (event.get("pathParameters") or {}).get("id")
         if not file_id:
             return response(400, {"error": "Missing file ID"})
 
         # --- Get file metadata ---
-        file_item = files_table.get_item(Key={"fileId": file_id}).get("Item")
-        if not file_item:
+        file_item = aws.table("FILES_TABLE").get_item(Key={"fileId": file_id}).get("Item")
+        if not file_item or catalog.is_tombstone(file_item):
             log_event("DownloadFailed", {"id": user_id, "email": user_email},
                       file_id=file_id, status="FAILED",
                       details={"reason": "File not found"}, ip=ip)
@@ -67,43 +44,38 @@ def handler(event, context):
 
         # Validate required fields
         if not s3_key:
-            print(f"❌ ERROR: File {file_id} missing s3Key")
+            log.error("❌ ERROR: File %s missing s3Key", file_id)
             log_event("DownloadFailed", {"id": user_id, "email": user_email},
                       file_id=file_id, status="FAILED",
                       details={"reason": "File missing s3Key"}, ip=ip)
             return response(500, {"error": "File metadata incomplete: missing s3Key"})
 
-        print(f"DEBUG File metadata: ownerId={owner_id}, ownerEmail={owner_email}, s3Key={s3_key}")
+        log.debug("File metadata: ownerId=%s, ownerEmail=%s, s3Key=%s", owner_id, owner_email, s3_key)
 
         # --- Authorization ---
         allowed = False
         if "Admins" in groups:
             allowed = True
-            print(f"DEBUG Admin access granted")
+            log.debug("Admin access granted")
         elif "Editors" in groups:
             try:
-                delegated_resp = users_table.query(
-                    IndexName="delegatedEditor-index",
-                    KeyConditionExpression=Key("delegatedEditor").eq(user_id)
-                )
-                delegated = delegated_resp.get("Items", [])
-                delegated_ids = [v.get("userId") for v in delegated if v.get("userId")]
-                print(f"DEBUG Editor {user_id}: delegated_ids={delegated_ids}, owner_id={owner_id}")
+                delegated_ids = delegation.delegated_viewer_ids(user_id)
+                log.debug("Editor %s: delegated_ids=%s, owner_id=%s", user_id, delegated_ids, owner_id)
                 allowed = (owner_id == user_id) or (owner_id in delegated_ids)
                 if not allowed:
-                    print(f"⚠️ WARNING: Editor {user_id} not authorized for file {file_id} (owner: {owner_id})")
+                    log.warning("⚠️ WARNING: Editor %s not authorized for file %s (owner: %s)", user_id, file_id, owner_id)
             except Exception as e:
-                print(f"❌ ERROR querying delegated users: {e}")
+                log.error("❌ ERROR querying delegated users: %s", e)
                 log_event("DownloadFailed", {"id": user_id, "email": user_email},
                           file_id=file_id, status="FAILED",
                           details={"error": f"Failed to verify delegation: {str(e)}"}, ip=ip)
                 return response(500, {"error": "Failed to verify authorization", "details": str(e)})
         elif "Viewers" in groups:
             allowed = (owner_id == user_id)
-            print(f"DEBUG Viewer access: owner_id={owner_id}, user_id={user_id}, allowed={allowed}")
+            log.debug("Viewer access: owner_id=%s, user_id=%s, allowed=%s", owner_id, user_id, allowed)
 
         if not allowed:
-            print(f"❌ UNAUTHORIZED: User {user_id} ({user_email}) not allowed to download file {file_id}")
+            log.warning("❌ UNAUTHORIZED: User %s (%s) not allowed to download file %s", user_id, user_email, file_id)
             log_event("UnauthorizedDownloadAttempt",
                       {"id": user_id, "email": user_email},
                       target={"id": owner_id}, file_id=file_id,
@@ -112,14 +84,14 @@ def handler(event, context):
 
         # --- Generate presigned URL ---
         try:
-            url = s3.generate_presigned_url(
+            url = aws.client("s3").generate_presigned_url(
                 "get_object",
-                Params={"Bucket": BUCKET, "Key": s3_key},
-                ExpiresIn=3600, HttpMethod="GET"
+                Params=_object_params(file_item),
+                ExpiresIn=URL_EXPIRY_SECONDS, HttpMethod="GET"
             )
-            print(f"✅ Generated presigned URL for file {file_id}")
+            log.info("✅ Generated presigned URL for file %s", file_id)
         except Exception as e:
-            print(f"❌ ERROR generating presigned URL: {e}")
+            log.error("❌ ERROR generating presigned URL: %s", e)
             log_event("DownloadFailed", {"id": user_id, "email": user_email},
                       file_id=file_id, status="FAILED",
                       details={"error": f"Failed to generate presigned URL: {str(e)}"}, ip=ip)
@@ -133,7 +105,7 @@ def handler(event, context):
         return response(200, {"downloadUrl": url, "fileName": file_item["fileName"]})
 
     except Exception as e:
-        print("ERROR:", str(e))
+        log.error("ERROR: %s", e)
         log_event("DownloadFailed",
                   {"id": user_id if 'user_id' in locals() else 'unknown',
                    "email": user_email if 'user_email' in locals() else 'unknown'},
@@ -141,21 +113,112 @@ def handler(event, context):
                   status="FAILED", details={"error": str(e)}, ip=ip)
         return response(500, {"error": str(e)})
 
+# ---------- Batch download (POST /api/files/download-urls) ----------
+# One batch_get_item pass for metadata, one delegation lookup for the whole
+# set, local presigning, and a single audit record. Each requested id gets
+# its own result entry so partial failures are reported, not fatal.
+def _batch_download(event, ctx):
+    actor = {"id": ctx.user_id, "email": ctx.email or "unknown"}
+    if not ctx.user_id:
+        return response(403, {"error": "Invalid or missing user token"})
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+        file_ids = body["fileIds"]
+        if not isinstance(file_ids, list) or not all(isinstance(f, str) and f for f in file_ids):
+            raise ValueError("fileIds must be a list of file ids")
+    except Exception as e:
+        return response(400, {"error": f"Invalid request body: {str(e)}"})
+
+    file_ids = list(dict.fromkeys(file_ids))  # dedupe, keep order
+    if not file_ids:
+        return response(400, {"error": "fileIds must not be empty"})
+    if len(file_ids) > MAX_BATCH_DOWNLOAD:
+        return response(400, {"error": f"At most {MAX_BATCH_DOWNLOAD} files per request"})
+
+    try:
+        items = batch_get_items(
+            "FILES_TABLE",
+            [{"fileId": f} for f in file_ids],
+            projection="fileId, ownerId, s3Key, fileName, blobId, deletedFileId",
+        )
+    except Exception as e:
+        log.error("❌ ERROR fetching file metadata: %s", e)
+        log_event("BatchDownloadFailed", actor, status="FAILED",
+                  details={"error": str(e), "requested": len(file_ids)}, ip=ctx.ip)
+        return response(500, {"error": "Failed to read file metadata", "details": str(e)})
+    by_id = {item["fileId"]: item for item in items if not catalog.is_tombstone(item)}
+
+    # --- Authorization for the whole set (None = every owner) ---
+    allowed_owners = None
+    if ctx.is_admin:
+        pass
+    elif ctx.is_editor:
+        try:
+            allowed_owners = delegation.delegated_viewer_ids(ctx.user_id) | {ctx.user_id}
+        except Exception as e:
+            log.error("❌ ERROR querying delegated users: %s", e)
+            log_event("BatchDownloadFailed", actor, status="FAILED",
+                      details={"error": f"Failed to verify delegation: {str(e)}"}, ip=ctx.ip)
+            return response(500, {"error": "Failed to verify authorization", "details": str(e)})
+    elif ctx.is_viewer:
+        allowed_owners = {ctx.user_id}
+    else:
+        allowed_owners = set()
+
+    s3 = aws.client("s3")
+    results = []
+    outcome = {"downloaded": [], "denied": [], "missing": [], "failed": []}
+    for file_id in file_ids:
+        item = by_id.get(file_id)
+        if not item:
+            results.append({"fileId": file_id, "status": 404, "error": "File not found"})
+            outcome["missing"].append(file_id)
+            continue
+        if allowed_owners is not None and item.get("ownerId") not in allowed_owners:
+            results.append({"fileId": file_id, "status": 403, "error": "Not authorized to access this file"})
+            outcome["denied"].append(file_id)
+            continue
+        if not item.get("s3Key"):
+            results.append({"fileId": file_id, "status": 500, "error": "File metadata incomplete: missing s3Key"})
+            outcome["failed"].append(file_id)
+            continue
+        try:
+            url = s3.generate_presigned_url(
+                "get_object",
+                Params=_object_params(item),
+                ExpiresIn=URL_EXPIRY_SECONDS, HttpMethod="GET"
+            )
+        except Exception as e:
+            results.append({"fileId": file_id, "status": 500, "error": f"Failed to generate download URL: {str(e)}"})
+            outcome["failed"].append(file_id)
+            continue
+        results.append({"fileId": file_id, "status": 200, "downloadUrl": url, "fileName": item.get("fileName")})
+        outcome["downloaded"].append(file_id)
+
+    log.debug("Batch download: %s/%s presigned", len(outcome["downloaded"]), len(file_ids))
+    log_event("FilesDownloaded", actor,
+              status="SUCCESS" if len(outcome["downloaded"]) == len(file_ids) else "PARTIAL",
+              details=outcome, ip=ctx.ip)
+
+    return response(200, {
+        "results": results,
+        "succeeded": len(outcome["downloaded"]),
+        "failed": len(file_ids) - len(outcome["downloaded"]),
+    })
+
 # ---------- Helpers ----------
-def _normalize_groups(raw):
-    if isinstance(raw, list):
-        return raw
-    if isinstance(raw, str):
-        return [g.strip() for g in raw.strip("[]").replace('"', '').replace("'", '').split(",") if g.strip()]
-    return []
+def _object_params(item):
+    params = {"Bucket": BUCKET, "Key": item["s3Key"]}
+    if item.get("blobId") and item.get("fileName"):
+        # Deduplicated objects are named by hash; hand back the user's filename
+        name = item["fileName"]
+        fallback = name.encode("ascii", "replace").decode().replace('"', "")
+        params["ResponseContentDisposition"] = (
+            f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(name)}'
+        )
+    return params
+
 
 def response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-        },
-        "body": json.dumps(body)
-    }
+    return _http_response(status, body, methods="GET,POST,OPTIONS")
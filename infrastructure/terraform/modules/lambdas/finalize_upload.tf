@@ -0,0 +1,132 @@
+#############################################
+# Secure File Vault - Upload Finalizer Lambda
+#############################################
+# Triggered by S3 ObjectCreated events under uploads/; marks the matching
+# FileVaultFiles record AVAILABLE with its size, ETag and content type, and
+# verifies the hash of deduplicated blobs before they can be shared.
+
+# ───────────────────────────────────────────
+# IAM Role for Finalizer Lambda
+# ───────────────────────────────────────────
+resource "aws_iam_role" "finalize_upload_role" {
+  name = "secure-file-finalize-upload-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect    = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" },
+      Action    = "sts:AssumeRole"
+    }]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "finalize_upload_logging" {
+  role       = aws_iam_role.finalize_upload_role.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_iam_role_policy" "finalize_upload_policy" {
+  role = aws_iam_role.finalize_upload_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      # HeadObject (object metadata only)
+      {
+        Effect = "Allow",
+        Action = [
+          "s3:GetObject",
+          "s3:GetObjectVersion"
+        ],
+        Resource = "arn:aws:s3:::${var.bucket_name}/uploads/*"
+      },
+
+      # DynamoDB Access - File Metadata Table
+      {
+        Effect   = "Allow",
+        Action   = ["dynamodb:UpdateItem"],
+        Resource = var.files_table_arn
+      },
+
+      # DynamoDB Access - Blob Index (open or drop verified blobs)
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = var.blobs_table_arn
+      },
+
+      # Reading deduplicated multipart objects to verify their hash
+      {
+        Effect   = "Allow",
+        Action   = ["kms:Decrypt"],
+        Resource = "arn:aws:kms:${var.region}:${var.account_id}:key/${var.kms_key_id}"
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "finalize_upload_audit_logging" {
+  role       = aws_iam_role.finalize_upload_role.name
+  policy_arn = aws_iam_policy.audit_logging_policy.arn
+}
+
+# ───────────────────────────────────────────
+# Lambda Function Definition
+# ───────────────────────────────────────────
+resource "aws_lambda_function" "finalize_upload" {
+  function_name    = "secure-file-finalize-upload"
+  runtime          = "python3.11"
+  role             = aws_iam_role.finalize_upload_role.arn
+  handler          = "main.handler"
+  # Multipart blobs up to VERIFY_MAX_BYTES are streamed through SHA-256 once before being shared
+  timeout          = 300
+  memory_size      = 512
+
+  filename         = "${path.module}/finalize_upload.zip"
+  source_code_hash = filebase64sha256("${path.module}/finalize_upload/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
+
+  environment {
+    variables = merge(local.logging_env, {
+      FILES_TABLE         = var.files_table_name
+      BLOBS_TABLE         = var.blobs_table_name
+      GENERAL_AUDIT_TABLE = var.general_audit_table_name
+      VERIFY_MAX_BYTES    = "268435456"
+    })
+  }
+}
+
+# ───────────────────────────────────────────
+# S3 Event Trigger
+# ───────────────────────────────────────────
+resource "aws_lambda_permission" "allow_s3_finalize_upload" {
+  statement_id   = "AllowS3InvokeFinalizeUpload"
+  action         = "lambda:InvokeFunction"
+  function_name  = aws_lambda_function.finalize_upload.function_name
+  principal      = "s3.amazonaws.com"
+  source_arn     = "arn:aws:s3:::${var.bucket_name}"
+  source_account = var.account_id
+}
+
+# A bucket has a single notification configuration; add further
+# destinations here rather than in a second resource.
+resource "aws_s3_bucket_notification" "files" {
+  bucket = var.bucket_name
+
+  lambda_function {
+    lambda_function_arn = aws_lambda_function.finalize_upload.arn
+    events              = ["s3:ObjectCreated:*"]
+    filter_prefix       = "uploads/"
+  }
+
+  depends_on = [aws_lambda_permission.allow_s3_finalize_upload]
+}
+
+output "finalize_upload_lambda_arn" {
+  description = "ARN of the secure-file-finalize-upload Lambda function"
+  value       = aws_lambda_function.finalize_upload.arn
+}
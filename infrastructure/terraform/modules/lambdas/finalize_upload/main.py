@@ -0,0 +1,162 @@
+"""
+S3 ObjectCreated handler: turns a PENDING FileVaultFiles record into an
+AVAILABLE one carrying sizeBytes, etag, contentType and completedAt.
+
+The upload Lambda stamps every object with x-amz-meta-file-id, which is how
+an object key is mapped back to its record. S3 may deliver an event more
+than once and out of order, so the update is conditioned on the event's
+sequencer being newer than the one already recorded.
+
+Objects uploaded for deduplication also carry x-amz-meta-blob-id. Their
+content is checked against the claimed SHA-256 before the blob is opened
+for reuse; on a mismatch the blob is forgotten and the file keeps its
+object as an ordinary, unshared upload. Multipart objects larger than
+VERIFY_MAX_BYTES are treated the same way, since hashing them could
+outlast the invocation and leave the record PENDING.
+"""
+
+import base64
+import hashlib
+import os
+import urllib.parse
+from datetime import datetime
+
+from filevault_common import aws, blobs, flush_after, instrumented, log, log_event
+
+FILE_ID_METADATA = "file-id"
+BLOB_ID_METADATA = "blob-id"
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+# The frontend only hashes files up to 256 MiB, so larger blobs are not ours to verify
+VERIFY_MAX_BYTES = int(os.getenv("VERIFY_MAX_BYTES", str(256 * 1024 * 1024)))
+# S3 sequencers are hex strings of varying length; left-pad before comparing
+SEQUENCER_WIDTH = 32
+
+
+@instrumented
+@flush_after
+def handler(event, context):
+    outcomes = {"finalized": 0, "duplicate": 0, "skipped": 0, "failed": 0}
+    for record in event.get("Records", []):
+        outcomes[_finalize(record)] += 1
+
+    log.info("✅ Finalizer outcomes: %s", outcomes)
+    if outcomes["failed"]:
+        # Let the async invocation retry; already-finalized objects are no-ops
+        raise RuntimeError(f"{outcomes['failed']} object(s) could not be finalized")
+    return outcomes
+
+
+def _finalize(record):
+    s3_info = record.get("s3") or {}
+    bucket = (s3_info.get("bucket") or {}).get("name")
+    obj = s3_info.get("object") or {}
+    key = urllib.parse.unquote_plus(obj.get("key", ""))
+    if not bucket or not key:
+        log.warning("⚠️ Skipping malformed record: %s", record)
+        return "skipped"
+
+    sequencer = str(obj.get("sequencer", "")).rjust(SEQUENCER_WIDTH, "0")
+
+    object_args = {"Bucket": bucket, "Key": key}
+    if obj.get("versionId"):
+        object_args["VersionId"] = obj["versionId"]
+    try:
+        head = aws.client("s3").head_object(ChecksumMode="ENABLED", **object_args)
+    except Exception as e:
+        log.error("❌ ERROR reading %s: %s", key, e)
+        return "failed"
+
+    metadata = head.get("Metadata") or {}
+    file_id = metadata.get(FILE_ID_METADATA)
+    if not file_id:
+        log.warning("⚠️ Skipping %s: no %s metadata", key, FILE_ID_METADATA)
+        return "skipped"
+
+    # Verify deduplicated content before anything else, so a failure is retried
+    blob_id = metadata.get(BLOB_ID_METADATA)
+    verified = None
+    if blob_id:
+        try:
+            verified = _content_matches(object_args, head, blob_id.rsplit(":", 1)[-1])
+        except Exception as e:
+            log.error("❌ ERROR verifying %s: %s", key, e)
+            return "failed"
+
+    update_expression = (
+        "SET #s = :available, sizeBytes = :size, etag = :etag, "
+        "contentType = :content_type, completedAt = :now, updatedAt = :now, s3Sequencer = :seq"
+    )
+    if verified is False:
+        update_expression += " REMOVE sha256, blobId"
+
+    table = aws.table("FILES_TABLE")
+    try:
+        updated = table.update_item(
+            Key={"fileId": file_id},
+            UpdateExpression=update_expression,
+            ConditionExpression=(
+                "attribute_exists(fileId) AND s3Key = :key "
+                "AND (attribute_not_exists(s3Sequencer) OR s3Sequencer < :seq)"
+            ),
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":available": "AVAILABLE",
+                ":size": int(head.get("ContentLength", obj.get("size", 0))),
+                ":etag": str(head.get("ETag", obj.get("eTag", ""))).strip('"'),
+                ":content_type": head.get("ContentType", "application/octet-stream"),
+                ":now": datetime.utcnow().isoformat(),
+                ":seq": sequencer,
+                ":key": key,
+            },
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        log.info("ℹ️ %s: already finalized by this or a newer event, or record gone", file_id)
+        return "duplicate"
+    except Exception as e:
+        log.error("❌ ERROR finalizing %s: %s", file_id, e)
+        return "failed"
+
+    if blob_id:
+        try:
+            if verified:
+                blobs.mark_available(blob_id, updated.get("sizeBytes"), updated.get("etag"))
+            else:
+                log.warning("⚠️ %s not verified against its claimed hash; blob %s dropped", key, blob_id)
+                blobs.forget(blob_id)
+        except Exception as e:
+            # The blob stays PENDING: never shared, and released with its file
+            log.warning("⚠️ Failed to update blob %s: %s", blob_id, e)
+
+    log_event(
+        "FileUploadFinalized",
+        {"id": updated.get("uploadedById") or "system", "email": updated.get("uploadedBy")},
+        target={"id": updated.get("ownerId")},
+        file_id=file_id,
+        details={"sizeBytes": updated.get("sizeBytes"), "etag": updated.get("etag"),
+                 "blobId": blob_id, "hashVerified": verified},
+    )
+    return "finalized"
+
+
+def _content_matches(object_args, head, sha256):
+    """
+    True if the object's bytes hash to sha256. A single-PUT blob carries an
+    S3-validated full-object checksum; multipart checksums are composite
+    ("...-N"), so those objects are streamed and hashed here, up to
+    VERIFY_MAX_BYTES. Anything larger counts as not matching.
+    """
+    checksum = head.get("ChecksumSHA256")
+    if checksum and "-" not in checksum:
+        return base64.b64decode(checksum).hex() == sha256
+
+    size = int(head.get("ContentLength") or 0)
+    if size > VERIFY_MAX_BYTES:
+        log.warning("⚠️ %s bytes is over the %s byte verification limit", size, VERIFY_MAX_BYTES)
+        return False
+
+    digest = hashlib.sha256()
+    body = aws.client("s3").get_object(**object_args)["Body"]
+    for chunk in body.iter_chunks(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.hexdigest() == sha256
@@ -76,11 +76,12 @@ resource "aws_lambda_function" "get_delegated_users" {
 
   filename         = "${path.module}/get_delegated_users.zip"
   source_code_hash = filebase64sha256("${path.module}/get_delegated_users/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, {
       USERS_TABLE = var.users_table_name
-    }
+    })
   }
 
   timeout     = 10
@@ -1,24 +1,14 @@
-import os
-import json
-import boto3
-from boto3.dynamodb.conditions import Key
-
-dynamodb = boto3.resource("dynamodb")
-USERS_TABLE = os.getenv("USERS_TABLE")
-
-users_table = dynamodb.Table(USERS_TABLE)
+from filevault_common import RequestContext, aws, instrumented, log
+from filevault_common import response as _http_response
 
+@instrumented
 def handler(event, context):
-    print("DEBUG event:", json.dumps(event))
+    log.debug_event(event)
 
     # --- Extract user identity ---
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    user_id = claims.get("sub")
-    groups = claims.get("cognito:groups", [])
-
-    # Normalize groups into list
-    if isinstance(groups, str):
-        groups = [g.strip() for g in groups.strip("[]").replace('"', "").split(",") if g.strip()]
+    ctx = RequestContext.from_event(event)
+    user_id = ctx.user_id
+    groups = ctx.groups
 
     if not user_id:
         return response(403, {"error": "Unauthorized – no user ID found"})
@@ -29,12 +19,12 @@ def handler(event, context):
 
     try:
         # Query DynamoDB GSI on delegatedEditor
-        resp = users_table.query(
+        resp = aws.table("USERS_TABLE").query(
             IndexName="delegatedEditor-index",
-            KeyConditionExpression=Key("delegatedEditor").eq(user_id)
+            KeyConditionExpression=aws.key("delegatedEditor").eq(user_id)
         )
         viewers = resp.get("Items", [])
-        print(f"Found {len(viewers)} delegated viewers for {user_id}")
+        log.info("Found %s delegated viewers for %s", len(viewers), user_id)
 
         result = [
             {
@@ -49,17 +39,9 @@ def handler(event, context):
         return response(200, {"delegatedViewers": result})
 
     except Exception as e:
-        print(f"ERROR querying delegated viewers: {e}")
+        log.error("ERROR querying delegated viewers: %s", e)
         return response(500, {"error": "Failed to fetch delegated viewers", "details": str(e)})
 
 
 def response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization"
-        },
-        "body": json.dumps(body),
-    }
+    return _http_response(status, body, methods="GET,OPTIONS")
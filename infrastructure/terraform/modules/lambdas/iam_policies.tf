@@ -7,6 +7,7 @@ data "aws_iam_policy_document" "audit_logging_policy_doc" {
     effect = "Allow"
     actions = [
       "dynamodb:PutItem",
+      "dynamodb:BatchWriteItem",
       "dynamodb:UpdateItem",
       "dynamodb:GetItem",
     ]
@@ -0,0 +1,34 @@
+#############################################
+# Secure File Vault - Shared Runtime Layer
+#############################################
+# filevault_common (shared/python/filevault_common) holds the code every
+# handler used to duplicate: identity parsing, CORS responses, audit logging
+# and lazily created AWS clients. Build the zip with scripts/zip-lambdas.sh.
+
+resource "aws_lambda_layer_version" "filevault_common" {
+  layer_name          = "filevault-common"
+  description         = "Shared FileVault Lambda runtime (identity, responses, audit, lazy AWS clients)"
+  compatible_runtimes = ["python3.11"]
+
+  filename         = "${path.module}/filevault_common_layer.zip"
+  source_code_hash = filebase64sha256("${path.module}/filevault_common_layer.zip")
+}
+
+output "filevault_common_layer_arn" {
+  description = "ARN of the shared filevault-common Lambda layer version"
+  value       = aws_lambda_layer_version.filevault_common.arn
+}
+
+# Read by filevault_common.log in every function (see its docstring)
+locals {
+  logging_env = {
+    LOG_LEVEL             = var.log_level
+    LOG_DEBUG_SAMPLE_RATE = tostring(var.log_debug_sample_rate)
+    LOG_SAMPLE_RATES      = var.log_sample_rates
+  }
+
+  # Writers stamp tombstones with it and list refuses older delta syncs
+  sync_env = {
+    SYNC_TOMBSTONE_DAYS = tostring(var.sync_tombstone_days)
+  }
+}
@@ -61,17 +61,29 @@ resource "aws_lambda_function" "list" {
   runtime          = "python3.11"
   role             = aws_iam_role.list_role.arn
   handler          = "main.handler"
+  timeout          = 30
+  # Holds up to LIST_MAX_PAGE_SIZE items per owner stream during the editor
+  # fan-out; Lambda also scales CPU with memory, which the merge and JSON need
+  memory_size      = 512
 
   filename         = "${path.module}/list.zip"
   source_code_hash = filebase64sha256("${path.module}/list/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
-      BUCKET_NAME         = var.bucket_name
-      FILES_TABLE         = var.files_table_name
-      USERS_TABLE         = var.users_table_name
-      GENERAL_AUDIT_TABLE = var.general_audit_table_name
-    }
+    variables = merge(local.logging_env, local.sync_env, {
+      BUCKET_NAME               = var.bucket_name
+      FILES_TABLE               = var.files_table_name
+      USERS_TABLE               = var.users_table_name
+      GENERAL_AUDIT_TABLE       = var.general_audit_table_name
+      LIST_PAGE_SIZE            = "100"
+      LIST_MAX_PAGE_SIZE        = "1000"
+      LIST_EXPORT_SEGMENTS      = "8"
+      EDITOR_FANOUT_CONCURRENCY = "16"
+      LIST_SYNC_OVERLAP_SECONDS = "60"
+      # Set to "true" once legacy PENDING records have been finalized
+      LIST_HIDE_PENDING         = "false"
+    })
   }
 }
 
@@ -1,166 +1,487 @@
 import os
-import json
-import uuid
-import boto3
+import hashlib
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from boto3.dynamodb.conditions import Key
-
-# Initialize AWS resources
-dynamodb = boto3.resource("dynamodb")
-files_table = dynamodb.Table(os.environ["FILES_TABLE"])
-users_table = dynamodb.Table(os.environ["USERS_TABLE"])
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
-audit_table = dynamodb.Table(GENERAL_AUDIT_TABLE)
-
-# --- Audit Logger ---
-def log_event(event_type, actor, status="SUCCESS", details=None, ip=None):
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "status": status,
-        "details": details or {},
-        "ipAddress": ip,
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-    print("AUDIT_LOG:", json.dumps(record))
-    try:
-        audit_table.put_item(Item=record)
-    except Exception as e:
-        print(f"⚠️ Failed to log audit event: {e}")
 
+from filevault_common import RequestContext, aws, catalog, delegation, flush_after, instrumented, log, log_event, response
+from filevault_common.http import etag, matches_etag, not_modified
+from filevault_common.pagination import PaginationError, collect_page, decode_cursor, encode_cursor, parse_limit
+
+# Pagination settings
+DEFAULT_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "1000"))
+EXPORT_SEGMENTS = int(os.getenv("LIST_EXPORT_SEGMENTS", "8"))
+EDITOR_FANOUT_CONCURRENCY = int(os.getenv("EDITOR_FANOUT_CONCURRENCY", "16"))
+# Hide uploads the finalize_upload Lambda has not marked AVAILABLE yet.
+# Off by default: records written before the finalizer existed stay PENDING.
+HIDE_PENDING = os.getenv("LIST_HIDE_PENDING", "false").lower() == "true"
+
+STATUSES = {"PENDING", "AVAILABLE"}
+# Delta syncs re-read this much before the client's token, so writes that
+# reach the index late (GSI propagation, slow writers) are not skipped
+SYNC_OVERLAP = timedelta(seconds=int(os.getenv("LIST_SYNC_OVERLAP_SECONDS", "60")))
+
+
+class SyncExpired(Exception):
+    """The since token can no longer be honored; the client must list everything again."""
+
+@instrumented
+@flush_after
 def handler(event, context):
-    print("DEBUG event:", json.dumps(event))
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+    log.debug_event(event)
+    ctx = RequestContext.from_event(event)
 
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    user_id = claims.get("sub")
-    user_email = claims.get("email")
-    groups_claim = claims.get("cognito:groups", [])
-    groups = _normalize_groups(groups_claim)
+    log.debug("user_id=%s, email=%s, groups=%s", ctx.user_id, ctx.email, ctx.groups)
 
-    print(f"DEBUG user_id={user_id}, email={user_email}, groups={groups}")
-    actor = {"id": user_id, "email": user_email}
+    params = event.get("queryStringParameters") or {}
+    started = datetime.utcnow().isoformat()
+    try:
+        limit = parse_limit(params.get("limit"), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        cursor = decode_cursor(params.get("cursor"))
+        filters = _parse_filters(params)
+        since = decode_cursor(params.get("since"))
+    except (ValueError, PaginationError) as e:
+        return failure(str(e), status=400)
+    filtered = any(filters[k] for k in ("name", "status", "from", "to"))
+    if since and filtered:
+        return failure("since cannot be combined with name, status, from or to", status=400)
+    # An owner filter always reads one index partition, so it never exports
+    export = params.get("mode") == "export" and not filters["owner"] and not since
+    include_pending = params.get("includePending") == "true"
 
     try:
-        if "Admins" in groups:
-            files = _list_all_files()
-        elif "Editors" in groups:
-            files = _list_editor_files(user_id)
+        deleted = None
+        if not ctx.is_admin and not ctx.is_editor and filters["owner"] not in (None, ctx.user_id):
+            return failure("You can only list your own files", status=403)
+        # Filtered listings are not a full copy to sync from
+        syncable = bool(since) or not filtered
+        owners = _sync_scope(ctx, filters)
+        scope = owners if syncable else None
+        sync_from = _check_since(since, scope) if since else None
+
+        # Only a revalidation pays for the version queries; other requests
+        # get the page hash from success()
+        revalidating = bool((event.get("headers") or {}).get("if-none-match"))
+        tag = _version_tag(ctx, params, owners) if revalidating and owners is not None else None
+        if tag and matches_etag(event, tag):
+            log_event(
+                "FilesListed",
+                actor=ctx.actor,
+                details={"group": ctx.role or "None", "fileCount": 0, "mode": "notModified"},
+                ip=ctx.ip
+            )
+            return not_modified(tag)
+
+        if since:
+            changes, state = _list_changes(scope, sync_from, limit, cursor)
+            files, deleted = _split_changes(changes, include_pending)
+            high_water = max([(cursor or {}).get("sync") or sync_from["at"]] + [c["updatedAt"] for c in changes])
+        elif ctx.is_admin and filters["owner"]:
+            files, state = _list_owner_files(filters["owner"], limit, cursor, filters, include_pending)
+        elif ctx.is_admin:
+            scan_filters = _item_filter(filters, include_pending, scan=True)
+            if export:
+                files, state = _export_all_files(limit, cursor, scan_filters)
+            else:
+                files, state = _list_all_files(limit, cursor, scan_filters)
+        elif ctx.is_editor:
+            files, state = _list_editor_files(ctx.user_id, limit, cursor, filters, include_pending)
         else:
-            files = _list_viewer_files(user_id, user_email)
+            files, state = _list_owner_files(ctx.user_id, limit, cursor, filters, include_pending)
+
+        if not since:
+            # A listing is in sync as of its first page
+            high_water = (cursor or {}).get("sync") or started
+        next_cursor = encode_cursor(dict(state, sync=high_water)) if state else None
+        sync_token = _sync_token(high_water, scope) if syncable and not next_cursor else None
 
         log_event(
             "FilesListed",
-            actor=actor,
-            details={"group": groups[0] if groups else "None", "fileCount": len(files)},
-            ip=ip
+            actor=ctx.actor,
+            details={
+                "group": ctx.role or "None",
+                "fileCount": len(files),
+                "mode": "sync" if since else "export" if export and ctx.is_admin else "page",
+                "hasMore": next_cursor is not None,
+                "filters": sorted(k for k, v in filters.items() if v and k != "order"),
+            },
+            ip=ctx.ip
         )
 
-        return success(files)
+        return success(event, files, next_cursor, deleted, sync_token, tag)
+    except SyncExpired as e:
+        return response(410, {"error": str(e), "resync": True})
+    except PaginationError as e:
+        return failure(str(e), status=400)
+    except PermissionError as e:
+        return failure(str(e), status=403)
     except Exception as e:
-        print(f"❌ ERROR main handler: {e}")
+        log.error("❌ ERROR main handler: %s", e)
         log_event(
             "ListFailed",
-            actor=actor,
+            actor=ctx.actor,
             status="FAILED",
             details={"error": str(e)},
-            ip=ip
+            ip=ctx.ip
         )
         return failure(str(e))
 
 # ------------------------------------------------------------------
-# 1️⃣ Admin – sees every file
-def _list_all_files():
-    resp = files_table.scan()
-    return resp.get("Items", [])
+# Filters: name (filename prefix), owner, status, from/to (uploadedAt), order
+def _parse_filters(params):
+    filters = {
+        "name": (params.get("name") or "").strip().lower() or None,
+        "owner": params.get("owner") or None,
+        "status": (params.get("status") or "").upper() or None,
+        "from": params.get("from") or None,
+        "to": params.get("to") or None,
+        "order": (params.get("order") or "desc").lower(),
+    }
+    if filters["order"] not in ("asc", "desc"):
+        raise ValueError("order must be asc or desc")
+    if filters["status"] and filters["status"] not in STATUSES:
+        raise ValueError(f"Invalid status: {params.get('status')}")
+    for bound in ("from", "to"):
+        value = filters[bound]
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Invalid {bound} timestamp: {value}")
+            # A bare date as the upper bound means "through the end of that day"
+            if bound == "to" and len(value) == 10:
+                filters["to"] = value + "T23:59:59.999999"
+    if filters["from"] and filters["to"] and filters["from"] > filters["to"]:
+        raise ValueError("from must not be after to")
+    return filters
+
+# FilterExpression for everything the key condition cannot express.
+# Scans have no key condition, so the date range goes here too, and they
+# must skip deletion tombstones (which the listing index never holds).
+def _item_filter(filters, include_pending, scan=False):
+    clauses = [aws.attr("deletedFileId").not_exists()] if scan else []
+    if filters["status"]:
+        clauses.append(aws.attr("status").eq(filters["status"]))
+    elif HIDE_PENDING and not include_pending:
+        clauses.append(aws.attr("status").ne("PENDING"))
+    if filters["name"]:
+        clauses.append(aws.attr("fileNameLower").begins_with(filters["name"]))
+    if scan and filters["from"]:
+        clauses.append(aws.attr("uploadedAt").gte(filters["from"]))
+    if scan and filters["to"]:
+        clauses.append(aws.attr("uploadedAt").lte(filters["to"]))
+    if not clauses:
+        return {}
+    expression = clauses[0]
+    for clause in clauses[1:]:
+        expression = expression & clause
+    return {"FilterExpression": expression}
+
+# Query kwargs for one owner on ownerId-uploadedAt-index, in the requested
+# order, optionally starting just past an uploadedAt already returned.
+def _owner_query(owner_id, filters, include_pending, after=None):
+    descending = filters["order"] == "desc"
+    low, high = filters["from"], filters["to"]
+    if after and descending:
+        high = min(high, after) if high else after
+    elif after:
+        low = max(low, after) if low else after
+
+    condition = aws.key("ownerId").eq(owner_id)
+    if low and high:
+        condition = condition & aws.key("uploadedAt").between(low, high)
+    elif low:
+        condition = condition & aws.key("uploadedAt").gte(low)
+    elif high:
+        condition = condition & aws.key("uploadedAt").lte(high)
+
+    projection, names = catalog.list_projection()
+    return dict(
+        _item_filter(filters, include_pending),
+        IndexName=catalog.LIST_INDEX,
+        KeyConditionExpression=condition,
+        ScanIndexForward=not descending,
+        ProjectionExpression=projection,
+        ExpressionAttributeNames=names,
+    )
+
+# ------------------------------------------------------------------
+# 1️⃣ Admin – sees every file, one cursor-driven page at a time
+def _list_all_files(limit, cursor, filters):
+    start_key = (cursor or {}).get("lek")
+    projection, names = catalog.list_projection()
+    scan_args = dict(filters, ProjectionExpression=projection, ExpressionAttributeNames=names)
+    items, last_key = collect_page(aws.table("FILES_TABLE").scan, scan_args, limit, start_key)
+    return items, {"lek": last_key} if last_key else None
+
+# 1️⃣ Admin full export – parallel segmented scan
+# Each call advances every unfinished segment by one page, so a response never
+# holds more than roughly `limit` items no matter how large the table is.
+# The cursor carries the LastEvaluatedKey of each segment still in flight.
+def _export_all_files(limit, cursor, filters):
+    if cursor:
+        total = cursor.get("total")
+        pending = cursor.get("segments")
+        if not isinstance(total, int) or not isinstance(pending, dict):
+            raise PaginationError("Cursor does not belong to an export listing")
+    else:
+        total = EXPORT_SEGMENTS
+        pending = {str(seg): None for seg in range(total)}
+
+    if not pending:
+        return [], None
+
+    per_segment = max(1, limit // len(pending))
+
+    def scan_segment(seg):
+        kwargs = dict(filters, Segment=int(seg), TotalSegments=total, Limit=per_segment)
+        if pending[seg]:
+            kwargs["ExclusiveStartKey"] = pending[seg]
+        resp = aws.shared_table("FILES_TABLE").scan(**kwargs)
+        return seg, resp.get("Items", []), resp.get("LastEvaluatedKey")
+
+    items = []
+    remaining = {}
+    with ThreadPoolExecutor(max_workers=min(len(pending), EXPORT_SEGMENTS)) as pool:
+        for seg, seg_items, last_key in pool.map(scan_segment, sorted(pending, key=int)):
+            items.extend(seg_items)
+            if last_key:
+                remaining[seg] = last_key
+
+    log.debug("Export page: %s items, %s/%s segments remaining", len(items), len(remaining), total)
+    return items, {"total": total, "segments": remaining} if remaining else None
 
 # ------------------------------------------------------------------
 # 2️⃣ Editor – own + delegated viewers' files
-def _list_editor_files(editor_id):
+# Per-owner queries on ownerId-uploadedAt-index run in parallel (bounded by
+# EDITOR_FANOUT_CONCURRENCY). Each reads only the next `limit` + 1 files past
+# the cursor in the requested order, and the streams are merged by
+# (uploadedAt, fileId). The cursor records the last file returned.
+# A failed owner query fails the whole listing (500): a page missing one
+# owner's files would otherwise be cached, and revalidated, as complete.
+def _list_editor_files(editor_id, limit, cursor, filters, include_pending):
+    after = (cursor or {}).get("after")
+    if after is not None and (not isinstance(after, list) or len(after) != 2):
+        raise PaginationError("Cursor does not belong to an editor listing")
+    after = tuple(after) if after else None
+    descending = filters["order"] == "desc"
+
+    # Get delegated viewers for this editor
+    viewer_ids = list(delegation.delegated_viewer_ids(editor_id))
+
+    # Editor can see their own files + delegated viewers' files
+    allowed_ids = set([editor_id] + viewer_ids)
+    if filters["owner"]:
+        if filters["owner"] not in allowed_ids:
+            raise PermissionError("You can only list your own or delegated users' files")
+        owner_ids = {filters["owner"]}
+    else:
+        owner_ids = allowed_ids
+    log.debug("Editor %s: %s delegated viewers, fanning out over %s owners", editor_id, len(viewer_ids), len(owner_ids))
+
+    def owner_files(uid):
+        items = _owner_page(
+            aws.shared_table("FILES_TABLE").query,
+            _owner_query(uid, filters, include_pending, after[0] if after else None),
+            limit + 1, after, descending,
+        )
+        # Double-check ownership before adding (defensive programming)
+        allowed = []
+        for item in items:
+            file_owner_id = item.get("ownerId")
+            if file_owner_id not in allowed_ids:
+                log.warning("⚠️ WARNING: Skipping file %s with ownerId %s (not in allowed_ids)", item.get("fileId"), file_owner_id)
+            else:
+                allowed.append(item)
+        return allowed
+
+    workers = max(1, min(len(owner_ids), EDITOR_FANOUT_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        per_owner = list(pool.map(owner_files, owner_ids))
+
+    merged = heapq.merge(*per_owner, key=_sort_key, reverse=descending)
+    page = list(itertools.islice(merged, limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    log.debug("Returning %s files for editor %s (more=%s)", len(page), editor_id, has_more)
+    return page, {"after": list(_sort_key(page[-1]))} if has_more else None
+
+# Up to `want` of one owner's files strictly past `after`, in listing order.
+# The key condition already starts at after's timestamp; files sharing that
+# timestamp are told apart by fileId here.
+def _owner_page(operation, query_args, want, after, descending, sort_key=None):
+    sort_key = sort_key or _sort_key
+    items, start_key = [], None
+    while True:
+        batch, start_key = collect_page(operation, query_args, want - len(items), start_key)
+        for item in batch:
+            key = sort_key(item)
+            if after is None or (key < after if descending else key > after):
+                items.append(item)
+        if len(items) >= want or not start_key:
+            break
+    items.sort(key=sort_key, reverse=descending)
+    return items
+
+def _sort_key(item):
+    return (str(item.get("uploadedAt") or ""), str(item.get("fileId") or ""))
+
+# ------------------------------------------------------------------
+# 3️⃣ One owner's files – viewers (own only) and admins filtering by owner
+def _list_owner_files(owner_id, limit, cursor, filters, include_pending):
+    start_key = (cursor or {}).get("lek")
+    query_args = _owner_query(owner_id, filters, include_pending)
+    items, last_key = collect_page(aws.table("FILES_TABLE").query, query_args, limit, start_key)
+    return items, {"lek": last_key} if last_key else None
+
+# ------------------------------------------------------------------
+# 4️⃣ Delta sync – what changed since a syncToken
+# Every unfiltered listing ends with a syncToken: the time it started and a
+# tag for the set of owners it covered. since=<token> then returns records
+# whose updatedAt is at or after that time (less SYNC_OVERLAP), plus the ids
+# of records deleted since, read from ownerId-updatedAt-index per owner and
+# merged oldest change first. Admins without an owner filter scan instead.
+# A changed owner set (new delegation, new role) or a token older than the
+# tombstones still kept cannot be synced: the client has to relist (410).
+def _sync_scope(ctx, filters):
+    """Sorted owner ids the caller's listing covers, or None for every owner (Admins)."""
+    if ctx.is_admin:
+        return [filters["owner"]] if filters["owner"] else None
+    if ctx.is_editor:
+        allowed = {ctx.user_id} | set(delegation.delegated_viewer_ids(ctx.user_id))
+        if filters["owner"] and filters["owner"] not in allowed:
+            raise PermissionError("You can only list your own or delegated users' files")
+        return [filters["owner"]] if filters["owner"] else sorted(allowed)
+    return [ctx.user_id]
+
+def _scope_tag(scope):
+    raw = "*" if scope is None else ",".join(scope)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+def _sync_token(high_water, scope):
+    return encode_cursor({"at": high_water, "scope": _scope_tag(scope)})
+
+def _check_since(since, scope):
+    at = since.get("at")
     try:
-        # Get delegated viewers for this editor
-        delegated_resp = users_table.query(
-            IndexName="delegatedEditor-index",
-            KeyConditionExpression=Key("delegatedEditor").eq(editor_id)
+        synced = datetime.fromisoformat(at)
+    except (TypeError, ValueError):
+        raise PaginationError("Invalid since token")
+    if since.get("scope") != _scope_tag(scope):
+        raise SyncExpired("The files you can see have changed since this sync; list them again")
+    if synced < datetime.utcnow() - timedelta(days=catalog.TOMBSTONE_DAYS) + SYNC_OVERLAP:
+        raise SyncExpired(f"since is older than {catalog.TOMBSTONE_DAYS} days; list the files again")
+    return {"at": at, "from": (synced - SYNC_OVERLAP).isoformat()}
+
+def _list_changes(scope, sync_from, limit, cursor):
+    if scope is None:
+        projection, names = catalog.sync_projection()
+        scan_args = dict(
+            FilterExpression=aws.attr("updatedAt").gte(sync_from["from"]),
+            ProjectionExpression=projection,
+            ExpressionAttributeNames=names,
         )
-        delegated_items = delegated_resp.get("Items", [])
-        viewer_ids = [v.get("userId") for v in delegated_items if v.get("userId")]
-        
-        # Editor can see their own files + delegated viewers' files
-        allowed_ids = set([editor_id] + viewer_ids)
-        print(f"DEBUG Editor {editor_id} allowed_ids: {allowed_ids}")
-        print(f"DEBUG Delegated viewers: {viewer_ids}")
-        
-        # Collect files for allowed IDs
-        all_files = []
-        for uid in allowed_ids:
-            try:
-                q = files_table.query(
-                    IndexName="ownerId-index",
-                    KeyConditionExpression=Key("ownerId").eq(uid)
-                )
-                items = q.get("Items", [])
-                print(f"DEBUG Found {len(items)} files for uid {uid}")
-                # Double-check ownership before adding (defensive programming)
-                for item in items:
-                    file_owner_id = item.get("ownerId")
-                    if file_owner_id in allowed_ids:
-                        all_files.append(item)
-                    else:
-                        print(f"⚠️ WARNING: Skipping file {item.get('fileId')} with ownerId {file_owner_id} (not in allowed_ids)")
-            except Exception as e:
-                print(f"⚠️ Error querying files for uid {uid}: {e}")
-                # Continue with other IDs even if one fails
-                continue
-        
-        print(f"DEBUG Returning {len(all_files)} files for editor {editor_id}")
-        return all_files
-    except Exception as e:
-        print(f"❌ Error in _list_editor_files: {e}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        # Return empty list on error to prevent unauthorized access
-        return []
+        items, last_key = collect_page(aws.table("FILES_TABLE").scan, scan_args, limit, (cursor or {}).get("lek"))
+        return items, {"lek": last_key} if last_key else None
+
+    after = (cursor or {}).get("after")
+    if after is not None and (not isinstance(after, list) or len(after) != 2):
+        raise PaginationError("Cursor does not belong to a sync")
+    after = tuple(after) if after else None
+    low = max(sync_from["from"], after[0]) if after else sync_from["from"]
+
+    # Unlike a listing, a sync cannot skip an owner that failed: the token
+    # would move past changes the client never saw
+    def owner_changes(uid):
+        projection, names = catalog.sync_projection()
+        query_args = dict(
+            IndexName=catalog.SYNC_INDEX,
+            KeyConditionExpression=aws.key("ownerId").eq(uid) & aws.key("updatedAt").gte(low),
+            ProjectionExpression=projection,
+            ExpressionAttributeNames=names,
+        )
+        return _owner_page(aws.shared_table("FILES_TABLE").query, query_args, limit + 1, after, False, _change_key)
+
+    workers = max(1, min(len(scope), EDITOR_FANOUT_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        per_owner = list(pool.map(owner_changes, scope))
+
+    page = list(itertools.islice(heapq.merge(*per_owner, key=_change_key), limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+    return page, {"after": list(_change_key(page[-1]))} if has_more else None
+
+def _change_key(item):
+    return (str(item.get("updatedAt") or ""), str(item.get("fileId") or ""))
+
+def _split_changes(changes, include_pending):
+    """(changed records, deleted file ids) from a page of changes."""
+    files, deleted = [], []
+    for item in changes:
+        if catalog.is_tombstone(item):
+            deleted.append(item["deletedFileId"])
+        elif not (HIDE_PENDING and not include_pending and item.get("status") == "PENDING"):
+            files.append(item)
+    return files, deleted
 
 # ------------------------------------------------------------------
-# 3️⃣ Viewer – only own files
-def _list_viewer_files(viewer_id, viewer_email):
-    q = files_table.query(
-        IndexName="ownerId-index",
-        KeyConditionExpression=Key("ownerId").eq(viewer_id)
+# 5️⃣ Revalidation – answer If-None-Match before reading any files
+# Every write to a file record, and every tombstone, sets updatedAt, so an
+# owner's newest entry on ownerId-updatedAt-index versions all of their
+# files. When a request carries If-None-Match, an owner-scoped listing's
+# ETag hashes the caller, the query and those versions (one Limit=1 query
+# per owner), and a match is answered before any listing query runs.
+# Requests without the header skip these queries. The versions are read before
+# the files, so a write racing the listing only costs a full response
+# later, never a wrong 304. Changes younger than SYNC_OVERLAP may not have
+# reached every index yet; until they have, and for admin listings without
+# an owner filter, the ETag is a hash of the page instead (see success()).
+def _owner_version(uid):
+    resp = aws.shared_table("FILES_TABLE").query(
+        IndexName=catalog.SYNC_INDEX,
+        KeyConditionExpression=aws.key("ownerId").eq(uid),
+        ScanIndexForward=False,
+        Limit=1,
+        ProjectionExpression="#u, #f",
+        ExpressionAttributeNames={"#u": "updatedAt", "#f": "fileId"},
     )
-    items = q.get("Items", [])
-    return items
+    newest = (resp.get("Items") or [{}])[0]
+    return [newest.get("updatedAt") or "", newest.get("fileId") or ""]
+
+def _version_tag(ctx, params, owners):
+    if len(owners) == 1:
+        versions = [_owner_version(owners[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(owners), EDITOR_FANOUT_CONCURRENCY)) as pool:
+            versions = list(pool.map(_owner_version, owners))
+    settled = (datetime.utcnow() - SYNC_OVERLAP).isoformat()
+    if any(updated > settled for updated, _ in versions):
+        return None
+    # A delta's since moves on every sync; what it returns depends only on the versions
+    query = {k: v for k, v in params.items() if k != "since"}
+    return etag({"user": ctx.user_id, "query": query, "delta": "since" in params,
+                 "scope": _scope_tag(owners), "versions": versions})
 
 # ------------------------------------------------------------------
 # ✅ Helpers
-def _normalize_groups(raw):
-    if isinstance(raw, list):
-        return raw
-    if isinstance(raw, str):
-        return [g.strip() for g in raw.strip("[]").replace('"', "").replace("'", "").split(",") if g.strip()]
-    return []
-
-def success(items):
-    return {
-        "statusCode": 200,
-        "headers": cors_headers(),
-        "body": json.dumps({"files": items}, default=str),
-    }
+# Without a version tag the ETag covers the page itself, not the syncToken,
+# so an unchanged page (typically an empty delta) is still answered with
+# 304 and the client keeps the token it already has. A page-hash match is
+# answered with the version tag, which the client revalidates with next.
+def success(event, items, next_cursor=None, deleted=None, sync_token=None, tag=None):
+    body = {"files": items, "nextCursor": next_cursor}
+    if deleted is not None:
+        body["deleted"] = deleted
+    page_tag = etag(body)
+    tag = tag or page_tag
+    if matches_etag(event, tag) or matches_etag(event, page_tag):
+        return not_modified(tag)
+    if sync_token:
+        body["syncToken"] = sync_token
+    return response(200, body, headers={"ETag": tag, "Cache-Control": "private, no-cache"})
 
-def failure(error):
-    return {
-        "statusCode": 500,
-        "headers": cors_headers(),
-        "body": json.dumps({"error": str(error)}),
-    }
-
-def cors_headers():
-    return {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization",
-        "Access-Control-Allow-Methods": "GET,OPTIONS",
-    }
+def failure(error, status=500):
+    return response(status, {"error": str(error)})
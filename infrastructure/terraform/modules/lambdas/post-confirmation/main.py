@@ -1,15 +1,12 @@
 import os
-import json
-import boto3
-from datetime import datetime
 
-dynamodb = boto3.resource("dynamodb")
-cognito = boto3.client("cognito-idp")
+from filevault_common import aws, directory, instrumented, log
 
 USERS_TABLE = os.environ["USERS_TABLE"]
 
+@instrumented
 def lambda_handler(event, context):
-    print("DEBUG event:", json.dumps(event))
+    log.debug_event(event)
 
     user_pool_id = event["userPoolId"]
     username = event["userName"]  # Cognito username (often same as sub)
@@ -23,18 +20,19 @@ def lambda_handler(event, context):
     full_name = attributes.get("name") or f"{given_name} {family_name}".strip()
 
     if not sub or not email:
-        print(f"⚠️ Missing sub or email for user {username}. Skipping DynamoDB insert.")
+        log.warning("⚠️ Missing sub or email for user %s. Skipping DynamoDB insert.", username)
         return event
 
     # ✅ Check if user already exists in DynamoDB first
-    table = dynamodb.Table(USERS_TABLE)
+    table = aws.table(USERS_TABLE)
+    cognito = aws.client("cognito-idp")
     try:
         existing_user = table.get_item(Key={"userId": sub})
         if "Item" in existing_user:
-            print(f"ℹ️ User {username} ({sub}) already exists in {USERS_TABLE}. Skipping post-confirmation processing to preserve existing group membership.")
+            log.info("ℹ️ User %s (%s) already exists in %s. Skipping post-confirmation processing to preserve existing group membership.", username, sub, USERS_TABLE)
             return event
     except Exception as e:
-        print(f"⚠️ Error checking if user exists: {e}. Proceeding with new user setup...")
+        log.warning("⚠️ Error checking if user exists: %s. Proceeding with new user setup...", e)
 
     # ✅ Check existing groups before adding to Viewers
     try:
@@ -45,7 +43,7 @@ def lambda_handler(event, context):
         
         if existing_groups:
             group_names = [g["GroupName"] for g in existing_groups]
-            print(f"ℹ️ User {username} is already in groups: {group_names}. Skipping group assignment.")
+            log.info("ℹ️ User %s is already in groups: %s. Skipping group assignment.", username, group_names)
         else:
             # User is not in any group, add to Viewers
             try:
@@ -54,41 +52,31 @@ def lambda_handler(event, context):
                     Username=username,
                     GroupName="Viewers"
                 )
-                print(f"✅ Added user {username} to 'Viewers' group.")
+                log.info("✅ Added user %s to 'Viewers' group.", username)
             except cognito.exceptions.ResourceNotFoundException:
-                print(f"⚠️ 'Viewers' group not found in User Pool {user_pool_id}.")
+                log.warning("⚠️ 'Viewers' group not found in User Pool %s.", user_pool_id)
             except cognito.exceptions.InvalidParameterException as e:
-                print(f"⚠️ Could not add user {username} to group: {e}")
+                log.warning("⚠️ Could not add user %s to group: %s", username, e)
             except Exception as e:
-                print(f"⚠️ Unexpected error adding user {username} to group: {e}")
+                log.warning("⚠️ Unexpected error adding user %s to group: %s", username, e)
     except cognito.exceptions.UserNotFoundException:
-        print(f"⚠️ User {username} not found in Cognito. Skipping group assignment.")
+        log.warning("⚠️ User %s not found in Cognito. Skipping group assignment.", username)
     except Exception as e:
-        print(f"⚠️ Error checking groups for user {username}: {e}")
+        log.warning("⚠️ Error checking groups for user %s: %s", username, e)
 
     # 2️⃣ Insert record in DynamoDB (only for new users)
-    item = {
-        "userId": sub,              # ✅ Primary key now uses Cognito sub
-        "email": email,
-        "name": full_name,
-        "role": "Viewer",
-        "delegatedEditor": None,
-        "createdAt": datetime.utcnow().isoformat(),
-        "updatedAt": datetime.utcnow().isoformat(),
-    }
-
-    # Remove None/empty values
-    clean_item = {k: v for k, v in item.items() if v not in [None, ""]}
+    # ✅ Primary key uses Cognito sub; empty values are dropped
+    clean_item = directory.user_record(sub, email, full_name, role="Viewer", cognito_username=username)
 
     try:
         table.put_item(
             Item=clean_item,
             ConditionExpression="attribute_not_exists(userId)"
         )
-        print(f"✅ User {username} ({sub}) inserted into {USERS_TABLE}")
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
-        print(f"ℹ️ User {username} already exists in {USERS_TABLE}. Skipping insert.")
+        log.info("✅ User %s (%s) inserted into %s", username, sub, USERS_TABLE)
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        log.info("ℹ️ User %s already exists in %s. Skipping insert.", username, USERS_TABLE)
     except Exception as e:
-        print(f"❌ Error inserting user {username} into DynamoDB: {e}")
+        log.error("❌ Error inserting user %s into DynamoDB: %s", username, e)
 
     return event  # must always return event so Cognito continues
@@ -87,11 +87,12 @@ resource "aws_lambda_function" "post_confirmation" {
 
   filename         = "${path.module}/post_confirmation.zip"
   source_code_hash = filebase64sha256("${path.module}/post-confirmation/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, {
       USERS_TABLE = var.users_table_name
-    }
+    })
   }
 }
 
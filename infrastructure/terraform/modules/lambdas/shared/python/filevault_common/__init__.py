@@ -0,0 +1,31 @@
+"""
+Shared runtime for the FileVault Lambdas, shipped as a Lambda layer.
+
+Everything here is cheap to import: boto3 is only loaded the first time an
+AWS client or table is actually requested, and the objects are reused across
+warm invocations of the same execution environment.
+"""
+
+from . import audit, log, metrics
+from .audit import flush_after, log_event
+from .aws import client, resource, shared_table, table, thread_table
+from .http import response
+from .identity import RequestContext, normalize_groups
+from .metrics import instrumented
+
+__all__ = [
+    "RequestContext",
+    "audit",
+    "client",
+    "flush_after",
+    "instrumented",
+    "log",
+    "log_event",
+    "metrics",
+    "normalize_groups",
+    "resource",
+    "response",
+    "shared_table",
+    "table",
+    "thread_table",
+]
@@ -0,0 +1,253 @@
+"""
+Audit records for the FileVaultAuditEvents / FileVaultDeletionAuditLog tables.
+
+log_event() only queues the record; the queue is written with
+batch_write_item when it reaches AUDIT_FLUSH_THRESHOLD records and when the
+handler returns (see flush_after). Every record is also printed as an
+AUDIT_LOG line, so CloudWatch keeps a copy even if a batch write fails.
+
+Set AUDIT_ASYNC=true to hand batches to a background thread instead of
+writing them on the request path. Batches still pending when the execution
+environment is frozen are written on its next invocation; if the environment
+is reaped first they survive only in the AUDIT_LOG lines.
+
+The general audit table (FileVaultAuditEvents) is keyed on
+eventShard = "<eventType>#<shard>" and eventKey = "<timestamp>#<auditId>":
+each event type is spread over AUDIT_SHARDS partitions, and the auditId in
+the sort key means two events can never overwrite each other. The shard is
+derived from the auditId, so rewriting a record always lands on the same key.
+query_event_type() reads one event type back across all shards.
+"""
+
+import functools
+import heapq
+import json
+import os
+import queue
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from . import aws, log
+from .batch import WRITE_CHUNK, batch_write
+
+AUDIT_TTL_DAYS = 90
+
+FLUSH_THRESHOLD = int(os.getenv("AUDIT_FLUSH_THRESHOLD", "25"))
+ASYNC_MODE = os.getenv("AUDIT_ASYNC", "false").lower() == "true"
+
+# Readers query every shard below this number, so it may be raised but
+# never lowered while records written with the larger value still exist.
+# Leave it at the layer default or set it on every function.
+AUDIT_SHARDS = int(os.getenv("AUDIT_SHARDS", "16"))
+
+
+# ───────────────────────────────────────────
+# Keys
+# ───────────────────────────────────────────
+def shard_key(event_type, shard):
+    return f"{event_type}#{shard}"
+
+
+def event_key(timestamp, audit_id):
+    return f"{timestamp}#{audit_id}"
+
+
+def with_keys(record, shards=None):
+    """Add eventShard/eventKey to a record that has eventType, timestamp and auditId."""
+    shard = zlib.crc32(str(record["auditId"]).encode()) % (shards or AUDIT_SHARDS)
+    record["eventShard"] = shard_key(record["eventType"], shard)
+    record["eventKey"] = event_key(record["timestamp"], record["auditId"])
+    return record
+
+
+def key_range(start=None, end=None):
+    """
+    eventKey bounds for a timestamp range; either end may be None. The upper
+    bound is inclusive: "~" sorts after every character of an auditId.
+    """
+    return (start or None), (f"{end}#~" if end else None)
+
+
+def range_condition(start=None, end=None):
+    """eventKey range condition for a timestamp range, or None."""
+    return _between(*key_range(start, end))
+
+
+def _between(low, high):
+    key = aws.key("eventKey")
+    if low and high:
+        return key.between(low, high)
+    if low:
+        return key.gte(low)
+    if high:
+        return key.lte(high)
+    return None
+
+
+def build_record(event_type, actor, target=None, file_id=None, status="SUCCESS", details=None, ip=None):
+    now = datetime.utcnow()
+    record = {
+        "auditId": str(uuid.uuid4()),
+        "eventType": event_type,
+        "timestamp": now.isoformat(),
+        "actorUserId": actor.get("id"),
+        "actorEmail": actor.get("email"),
+        "targetUserId": target.get("id") if target else None,
+        "fileId": file_id,
+        "status": status,
+        "ipAddress": ip,
+        "details": details or {},
+        "ttl": int((now + timedelta(days=AUDIT_TTL_DAYS)).timestamp()),
+    }
+    # actorUserId/targetUserId are GSI keys and cannot be written as NULL
+    return with_keys({k: v for k, v in record.items() if v is not None})
+
+
+class AuditWriter:
+    """Per-process buffer of audit records, written with batch_write_item."""
+
+    def __init__(self, flush_threshold=FLUSH_THRESHOLD, async_mode=ASYNC_MODE):
+        self.flush_threshold = max(1, flush_threshold)
+        self.async_mode = async_mode
+        self._pending = []  # (table_name, record)
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+
+    def add(self, record, table_name="GENERAL_AUDIT_TABLE"):
+        with self._lock:
+            self._pending.append((aws.table_name(table_name), record))
+            full = len(self._pending) >= self.flush_threshold
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self.async_mode:
+            self._ensure_worker()
+            self._queue.put(batch)
+        else:
+            self._write(batch)
+
+    def drain(self):
+        """Block until the async worker has written everything handed to it."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._queue = self._queue or queue.Queue()
+            self._worker = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                self._write(batch)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        dynamodb = aws.resource("dynamodb") if not self.async_mode else aws.thread_resource("dynamodb")
+        for start in range(0, len(batch), WRITE_CHUNK):
+            chunk = batch[start:start + WRITE_CHUNK]
+            request_items = {}
+            for table_name, record in chunk:
+                request_items.setdefault(table_name, []).append({"PutRequest": {"Item": record}})
+            try:
+                batch_write(request_items, dynamodb=dynamodb)
+            except Exception as e:
+                log.warning("⚠️ Failed to write %s audit record(s): %s", len(chunk), e)
+
+
+_writer = AuditWriter()
+
+
+def log_event(event_type, actor, target=None, file_id=None, status="SUCCESS",
+              details=None, ip=None, table_name="GENERAL_AUDIT_TABLE"):
+    record = build_record(event_type, actor, target=target, file_id=file_id,
+                          status=status, details=details, ip=ip)
+    enqueue(record, table_name)
+    return record
+
+
+def enqueue(record, table_name="GENERAL_AUDIT_TABLE"):
+    """Queue a pre-built record (e.g. the deletion audit schema) for the next flush."""
+    print("AUDIT_LOG:", json.dumps(record, default=str))
+    try:
+        _writer.add(record, table_name)
+    except Exception as e:
+        log.warning("⚠️ Failed to log audit event: %s", e)
+
+
+def flush():
+    try:
+        _writer.flush()
+    except Exception as e:
+        log.warning("⚠️ Failed to flush audit log: %s", e)
+
+
+def flush_after(handler):
+    """Decorator: flush queued audit records when the handler returns or raises."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            flush()
+    return wrapper
+
+
+# ───────────────────────────────────────────
+# Reading an event type across shards
+# ───────────────────────────────────────────
+def query_event_type(event_type, limit, start=None, end=None, ascending=False, after=None,
+                     filter_expression=None, table_name="GENERAL_AUDIT_TABLE", concurrency=8):
+    """
+    One page of `event_type` records ordered by eventKey, merged across all
+    shards. `after` is the eventKey the previous page ended on; returns
+    (items, next_after), with next_after None once the range is exhausted.
+
+    Every shard is asked for up to `limit` records past `after` (in
+    parallel), so a page costs up to AUDIT_SHARDS x limit reads.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .pagination import collect_page
+
+    low, high = key_range(start, end)
+    # Key conditions cannot be exclusive on both ends, so `after` is used as
+    # an inclusive bound and the record it names is dropped from the results
+    if after:
+        if ascending:
+            low = after
+        else:
+            high = after
+
+    def read_shard(shard):
+        key = aws.key("eventShard").eq(shard_key(event_type, shard))
+        bounds = _between(low, high)
+        if bounds is not None:
+            key &= bounds
+        kwargs = {"KeyConditionExpression": key, "ScanIndexForward": ascending}
+        if filter_expression is not None:
+            kwargs["FilterExpression"] = filter_expression
+        items, last_key = collect_page(aws.shared_table(table_name).query, kwargs, limit + 1, None)
+        items = [item for item in items if item["eventKey"] != after]
+        return items, last_key is not None or len(items) > limit
+
+    workers = max(1, min(concurrency, AUDIT_SHARDS))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(read_shard, range(AUDIT_SHARDS)))
+
+    merged = list(heapq.merge(*(items for items, _ in results),
+                              key=lambda item: item["eventKey"], reverse=not ascending))
+    page = merged[:limit]
+    more = len(merged) > limit or any(more for _, more in results)
+    return page, (page[-1]["eventKey"] if more and page else None)
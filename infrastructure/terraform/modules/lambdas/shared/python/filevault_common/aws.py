@@ -0,0 +1,228 @@
+"""Lazily created, process-wide AWS clients and DynamoDB tables."""
+
+import os
+import threading
+
+from . import metrics
+
+_lock = threading.Lock()
+_clients = {}
+_resources = {}
+_tables = {}
+
+# S3 presigned URLs must be SigV4 for KMS-encrypted objects. The DynamoDB
+# client is shared by the worker pools (see shared_table), so it gets enough
+# pooled connections for the widest fan-out.
+_CLIENT_CONFIG = {
+    "s3": {"signature_version": "s3v4"},
+    "dynamodb": {"max_pool_connections": int(os.getenv("DYNAMODB_MAX_POOL_CONNECTIONS", "32"))},
+}
+
+
+def client(service):
+    """Return a cached boto3 client, creating it on first use."""
+    cached = _clients.get(service)
+    if cached is not None:
+        return cached
+    with _lock:
+        if service not in _clients:
+            import boto3
+            from botocore.config import Config
+
+            kwargs = {}
+            if service in _CLIENT_CONFIG:
+                kwargs["config"] = Config(**_CLIENT_CONFIG[service])
+            _clients[service] = metrics.instrument(boto3.client(service, **kwargs))
+        return _clients[service]
+
+
+def resource(service):
+    """Return a cached boto3 resource, creating it on first use."""
+    cached = _resources.get(service)
+    if cached is not None:
+        return cached
+    with _lock:
+        if service not in _resources:
+            import boto3
+
+            _resources[service] = boto3.resource(service)
+            metrics.instrument(_resources[service].meta.client)
+        return _resources[service]
+
+
+def table_name(name_or_env):
+    """
+    Resolve an environment variable name (e.g. "FILES_TABLE") or a literal
+    table name to the table name; the environment is consulted first.
+    """
+    return os.getenv(name_or_env) or name_or_env
+
+
+def table(name_or_env):
+    """Return a cached DynamoDB Table (see table_name for the argument)."""
+    name = table_name(name_or_env)
+    cached = _tables.get(name)
+    if cached is not None:
+        return cached
+    dynamodb = resource("dynamodb")
+    with _lock:
+        if name not in _tables:
+            _tables[name] = dynamodb.Table(name)
+        return _tables[name]
+
+
+class SharedTable:
+    """
+    The Table calls the worker pools make (get_item, put_item, update_item,
+    delete_item, query, scan), on the process-wide low-level client.
+
+    boto3 resources are not thread-safe, but clients are, so one of these can
+    be shared by every thread. Arguments and results look like the Table
+    API's: plain Python values, and Key()/Attr() conditions.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.client = client("dynamodb")
+
+    def get_item(self, **kwargs):
+        return self._call("get_item", kwargs)
+
+    def put_item(self, **kwargs):
+        return self._call("put_item", kwargs)
+
+    def update_item(self, **kwargs):
+        return self._call("update_item", kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._call("delete_item", kwargs)
+
+    def query(self, **kwargs):
+        return self._call("query", kwargs)
+
+    def scan(self, **kwargs):
+        return self._call("scan", kwargs)
+
+    def _call(self, operation, kwargs):
+        params = _serialize_params(kwargs)
+        params["TableName"] = self.name
+        return _deserialize_response(getattr(self.client, operation)(**params))
+
+
+_shared_tables = {}
+
+_CONDITION_PARAMS = {"KeyConditionExpression": True, "FilterExpression": False, "ConditionExpression": False}
+_ITEM_PARAMS = ("Key", "Item", "ExclusiveStartKey")
+_ITEM_RESULTS = ("Item", "Attributes", "LastEvaluatedKey")
+
+
+def _serialize_params(kwargs):
+    from boto3.dynamodb.conditions import ConditionExpressionBuilder
+    from boto3.dynamodb.types import TypeSerializer
+
+    params = dict(kwargs)
+    names = dict(params.pop("ExpressionAttributeNames", None) or {})
+    values = dict(params.pop("ExpressionAttributeValues", None) or {})
+    builder = ConditionExpressionBuilder()
+    for param, is_key_condition in _CONDITION_PARAMS.items():
+        condition = params.get(param)
+        if condition is not None and not isinstance(condition, str):
+            built = builder.build_expression(condition, is_key_condition=is_key_condition)
+            params[param] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+
+    serializer = TypeSerializer()
+    if names:
+        params["ExpressionAttributeNames"] = names
+    if values:
+        params["ExpressionAttributeValues"] = {k: serializer.serialize(v) for k, v in values.items()}
+    for param in _ITEM_PARAMS:
+        if params.get(param):
+            params[param] = {k: serializer.serialize(v) for k, v in params[param].items()}
+    return params
+
+
+def _deserialize_response(resp):
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+
+    def plain(item):
+        return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+    for field in _ITEM_RESULTS:
+        if resp.get(field):
+            resp[field] = plain(resp[field])
+    if "Items" in resp:
+        resp["Items"] = [plain(item) for item in resp["Items"]]
+    return resp
+
+
+def shared_table(name_or_env):
+    """Return a cached SharedTable, safe to use from worker threads (see table_name for the argument)."""
+    name = table_name(name_or_env)
+    cached = _shared_tables.get(name)
+    if cached is not None:
+        return cached
+    shared = SharedTable(name)
+    with _lock:
+        return _shared_tables.setdefault(name, shared)
+
+
+_thread_local = threading.local()
+
+
+def thread_table(name_or_env):
+    """
+    Return a DynamoDB Table private to the calling thread.
+
+    Each thread builds its own session (~140 ms and a few MB), so this is
+    only for long-lived threads such as the scripts' worker pools; Lambda
+    worker pools, whose threads end with the request, use shared_table().
+    """
+    name = table_name(name_or_env)
+    tables = getattr(_thread_local, "tables", None)
+    if tables is None:
+        tables = _thread_local.tables = {}
+    if name not in tables:
+        tables[name] = thread_resource("dynamodb").Table(name)
+    return tables[name]
+
+
+def thread_resource(service):
+    """Return a boto3 resource private to the calling thread."""
+    resources = getattr(_thread_local, "resources", None)
+    if resources is None:
+        resources = _thread_local.resources = {}
+    if service not in resources:
+        import boto3
+
+        resources[service] = boto3.session.Session().resource(service)
+        metrics.instrument(resources[service].meta.client)
+    return resources[service]
+
+
+def key(name):
+    """boto3 Key condition builder, imported on first use."""
+    from boto3.dynamodb.conditions import Key
+
+    return Key(name)
+
+
+def attr(name):
+    """boto3 Attr condition builder, imported on first use."""
+    from boto3.dynamodb.conditions import Attr
+
+    return Attr(name)
+
+
+def client_error():
+    """
+    botocore's ClientError, imported on first use. An except clause only
+    evaluates its expression once an exception is raised, so
+    `except aws.client_error():` keeps botocore out of module import.
+    """
+    from botocore.exceptions import ClientError
+
+    return ClientError
@@ -0,0 +1,98 @@
+"""BatchGetItem / BatchWriteItem / TransactWriteItems helpers that chunk requests and retry leftovers."""
+
+import time
+
+from . import aws
+
+GET_CHUNK = 100   # batch_get_item limit
+WRITE_CHUNK = 25  # batch_write_item limit
+MAX_ATTEMPTS = 5
+
+
+def backoff(attempt):
+    time.sleep(min(0.05 * (2 ** attempt), 1.0))
+
+
+def batch_get_items(name_or_env, keys, projection=None, names=None):
+    """
+    Fetch items by primary key, 100 keys per call, retrying UnprocessedKeys.
+
+    Returns the items found (in no particular order); missing keys are simply
+    absent from the result.
+    """
+    dynamodb = aws.resource("dynamodb")
+    table_name = aws.table_name(name_or_env)
+    items = []
+    for start in range(0, len(keys), GET_CHUNK):
+        spec = {"Keys": keys[start:start + GET_CHUNK]}
+        if projection:
+            spec["ProjectionExpression"] = projection
+        if names:
+            spec["ExpressionAttributeNames"] = names
+        request = {table_name: spec}
+        for attempt in range(MAX_ATTEMPTS):
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(resp.get("Responses", {}).get(table_name, []))
+            request = resp.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            backoff(attempt)
+        else:
+            raise RuntimeError(f"{len(request[table_name]['Keys'])} key(s) still unprocessed after {MAX_ATTEMPTS} attempts")
+    return items
+
+
+def batch_write(request_items, dynamodb=None):
+    """
+    One batch_write_item call (at most 25 requests) with exponential backoff
+    on UnprocessedItems. Raises if anything is still unprocessed at the end.
+    """
+    dynamodb = dynamodb or aws.resource("dynamodb")
+    for attempt in range(MAX_ATTEMPTS):
+        resp = dynamodb.batch_write_item(RequestItems=request_items)
+        request_items = resp.get("UnprocessedItems") or {}
+        if not request_items:
+            return
+        backoff(attempt)
+    left = sum(len(v) for v in request_items.values())
+    raise RuntimeError(f"{left} item(s) still unprocessed after {MAX_ATTEMPTS} attempts")
+
+
+TRANSACT_CHUNK = 100  # transact_write_items limit
+RETRYABLE_CANCELLATIONS = {"TransactionConflict", "ThrottlingError", "ProvisionedThroughputExceeded"}
+
+
+def transact_write(actions):
+    """
+    One transact_write_items call (at most 100 actions).
+
+    Actions are written like resource calls: "TableName" may be an env
+    variable name, and Key / ExpressionAttributeValues hold plain Python
+    values. Cancellations caused only by conflicts or throttling are retried
+    with backoff. Returns None once the transaction commits, or the list of
+    cancellation codes (one per action, "None" for actions that were fine)
+    when it was cancelled for any other reason, e.g. a failed condition.
+    """
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+    items = []
+    for action in actions:
+        (kind, spec), = action.items()
+        spec = dict(spec, TableName=aws.table_name(spec["TableName"]))
+        for field in ("Key", "Item", "ExpressionAttributeValues"):
+            if field in spec:
+                spec[field] = {k: serializer.serialize(v) for k, v in spec[field].items()}
+        items.append({kind: spec})
+
+    client = aws.client("dynamodb")
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            client.transact_write_items(TransactItems=items)
+            return None
+        except client.exceptions.TransactionCanceledException as e:
+            codes = [r.get("Code", "None") for r in e.response.get("CancellationReasons", [])]
+            if not set(codes) - {"None"} <= RETRYABLE_CANCELLATIONS:
+                return codes
+        backoff(attempt)
+    raise RuntimeError(f"Transaction of {len(items)} action(s) still conflicting after {MAX_ATTEMPTS} attempts")
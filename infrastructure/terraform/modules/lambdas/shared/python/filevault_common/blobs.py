@@ -0,0 +1,127 @@
+"""
+Content-addressed blob index (FileVaultBlobs) for upload deduplication.
+
+Each blob item maps a SHA-256 to the S3 object holding those bytes and
+counts the FileVaultFiles records pointing at it:
+
+    blobId    the hash, prefixed with the owner id unless DEDUP_SCOPE=global
+    s3Key     object under uploads/.../blobs/ holding the content
+    status    PENDING until finalize_upload has verified the hash, then AVAILABLE
+    refCount  number of file records referencing the blob
+
+A reference can only be taken while refCount > 0, so once release() has
+taken the count to zero nothing can revive the blob and its object is safe
+to delete.
+
+DEDUP_SCOPE defaults to "owner": with "global", knowing a file's hash is
+enough to obtain a copy of it, which only suits deployments whose users
+may all read each other's files.
+"""
+
+import os
+from datetime import datetime
+
+from . import aws
+
+SCOPE = os.getenv("DEDUP_SCOPE", "owner")
+
+
+def blob_id(sha256, owner_id):
+    return sha256 if SCOPE == "global" else f"{owner_id}:{sha256}"
+
+
+def blob_key(sha256, owner_id, file_id):
+    """
+    Object key for a new blob. The claiming file id keeps it unique: a blob
+    that fails verification is forgotten but its object stays in use by that
+    file, so a later claim for the same hash must not overwrite it.
+    """
+    prefix = "uploads/blobs" if SCOPE == "global" else f"uploads/{owner_id}/blobs"
+    return f"{prefix}/{sha256}/{file_id}"
+
+
+def add_reference(blob_id):
+    """Take a reference on a verified blob; returns the blob item, or None if there is none."""
+    table = aws.table("BLOBS_TABLE")
+    try:
+        return table.update_item(
+            Key={"blobId": blob_id},
+            UpdateExpression="ADD refCount :one",
+            ConditionExpression="#s = :available AND refCount > :zero",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":one": 1, ":zero": 0, ":available": "AVAILABLE"},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+
+
+def claim(blob_id, sha256, s3_key):
+    """Register a new PENDING blob holding one reference; False if the hash is already taken."""
+    table = aws.table("BLOBS_TABLE")
+    try:
+        table.put_item(
+            Item={
+                "blobId": blob_id,
+                "sha256": sha256,
+                "s3Key": s3_key,
+                "status": "PENDING",
+                "refCount": 1,
+                "createdAt": datetime.utcnow().isoformat(),
+            },
+            ConditionExpression="attribute_not_exists(blobId)",
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def mark_available(blob_id, size_bytes, etag):
+    """Open a verified blob for deduplication."""
+    aws.table("BLOBS_TABLE").update_item(
+        Key={"blobId": blob_id},
+        UpdateExpression="SET #s = :available, sizeBytes = :size, etag = :etag, verifiedAt = :now",
+        ConditionExpression="attribute_exists(blobId)",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={
+            ":available": "AVAILABLE",
+            ":size": size_bytes,
+            ":etag": etag,
+            ":now": datetime.utcnow().isoformat(),
+        },
+    )
+
+
+def forget(blob_id):
+    """Drop a blob whose content did not match its hash (the object stays with its one file)."""
+    aws.table("BLOBS_TABLE").delete_item(Key={"blobId": blob_id})
+
+
+def release(blob_id):
+    """
+    Drop one reference. Returns True when it was the last one, i.e. the
+    caller should now delete the S3 object.
+    """
+    table = aws.table("BLOBS_TABLE")
+    try:
+        remaining = table.update_item(
+            Key={"blobId": blob_id},
+            UpdateExpression="ADD refCount :minus_one",
+            ConditionExpression="attribute_exists(blobId)",
+            ExpressionAttributeValues={":minus_one": -1},
+            ReturnValues="UPDATED_NEW",
+        )["Attributes"]["refCount"]
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return True  # forgotten blob: the file was its only user
+
+    if remaining > 0:
+        return False
+    try:
+        table.delete_item(
+            Key={"blobId": blob_id},
+            ConditionExpression="refCount <= :zero",
+            ExpressionAttributeValues={":zero": 0},
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    return True
@@ -0,0 +1,116 @@
+"""
+FileVaultFiles record shape and the listing indexes built on it.
+
+    ownerId-uploadedAt-index  ownerId + uploadedAt  one owner's files by date
+    ownerId-updatedAt-index   ownerId + updatedAt   one owner's changes, for delta sync
+
+The uploadedAt GSI projects only LIST_ATTRIBUTES, which is everything the
+Files page renders, plus fileNameLower for filename search (a begins_with
+filter); the updatedAt GSI projects SYNC_ATTRIBUTES. Keep them in step with
+storage/filevault_files.tf. fileNameLower is written by upload and
+backfilled by the files-list-keys migration.
+
+Every write to a file record sets updatedAt. Deleting a record leaves a
+tombstone in the same table (fileId "deleted#<fileId>", no uploadedAt, so
+it never shows up in listings) that carries the owner, the deleted id and a
+fresh updatedAt, and expires after TOMBSTONE_DAYS through the table's TTL.
+A delta sync older than that has to start over with a full listing.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from . import aws, log
+from .batch import WRITE_CHUNK, batch_write
+
+LIST_INDEX = "ownerId-uploadedAt-index"
+SYNC_INDEX = "ownerId-updatedAt-index"
+
+LIST_ATTRIBUTES = (
+    "fileId", "ownerId", "ownerEmail", "fileName", "s3Key",
+    "uploadedAt", "status", "sizeBytes", "uploadedBy",
+)
+SYNC_ATTRIBUTES = LIST_ATTRIBUTES + ("updatedAt", "deletedFileId")
+
+TOMBSTONE_PREFIX = "deleted#"
+TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+
+def _projection(attributes):
+    names = {f"#a{i}": attr for i, attr in enumerate(attributes)}
+    return ", ".join(names), names
+
+
+def list_projection():
+    """(ProjectionExpression, ExpressionAttributeNames) for LIST_ATTRIBUTES."""
+    return _projection(LIST_ATTRIBUTES)
+
+
+def sync_projection():
+    """(ProjectionExpression, ExpressionAttributeNames) for SYNC_ATTRIBUTES."""
+    return _projection(SYNC_ATTRIBUTES)
+
+
+def name_keys(file_name):
+    """Attributes that make a file findable by filename prefix."""
+    file_name = (file_name or "").strip().lower()
+    if not file_name:
+        return {}
+    return {"fileNameLower": file_name}
+
+
+# ───────────────────────────────────────────
+# Deletion
+# ───────────────────────────────────────────
+def delete_record(file_id):
+    """
+    Delete file record file_id; returns the item as it was, or None if it was
+    already gone. Only the call that actually removed the record gets it
+    back, so only that caller may release the record's blob reference.
+    Safe to call from worker threads.
+    """
+    table = aws.shared_table("FILES_TABLE")
+    try:
+        return table.delete_item(
+            Key={"fileId": file_id},
+            ConditionExpression="attribute_exists(fileId)",
+            ReturnValues="ALL_OLD",
+        )["Attributes"]
+    except table.client.exceptions.ConditionalCheckFailedException:
+        return None
+
+
+# ───────────────────────────────────────────
+# Tombstones
+# ───────────────────────────────────────────
+def is_tombstone(item):
+    return bool(item) and "deletedFileId" in item
+
+
+def tombstone(item, now=None):
+    """The tombstone item recording the deletion of file record `item`."""
+    now = now or datetime.utcnow()
+    return {
+        "fileId": TOMBSTONE_PREFIX + item["fileId"],
+        "deletedFileId": item["fileId"],
+        "ownerId": item["ownerId"],
+        "updatedAt": now.isoformat(),
+        "ttl": int((now + timedelta(days=TOMBSTONE_DAYS)).timestamp()),
+    }
+
+
+def record_deletions(items):
+    """
+    Write tombstones for file records that were just deleted. Best effort: a
+    missing tombstone only leaves the file in delta-synced caches until
+    their next full listing.
+    """
+    now = datetime.utcnow()
+    tombstones = [tombstone(item, now) for item in items if item.get("ownerId")]
+    table_name = aws.table_name("FILES_TABLE")
+    for start in range(0, len(tombstones), WRITE_CHUNK):
+        chunk = tombstones[start:start + WRITE_CHUNK]
+        try:
+            batch_write({table_name: [{"PutRequest": {"Item": t}} for t in chunk]})
+        except Exception as e:
+            log.warning("⚠️ Failed to write %s deletion tombstone(s): %s", len(chunk), e)
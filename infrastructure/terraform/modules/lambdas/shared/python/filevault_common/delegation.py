@@ -0,0 +1,119 @@
+"""
+Warm-invocation cache of "which viewers are delegated to this editor".
+
+Each editor's FileVaultUsers item carries a delegationVersion counter that
+update_delegate and update-role bump (bump_version) whenever that editor's
+delegations change. A lookup first reads the counter with a consistent
+GetItem and only re-queries delegatedEditor-index when the cached entry is
+missing, expired or stamped with an older version. A revocation therefore
+takes effect on the very next request, while a repeat request costs one
+projected GetItem instead of a GSI query.
+
+Entries also expire after DELEGATION_CACHE_TTL seconds, which bounds the
+window in which an eventually-consistent GSI read can be cached.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import aws, log
+from .pagination import query_all
+
+CACHE_TTL = float(os.getenv("DELEGATION_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("DELEGATION_CACHE_SIZE", "1024"))
+
+VERSION_ATTRIBUTE = "delegationVersion"
+
+
+class DelegationCache:
+    """Size-bounded LRU of editor id -> (version, viewer ids, cached at)."""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, editor_id, version):
+        with self._lock:
+            entry = self._entries.get(editor_id)
+            if entry is None:
+                return None
+            cached_version, viewer_ids, cached_at = entry
+            if cached_version != version or time.monotonic() - cached_at > self.ttl:
+                del self._entries[editor_id]
+                return None
+            self._entries.move_to_end(editor_id)
+            return viewer_ids
+
+    def put(self, editor_id, version, viewer_ids):
+        with self._lock:
+            self._entries[editor_id] = (version, viewer_ids, time.monotonic())
+            self._entries.move_to_end(editor_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = DelegationCache()
+
+
+def current_version(editor_id):
+    item = aws.table("USERS_TABLE").get_item(
+        Key={"userId": editor_id},
+        ProjectionExpression="#v",
+        ExpressionAttributeNames={"#v": VERSION_ATTRIBUTE},
+        ConsistentRead=True,
+    ).get("Item") or {}
+    return int(item.get(VERSION_ATTRIBUTE, 0))
+
+
+def delegated_viewer_ids(editor_id):
+    """Return the frozenset of viewer ids delegated to editor_id."""
+    version = current_version(editor_id)
+    viewer_ids = _cache.get(editor_id, version)
+    if viewer_ids is not None:
+        return viewer_ids
+
+    items = query_all(
+        aws.table("USERS_TABLE").query,
+        IndexName="delegatedEditor-index",
+        KeyConditionExpression=aws.key("delegatedEditor").eq(editor_id),
+        ProjectionExpression="userId",
+    )
+    viewer_ids = frozenset(v["userId"] for v in items if v.get("userId"))
+    _cache.put(editor_id, version, viewer_ids)
+    return viewer_ids
+
+
+def is_delegated(editor_id, owner_id):
+    return owner_id in delegated_viewer_ids(editor_id)
+
+
+def bump_version(editor_id):
+    """
+    Invalidate every warm cache entry for editor_id.
+
+    The condition stops the ADD from creating a stub item for an unknown id.
+    Failures are logged, not raised: the TTL still bounds staleness.
+    """
+    if not editor_id:
+        return
+    table = aws.table("USERS_TABLE")
+    try:
+        table.update_item(
+            Key={"userId": editor_id},
+            UpdateExpression="ADD #v :one",
+            ConditionExpression="attribute_exists(userId)",
+            ExpressionAttributeNames={"#v": VERSION_ATTRIBUTE},
+            ExpressionAttributeValues={":one": 1},
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        log.warning("⚠️ Failed to bump delegation version for %s: %s", editor_id, e)
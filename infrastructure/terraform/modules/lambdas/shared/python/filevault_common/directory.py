@@ -0,0 +1,54 @@
+"""
+FileVaultUsers record shape and the user-directory indexes built on it.
+
+    role-index          role + createdAt        newest users per role
+    email-prefix-index  emailInitial + emailLower  begins_with lookups
+
+Both GSIs project only LIST_ATTRIBUTES, which is everything the Users page
+renders; keep the three in step with storage/users.tf. A user without
+createdAt is not in role-index; the user-created-at migration backfills it.
+"""
+
+from datetime import datetime
+
+LIST_ATTRIBUTES = (
+    "userId", "email", "name", "fullName", "role",
+    "delegatedEditor", "createdAt", "lastLogin", "status",
+)
+
+
+def list_projection():
+    """(ProjectionExpression, ExpressionAttributeNames) for LIST_ATTRIBUTES."""
+    names = {f"#a{i}": attr for i, attr in enumerate(LIST_ATTRIBUTES)}
+    return ", ".join(names), names
+
+
+def email_keys(email):
+    """Attributes that place a user in email-prefix-index."""
+    email = (email or "").strip().lower()
+    if not email:
+        return {}
+    return {"emailLower": email, "emailInitial": email[0]}
+
+
+def user_record(user_id, email, full_name, role="Viewer", delegated_editor=None, now=None,
+                cognito_username=None):
+    """
+    A new FileVaultUsers item, without empty attributes (GSI keys cannot be empty).
+
+    cognitoUsername saves the Cognito admin APIs from guessing between email
+    and sub when they look the user up later.
+    """
+    now = now or datetime.utcnow().isoformat()
+    item = {
+        "userId": user_id,
+        "email": email,
+        "name": full_name,
+        "role": role,
+        "delegatedEditor": delegated_editor,
+        "cognitoUsername": cognito_username,
+        "createdAt": now,
+        "updatedAt": now,
+        **email_keys(email),
+    }
+    return {k: v for k, v in item.items() if v not in [None, ""]}
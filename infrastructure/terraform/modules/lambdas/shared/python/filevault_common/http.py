@@ -0,0 +1,49 @@
+"""API Gateway proxy responses with consistent CORS headers, and ETag revalidation."""
+
+import hashlib
+import json
+from decimal import Decimal
+
+
+def _default(o):
+    # DynamoDB numbers come back as Decimal
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    return str(o)
+
+
+def response(status, body, methods="GET,OPTIONS", headers=None):
+    all_headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Methods": methods,
+    }
+    if headers:
+        all_headers.update(headers)
+    return {
+        "statusCode": status,
+        "headers": all_headers,
+        "body": json.dumps(body, default=_default),
+    }
+
+
+def etag(body):
+    """Strong validator for a JSON body; independent of key order."""
+    raw = json.dumps(body, default=_default, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def matches_etag(event, tag):
+    """True when the request's If-None-Match already names `tag`."""
+    header = (event.get("headers") or {}).get("if-none-match")
+    if not header:
+        return False
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or tag in candidates
+
+
+def not_modified(tag, methods="GET,OPTIONS"):
+    resp = response(304, None, methods, headers={"ETag": tag})
+    resp["body"] = ""
+    return resp
@@ -0,0 +1,73 @@
+"""Caller identity parsed once per request from the API Gateway event."""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+def normalize_groups(raw):
+    """Cognito groups arrive as a list or as a stringified list ("[Admins Editors]")."""
+    if isinstance(raw, list):
+        return raw
+    if isinstance(raw, str):
+        cleaned = raw.strip("[]").replace('"', "").replace("'", "")
+        return [g.strip() for g in cleaned.replace(" ", ",").split(",") if g.strip()]
+    return []
+
+
+def _claims(event):
+    authorizer = (event.get("requestContext") or {}).get("authorizer") or {}
+    if "jwt" in authorizer:  # HTTP API format
+        return authorizer.get("jwt", {}).get("claims", {}) or {}
+    return authorizer.get("claims", {}) or {}  # REST API format
+
+
+@dataclass
+class RequestContext:
+    user_id: Optional[str]
+    email: Optional[str]
+    username: Optional[str]
+    groups: List[str] = field(default_factory=list)
+    ip: str = "unknown"
+    method: Optional[str] = None
+    claims: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_event(cls, event):
+        event = event or {}
+        claims = _claims(event)
+        request_context = event.get("requestContext") or {}
+        http = request_context.get("http") or {}
+        ip = (
+            http.get("sourceIp")
+            or (request_context.get("identity") or {}).get("sourceIp")
+            or "unknown"
+        )
+        return cls(
+            user_id=claims.get("sub"),
+            email=claims.get("email"),
+            username=claims.get("cognito:username") or claims.get("username"),
+            groups=normalize_groups(claims.get("cognito:groups", [])),
+            ip=ip,
+            method=http.get("method"),
+            claims=claims,
+        )
+
+    @property
+    def is_admin(self):
+        return "Admins" in self.groups
+
+    @property
+    def is_editor(self):
+        return "Editors" in self.groups
+
+    @property
+    def is_viewer(self):
+        return "Viewers" in self.groups
+
+    @property
+    def role(self):
+        return self.groups[0] if self.groups else None
+
+    @property
+    def actor(self):
+        return {"id": self.user_id, "email": self.email}
@@ -0,0 +1,148 @@
+"""
+Level-gated JSON log lines for the handlers.
+
+    from filevault_common import log
+
+    log.debug("Export page: %d items, %d segments left", len(items), len(remaining))
+    log.error("❌ ERROR listing users: %s", e)
+    log.debug_event(event)
+
+Each line is one JSON object: level, message, route, requestId and any
+keyword fields. Messages below the active level cost a comparison: the
+%-arguments are only formatted, and events only redacted and serialized,
+when the line is actually written. Pass values as %-arguments, never as
+f-strings, at every level.
+
+The level comes from LOG_LEVEL (default INFO). DEBUG can also be switched
+on for a sample of invocations: LOG_DEBUG_SAMPLE_RATE applies to every
+route, and LOG_SAMPLE_RATES overrides it per route, e.g.
+"GET /api/files=0.01,PATCH /api/users/{id}/delegate=1". The sampling
+decision is made once per invocation (see begin(), called by
+@instrumented), so a sampled request logs its whole story.
+
+debug_event() never writes token material: Authorization/Cookie headers
+are dropped, JWT claims are reduced to sub and groups, Cognito user
+attributes to sub, and request bodies are cut to LOG_BODY_LIMIT characters.
+"""
+
+import json
+import os
+import random
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+LOG_LEVEL = LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), LEVELS["INFO"])
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0"))
+BODY_LIMIT = int(os.getenv("LOG_BODY_LIMIT", "1024"))
+
+REDACTED = "[REDACTED]"
+SENSITIVE_HEADERS = {"authorization", "cookie", "x-amz-security-token"}
+KEPT_CLAIMS = {"sub", "cognito:groups"}
+
+
+def _parse_rates(raw):
+    """"route=rate,route=rate" -> {route: rate}; route keys may contain spaces."""
+    rates = {}
+    for entry in (raw or "").split(","):
+        route, separator, rate = entry.rpartition("=")
+        if separator and route.strip():
+            try:
+                rates[route.strip()] = float(rate)
+            except ValueError:
+                print(f"⚠️ Ignoring invalid LOG_SAMPLE_RATES entry: {entry!r}")
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES"))
+
+# Per-invocation state, set by begin()
+_threshold = LOG_LEVEL
+_route = None
+_request_id = None
+
+
+def begin(route=None, request_id=None):
+    """Start an invocation: remember its route and decide whether it logs at DEBUG."""
+    global _threshold, _route, _request_id
+    _route, _request_id = route, request_id
+    rate = SAMPLE_RATES.get(route, DEBUG_SAMPLE_RATE)
+    sampled = rate > 0 and random.random() < rate
+    _threshold = LEVELS["DEBUG"] if sampled else LOG_LEVEL
+
+
+def enabled(level):
+    return LEVELS[level] >= _threshold
+
+
+def _write(level, message, args, fields):
+    if args:
+        try:
+            message = message % args
+        except (TypeError, ValueError):
+            message = " ".join([message] + [str(a) for a in args])
+    line = {"level": level, "message": message}
+    if _route:
+        line["route"] = _route
+    if _request_id:
+        line["requestId"] = _request_id
+    line.update(fields)
+    print(json.dumps(line, default=str))
+
+
+def debug(message, *args, **fields):
+    if LEVELS["DEBUG"] >= _threshold:
+        _write("DEBUG", message, args, fields)
+
+
+def info(message, *args, **fields):
+    if LEVELS["INFO"] >= _threshold:
+        _write("INFO", message, args, fields)
+
+
+def warning(message, *args, **fields):
+    if LEVELS["WARNING"] >= _threshold:
+        _write("WARNING", message, args, fields)
+
+
+def error(message, *args, **fields):
+    if LEVELS["ERROR"] >= _threshold:
+        _write("ERROR", message, args, fields)
+
+
+# ───────────────────────────────────────────
+# Events
+# ───────────────────────────────────────────
+def debug_event(event):
+    """Log the incoming event at DEBUG, redacted; free when DEBUG is off."""
+    if LEVELS["DEBUG"] >= _threshold:
+        _write("DEBUG", "Event received", (), {"event": redact_event(event)})
+
+
+def redact_event(event):
+    """A copy of an API Gateway or Cognito trigger event without credentials or personal claims."""
+    if not isinstance(event, dict):
+        return event
+    redacted = dict(event)
+    if isinstance(event.get("headers"), dict):
+        redacted["headers"] = {k: (REDACTED if k.lower() in SENSITIVE_HEADERS else v)
+                               for k, v in event["headers"].items()}
+    if "cookies" in event:
+        redacted["cookies"] = REDACTED
+    if isinstance(event.get("body"), str) and len(event["body"]) > BODY_LIMIT:
+        redacted["body"] = event["body"][:BODY_LIMIT] + f"... ({len(event['body'])} chars)"
+
+    request_context = event.get("requestContext")
+    if isinstance(request_context, dict) and isinstance(request_context.get("authorizer"), dict):
+        authorizer = request_context["authorizer"]
+        jwt = authorizer.get("jwt")
+        claims = (jwt or {}).get("claims") if isinstance(jwt, dict) else authorizer.get("claims")
+        if isinstance(claims, dict):
+            kept = {k: (v if k in KEPT_CLAIMS else REDACTED) for k, v in claims.items()}
+            authorizer = dict(authorizer, jwt=dict(jwt, claims=kept)) if isinstance(jwt, dict) else dict(authorizer, claims=kept)
+        redacted["requestContext"] = dict(request_context, authorizer=authorizer)
+
+    request = event.get("request")  # Cognito triggers
+    if isinstance(request, dict) and isinstance(request.get("userAttributes"), dict):
+        attributes = {k: (v if k == "sub" else REDACTED) for k, v in request["userAttributes"].items()}
+        redacted["request"] = dict(request, userAttributes=attributes)
+    return redacted
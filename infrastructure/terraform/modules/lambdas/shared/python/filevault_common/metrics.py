@@ -0,0 +1,210 @@
+"""
+Per-invocation AWS call metrics, printed as one CloudWatch EMF record.
+
+A handler opts in with @instrumented (outermost, so the audit flush is
+counted too). From then on every client and resource the aws module hands
+out gets botocore event hooks that count and time each operation (retries
+included) and, for DynamoDB, ask for and add up ConsumedCapacity. When the
+handler returns, one Embedded Metric Format line is printed:
+
+  * metrics Latency, AwsCalls, AwsTime and ConsumedCapacity under
+    METRICS_NAMESPACE, by Function and by Function + Route
+  * properties (not metrics, but searchable in Logs Insights) with the
+    per-operation breakdown, e.g. "dynamodb.Query": {"count": 51, ...},
+    and the capacity consumed per table
+
+Calls made by background threads (worker pools, the async audit writer) are
+counted in whichever invocation is running when they finish.
+
+Set METRICS_ENABLED=false to turn the hooks and the record off.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+from . import log
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+NAMESPACE = os.getenv("METRICS_NAMESPACE", "FileVault")
+# Ask DynamoDB for ConsumedCapacity on every call that supports it
+TRACK_CAPACITY = os.getenv("METRICS_CAPACITY", "true").lower() == "true"
+
+_START = "filevault_metrics_start"
+_MODEL = "filevault_metrics_model"
+_active = False
+_cold = True
+
+
+class InvocationMetrics:
+    """AWS operations seen during the current invocation, aggregated per service.Operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.capacity = {}
+
+    def record(self, operation, ms, error=False, retries=0, capacity=None):
+        with self._lock:
+            stats = self.calls.setdefault(operation, {"count": 0, "ms": 0.0, "errors": 0, "retries": 0})
+            stats["count"] += 1
+            stats["ms"] += ms
+            stats["errors"] += int(error)
+            stats["retries"] += retries
+            for table_name, units in capacity or ():
+                self.capacity[table_name] = self.capacity.get(table_name, 0.0) + units
+
+    def snapshot(self):
+        with self._lock:
+            calls = {op: dict(stats, ms=round(stats["ms"], 3)) for op, stats in self.calls.items()}
+            return calls, {t: round(u, 2) for t, u in self.capacity.items()}
+
+
+_current = InvocationMetrics()
+
+
+# ───────────────────────────────────────────
+# botocore hooks
+# ───────────────────────────────────────────
+def _operation(model):
+    return f"{model.service_model.endpoint_prefix}.{model.name}"
+
+
+def _request_capacity(params, model, **kwargs):
+    if "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _before_call(model, context, **kwargs):
+    context[_START] = time.perf_counter()
+    context[_MODEL] = model
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    started = context.pop(_START, None)
+    if started is None:
+        return
+    ms = (time.perf_counter() - started) * 1000
+    _current.record(
+        _operation(model), ms,
+        error=http_response.status_code >= 400,
+        retries=(parsed.get("ResponseMetadata") or {}).get("RetryAttempts", 0),
+        capacity=_capacity_units(parsed.get("ConsumedCapacity")),
+    )
+
+
+def _after_call_error(context, **kwargs):
+    # Connection errors and the like; error *responses* go through _after_call
+    started = context.pop(_START, None)
+    if started is not None:
+        _current.record(_operation(context[_MODEL]), (time.perf_counter() - started) * 1000, error=True)
+
+
+def _capacity_units(consumed):
+    """[(table, units)] from a ConsumedCapacity entry or list of entries."""
+    if not consumed:
+        return []
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return [(c.get("TableName", "?"), float(c.get("CapacityUnits", 0))) for c in consumed]
+
+
+def instrument(client):
+    """Register the hooks on a botocore client (no-op unless a handler is @instrumented)."""
+    if not (_active and ENABLED):
+        return client
+    events = client.meta.events
+    if client.meta.service_model.endpoint_prefix == "dynamodb" and TRACK_CAPACITY:
+        events.register("before-parameter-build.dynamodb", _request_capacity)
+    events.register("before-call", _before_call)
+    events.register("after-call", _after_call)
+    events.register("after-call-error", _after_call_error)
+    return client
+
+
+# ───────────────────────────────────────────
+# The EMF record
+# ───────────────────────────────────────────
+def _route(event):
+    if not isinstance(event, dict):
+        return "invoke"
+    if event.get("routeKey"):
+        return event["routeKey"]
+    if event.get("triggerSource"):
+        return event["triggerSource"]
+    records = event.get("Records") or []
+    if records and isinstance(records[0], dict):
+        return records[0].get("eventSource") or "records"
+    return "invoke"
+
+
+def emf_record(function_name, route, latency_ms, status, cold_start, calls, capacity, request_id=None):
+    """The EMF JSON document for one invocation."""
+    metric_names = [("Latency", "Milliseconds"), ("AwsCalls", "Count"),
+                    ("AwsTime", "Milliseconds"), ("ConsumedCapacity", "Count")]
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Function"], ["Function", "Route"]],
+                "Metrics": [{"Name": name, "Unit": unit} for name, unit in metric_names],
+            }],
+        },
+        "Function": function_name,
+        "Route": route,
+        "Latency": round(latency_ms, 3),
+        "AwsCalls": sum(c["count"] for c in calls.values()),
+        "AwsTime": round(sum(c["ms"] for c in calls.values()), 3),
+        "ConsumedCapacity": round(sum(capacity.values()), 2),
+        "StatusCode": status,
+        "ColdStart": cold_start,
+        "calls": calls,
+        "capacity": capacity,
+    }
+    if request_id:
+        record["requestId"] = request_id
+    return record
+
+
+def instrumented(handler):
+    """Decorator: emit one metrics record per invocation of `handler` (and start its log context)."""
+    global _active
+    _active = True
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _cold
+        if not ENABLED:
+            return handler(event, context)
+        _current.reset()
+        route = _route(event)
+        log.begin(route, getattr(context, "aws_request_id", None))
+        cold_start, _cold = _cold, False
+        started = time.perf_counter()
+        status = None
+        try:
+            result = handler(event, context)
+            if isinstance(result, dict):
+                status = result.get("statusCode")
+            return result
+        except Exception:
+            status = "exception"
+            raise
+        finally:
+            calls, capacity = _current.snapshot()
+            try:
+                print(json.dumps(emf_record(
+                    getattr(context, "function_name", None) or os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local"),
+                    route, (time.perf_counter() - started) * 1000, status, cold_start,
+                    calls, capacity, getattr(context, "aws_request_id", None),
+                )))
+            except Exception as e:
+                log.warning("⚠️ Failed to emit metrics: %s", e)
+    return wrapper
@@ -0,0 +1,63 @@
+"""Opaque cursors and LastEvaluatedKey helpers shared by the listing endpoints."""
+
+import base64
+import json
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or limit; handlers map it to HTTP 400."""
+
+
+def parse_limit(raw, default, maximum):
+    if raw in (None, ""):
+        return default
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise PaginationError(f"Invalid limit: {raw}")
+    if limit < 1:
+        raise PaginationError(f"Invalid limit: {raw}")
+    return min(limit, maximum)
+
+
+def encode_cursor(state):
+    raw = json.dumps(state, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise PaginationError("Invalid cursor")
+    if not isinstance(state, dict):
+        raise PaginationError("Invalid cursor")
+    return state
+
+
+def collect_page(operation, kwargs, limit, start_key):
+    """Follow LastEvaluatedKey until `limit` items are gathered or the data runs out."""
+    items = []
+    while True:
+        call_args = dict(kwargs, Limit=limit - len(items))
+        if start_key:
+            call_args["ExclusiveStartKey"] = start_key
+        resp = operation(**call_args)
+        items.extend(resp.get("Items", []))
+        start_key = resp.get("LastEvaluatedKey")
+        if not start_key or len(items) >= limit:
+            return items, start_key
+
+
+def query_all(operation, **kwargs):
+    """Run a query or scan to completion, following LastEvaluatedKey."""
+    items = []
+    while True:
+        resp = operation(**kwargs)
+        items.extend(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
@@ -0,0 +1,57 @@
+"""Client-side pacing for APIs with low per-account quotas (Cognito admin calls, bulk table jobs)."""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread in the process.
+
+    acquire() blocks until a call may be made, so a thread pool of any size
+    never exceeds `rate` calls per second on average, with bursts of up to
+    `burst` calls.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = max(0.1, float(rate))
+        self.burst = max(1.0, float(burst if burst is not None else rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    RateLimiter whose rate follows the server's pushback: throttled() halves
+    it (down to `floor`), succeeded() adds back a little at a time (up to
+    `ceiling`). Meant for bulk jobs against on-demand or autoscaled tables,
+    where the sustainable rate is not known up front.
+    """
+
+    def __init__(self, rate, floor=1, ceiling=None, step=None):
+        super().__init__(rate)
+        self.floor = max(0.1, float(floor))
+        self.ceiling = float(ceiling if ceiling is not None else rate)
+        self.step = float(step if step is not None else max(0.1, self.ceiling / 100))
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.floor, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.ceiling, self.rate + self.step / max(1.0, self.rate))
@@ -1,49 +1,40 @@
 import os
 import json
-import boto3
-import uuid
-from datetime import datetime, timedelta
-
-# Initialize AWS clients
-dynamodb = boto3.resource("dynamodb")
-cognito = boto3.client("cognito-idp")
-lambda_client = boto3.client("lambda")
-table = dynamodb.Table(os.environ["USERS_TABLE"])
-
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
-audit_table = dynamodb.Table(GENERAL_AUDIT_TABLE)
-
-# --- Helper: Audit Logger ---
-def log_event(event_type, actor, target=None, status="SUCCESS", details=None, ip=None):
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "targetUserId": target.get("id") if target else None,
-        "status": status,
-        "details": details or {},
-        "ipAddress": ip,
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-    print("AUDIT_LOG:", json.dumps(record))
-    try:
-        audit_table.put_item(Item=record)
-    except Exception as e:
-        print(f"⚠️ Failed to log audit event: {e}")
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-def lambda_handler(event, context):
-    print("DEBUG event:", json.dumps(event))
+from filevault_common import RequestContext, aws, delegation, flush_after, instrumented, log, log_event
+from filevault_common import response as _http_response
+from filevault_common.batch import batch_get_items
+from filevault_common.ratelimit import RateLimiter
 
-    user_pool_id = os.environ["USER_POOL_ID"]
-    update_delegate_lambda = os.environ.get("UPDATE_DELEGATE_LAMBDA")
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+ROLE_GROUPS = {"Admin": "Admins", "Editor": "Editors", "Viewer": "Viewers"}
+
+# Bulk role changes
+MAX_BULK_ROLE_CHANGES = int(os.getenv("MAX_BULK_ROLE_CHANGES", "75"))
+ROLE_UPDATE_CONCURRENCY = int(os.getenv("ROLE_UPDATE_CONCURRENCY", "4"))
+# Cognito admin group APIs are throttled per account; stay under the quota
+COGNITO_RPS = float(os.getenv("COGNITO_RPS", "10"))
+
+_cognito_limiter = RateLimiter(COGNITO_RPS)
+
+
+@instrumented
+@flush_after
+def lambda_handler(event, context):
+    log.debug_event(event)
 
     # --- Parse acting admin from token ---
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    actor_id = claims.get("sub")
-    actor_email = claims.get("email", "unknown")
+    ctx = RequestContext.from_event(event)
+    actor = {"id": ctx.user_id, "email": ctx.email or "unknown"}
+
+    if not ctx.is_admin:
+        log_event("UnauthorizedRoleUpdateAttempt", actor=actor, status="DENIED",
+                  details={"route": event.get("routeKey")}, ip=ctx.ip)
+        return response(403, {"error": "Forbidden – Admins only"})
+
+    if event.get("routeKey") == "PATCH /api/users/roles":
+        return _bulk_update(event, ctx)
 
     # --- Step 0: Parse input ---
     path_params = event.get("pathParameters") or {}
@@ -56,154 +47,219 @@ def lambda_handler(event, context):
 
     if not user_id or not new_role:
         return response(400, {"error": "Missing userId or role"})
+    if new_role not in ROLE_GROUPS:
+        return response(400, {"error": f"Invalid role: {new_role}"})
+
+    status, result = change_role(ctx, user_id, new_role)
+    return response(status, result)
+
+
+def change_role(ctx, user_id, new_role, item=None):
+    """
+    Move one user to new_role; returns (http status, body).
 
-    print(f"Updating user role for {user_id} → {new_role}")
+    Only the Cognito calls the group diff requires are made, and a user
+    already in the right role and group costs a single list call. `item`
+    may be a prefetched FileVaultUsers item (the bulk path batch-gets them).
+    """
+    actor = {"id": ctx.user_id, "email": ctx.email or "unknown"}
+    ip = ctx.ip
+    user_pool_id = os.environ["USER_POOL_ID"]
+    update_delegate_lambda = os.environ.get("UPDATE_DELEGATE_LAMBDA")
+
+    log.info("Updating user role for %s → %s", user_id, new_role)
+
+    table = aws.shared_table("USERS_TABLE")
+    cognito = aws.client("cognito-idp")
 
     # --- Step 1: Verify user exists in DynamoDB ---
     try:
-        resp = table.get_item(Key={"userId": user_id})
-        item = resp.get("Item")
+        if item is None:
+            item = table.get_item(Key={"userId": user_id}).get("Item")
         if not item:
-            log_event(
-                "RoleUpdateFailed",
-                actor={"id": actor_id, "email": actor_email},
-                target={"id": user_id},
-                status="FAILED",
-                details={"reason": "User not found"},
-                ip=ip
-            )
-            return response(404, {"error": f"User {user_id} not found in DynamoDB"})
+            log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                      details={"reason": "User not found"}, ip=ip)
+            return 404, {"error": f"User {user_id} not found in DynamoDB"}
         old_role = item.get("role")
-        user_email = item.get("email")
+        cognito_username = item.get("cognitoUsername") or item.get("email") or user_id
     except Exception as e:
-        log_event(
-            "RoleUpdateFailed",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": user_id},
-            status="FAILED",
-            details={"error": str(e)},
-            ip=ip
-        )
-        return response(500, {"error": "Failed to fetch user", "details": str(e)})
+        log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                  details={"error": str(e)}, ip=ip)
+        return 500, {"error": "Failed to fetch user", "details": str(e)}
 
-    cognito_username = user_email or user_id
+    target_group = ROLE_GROUPS[new_role]
 
-    # --- Step 2: Update Cognito Groups ---
+    # --- Step 2: Update Cognito Groups (diff only) ---
     try:
-        existing_groups = cognito.admin_list_groups_for_user(
-            UserPoolId=user_pool_id,
-            Username=cognito_username
-        ).get("Groups", [])
+        _cognito_limiter.acquire()
+        existing = {
+            g["GroupName"] for g in cognito.admin_list_groups_for_user(
+                UserPoolId=user_pool_id,
+                Username=cognito_username
+            ).get("Groups", [])
+        }
+    except cognito.exceptions.UserNotFoundException:
+        return 404, {"error": f"User {cognito_username} not found in Cognito"}
+    except Exception as e:
+        log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                  details={"error": f"Group lookup failed: {str(e)}"}, ip=ip)
+        return 500, {"error": "Failed to read Cognito groups", "details": str(e)}
 
-        for g in existing_groups:
+    to_remove = sorted(existing - {target_group})
+    for group in to_remove:
+        try:
+            _cognito_limiter.acquire()
             cognito.admin_remove_user_from_group(
                 UserPoolId=user_pool_id,
                 Username=cognito_username,
-                GroupName=g["GroupName"]
+                GroupName=group
             )
-            print(f"Removed {cognito_username} from group {g['GroupName']}")
-    except cognito.exceptions.UserNotFoundException:
-        return response(404, {"error": f"User {cognito_username} not found in Cognito"})
-    except Exception as e:
-        log_event(
-            "RoleUpdateFailed",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": user_id},
-            status="FAILED",
-            details={"error": f"Group removal failed: {str(e)}"},
-            ip=ip
-        )
+            log.info("Removed %s from group %s", cognito_username, group)
+        except Exception as e:
+            log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                      details={"error": f"Group removal failed: {str(e)}"}, ip=ip)
 
-    target_group = f"{new_role}s"
-    try:
-        cognito.admin_add_user_to_group(
-            UserPoolId=user_pool_id,
-            Username=cognito_username,
-            GroupName=target_group
-        )
-        print(f"✅ Added {cognito_username} to group {target_group}")
-    except Exception as e:
-        log_event(
-            "RoleUpdateFailed",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": user_id},
-            status="FAILED",
-            details={"error": f"Group add failed: {str(e)}"},
-            ip=ip
-        )
-        return response(500, {"error": "Failed to update Cognito group", "details": str(e)})
+    if target_group not in existing:
+        try:
+            _cognito_limiter.acquire()
+            cognito.admin_add_user_to_group(
+                UserPoolId=user_pool_id,
+                Username=cognito_username,
+                GroupName=target_group
+            )
+            log.info("✅ Added %s to group %s", cognito_username, target_group)
+        except Exception as e:
+            log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                      details={"error": f"Group add failed: {str(e)}"}, ip=ip)
+            return 500, {"error": "Failed to update Cognito group", "details": str(e)}
 
     # --- Step 3: Update DynamoDB record ---
-    try:
-        table.update_item(
-            Key={"userId": user_id},
-            UpdateExpression="SET #r = :r, updatedAt = :t",
-            ExpressionAttributeNames={"#r": "role"},
-            ExpressionAttributeValues={":r": new_role, ":t": datetime.utcnow().isoformat()}
-        )
-        print(f"✅ Updated DynamoDB role for {user_id} → {new_role}")
-    except Exception as e:
-        log_event(
-            "RoleUpdateFailed",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": user_id},
-            status="FAILED",
-            details={"error": f"DynamoDB update failed: {str(e)}"},
-            ip=ip
-        )
-        return response(500, {"error": "Failed to update DynamoDB", "details": str(e)})
+    changed = old_role != new_role
+    if changed:
+        try:
+            # Bumping delegationVersion here makes a demoted editor lose
+            # cached delegations immediately (see filevault_common.delegation)
+            table.update_item(
+                Key={"userId": user_id},
+                UpdateExpression="SET #r = :r, updatedAt = :t ADD #v :one",
+                ExpressionAttributeNames={"#r": "role", "#v": delegation.VERSION_ATTRIBUTE},
+                ExpressionAttributeValues={":r": new_role, ":t": datetime.utcnow().isoformat(), ":one": 1}
+            )
+            log.info("✅ Updated DynamoDB role for %s → %s", user_id, new_role)
+        except Exception as e:
+            log_event("RoleUpdateFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                      details={"error": f"DynamoDB update failed: {str(e)}"}, ip=ip)
+            return 500, {"error": "Failed to update DynamoDB", "details": str(e)}
 
     # --- Step 4: Delegate cleanup for demoted editors ---
+    # update_delegate unlinks every viewer of the editor on this action (its Case 3)
+    cleanup = changed and new_role == "Viewer" and bool(update_delegate_lambda)
     try:
-        if new_role.lower() == "viewer" and update_delegate_lambda:
-            lambda_client.invoke(
+        if cleanup:
+            aws.client("lambda").invoke(
                 FunctionName=update_delegate_lambda,
                 InvocationType="Event",
                 Payload=json.dumps({
                     "pathParameters": {"id": user_id},
-                    "body": json.dumps({"delegatedEditor": None})
+                    "body": json.dumps({"action": "cleanupEditor"})
                 })
             )
-            log_event(
-                "DelegateCleanupTriggered",
-                actor={"id": actor_id, "email": actor_email},
-                target={"id": user_id},
-                details={"reason": "Demoted to Viewer"},
-                ip=ip
-            )
+            log_event("DelegateCleanupTriggered", actor=actor, target={"id": user_id},
+                      details={"reason": "Demoted to Viewer"}, ip=ip)
     except Exception as e:
-        log_event(
-            "DelegateCleanupFailed",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": user_id},
-            status="FAILED",
-            details={"error": str(e)},
-            ip=ip
-        )
+        log_event("DelegateCleanupFailed", actor=actor, target={"id": user_id}, status="FAILED",
+                  details={"error": str(e)}, ip=ip)
 
     # --- Step 5: Success Audit ---
+    if changed or to_remove or target_group not in existing:
+        log_event("UserRoleUpdated", actor=actor, target={"id": user_id},
+                  details={"oldRole": old_role, "newRole": new_role,
+                           "groupsRemoved": to_remove,
+                           "groupAdded": target_group if target_group not in existing else None},
+                  ip=ip)
+
+    return 200, {
+        "message": f"User {user_id} ({cognito_username}) successfully changed to {new_role}",
+        "oldRole": old_role,
+        "newRole": new_role,
+        "changed": changed,
+        "autoCleanupTriggered": cleanup,
+    }
+
+
+# ───────────────────────────────────────────
+# Bulk role changes: PATCH /api/users/roles
+# ───────────────────────────────────────────
+def _bulk_update(event, ctx):
+    try:
+        body = json.loads(event.get("body") or "{}")
+        changes = body["changes"]
+        if not isinstance(changes, list):
+            raise ValueError("changes must be a list of {userId, role}")
+        # Last entry wins for a user listed twice
+        wanted = {}
+        for change in changes:
+            wanted[str(change["userId"])] = change["role"]
+    except Exception as e:
+        return response(400, {"error": f"Invalid request body: {str(e)}"})
+
+    if not wanted:
+        return response(400, {"error": "changes must not be empty"})
+    if len(wanted) > MAX_BULK_ROLE_CHANGES:
+        return response(400, {"error": f"At most {MAX_BULK_ROLE_CHANGES} users per request"})
+
+    invalid = {uid: role for uid, role in wanted.items() if role not in ROLE_GROUPS}
+    try:
+        items = batch_get_items(
+            "USERS_TABLE",
+            [{"userId": uid} for uid in wanted if uid not in invalid],
+            projection="userId, email, cognitoUsername, #r",
+            names={"#r": "role"},
+        )
+    except Exception as e:
+        log.error("❌ ERROR loading users: %s", e)
+        return response(500, {"error": "Failed to load users", "details": str(e)})
+    by_id = {item["userId"]: item for item in items}
+
+    def apply(user_id):
+        if user_id in invalid:
+            return 400, {"error": f"Invalid role: {invalid[user_id]}"}
+        if user_id not in by_id:
+            return 404, {"error": f"User {user_id} not found in DynamoDB"}
+        try:
+            return change_role(ctx, user_id, wanted[user_id], item=by_id[user_id])
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    user_ids = list(wanted)
+    with ThreadPoolExecutor(max_workers=max(1, min(ROLE_UPDATE_CONCURRENCY, len(user_ids)))) as pool:
+        outcomes = list(pool.map(apply, user_ids))
+
+    results = []
+    for user_id, (status, result) in zip(user_ids, outcomes):
+        entry = {"userId": user_id, "status": status}
+        if status == 200:
+            entry.update({k: result[k] for k in ("oldRole", "newRole", "changed", "autoCleanupTriggered")})
+        else:
+            entry["error"] = result.get("error")
+        results.append(entry)
+
+    succeeded = sum(1 for r in results if r["status"] == 200)
     log_event(
-        "UserRoleUpdated",
-        actor={"id": actor_id, "email": actor_email},
-        target={"id": user_id},
-        details={"oldRole": old_role, "newRole": new_role},
-        ip=ip
+        "BulkRoleUpdate",
+        actor={"id": ctx.user_id, "email": ctx.email or "unknown"},
+        status="SUCCESS" if succeeded == len(results) else "PARTIAL",
+        details={
+            "requested": len(results),
+            "changed": sum(1 for r in results if r.get("changed")),
+            "failed": [r["userId"] for r in results if r["status"] != 200],
+        },
+        ip=ctx.ip,
     )
 
-    return response(200, {
-        "message": f"User {user_id} ({cognito_username}) successfully changed to {new_role}",
-        "autoCleanupTriggered": new_role.lower() == "viewer"
-    })
+    return response(200, {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded})
 
 
 # ✅ Helper for clean responses
 def response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "PATCH,OPTIONS"
-        },
-        "body": json.dumps(body)
-    }
+    return _http_response(status, body, methods="PATCH,OPTIONS")
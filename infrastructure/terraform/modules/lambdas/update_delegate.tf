@@ -10,15 +10,41 @@ resource "aws_lambda_function" "update_delegate" {
 
   filename         = "${path.module}/update_delegate.zip"
   source_code_hash = filebase64sha256("${path.module}/update_delegate/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
+
+  # Demoted-editor cleanup pages through delegatedEditor-index and re-invokes
+  # itself when it gets within CLEANUP_TIME_MARGIN_MS of the timeout
+  timeout          = 300
+  memory_size      = 256
 
   environment {
-    variables = {
-      USERS_TABLE         = var.users_table_name
-      GENERAL_AUDIT_TABLE = var.general_audit_table_name
-    }
+    variables = merge(local.logging_env, {
+      USERS_TABLE            = var.users_table_name
+      GENERAL_AUDIT_TABLE    = var.general_audit_table_name
+      CLEANUP_PAGE_SIZE      = "200"
+      CLEANUP_CONCURRENCY    = "8"
+      CLEANUP_TIME_MARGIN_MS = "20000"
+      MAX_BULK_DELEGATIONS   = "500"
+    })
   }
 }
 
+# update-role starts the cleanup and the cleanup continues itself, both
+# with asynchronous invocations of this function
+resource "aws_iam_role_policy" "admin_invoke_update_delegate" {
+  name = "filevault-admin-invoke-update-delegate"
+  role = aws_iam_role.admin_lambdas_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Effect   = "Allow",
+      Action   = ["lambda:InvokeFunction"],
+      Resource = aws_lambda_function.update_delegate.arn
+    }]
+  })
+}
+
 # Attach shared audit logging policy
 resource "aws_iam_role_policy_attachment" "audit_logging_admin_update_delegate" {
   role       = aws_iam_role.admin_lambdas_role.name
@@ -1,44 +1,39 @@
 import os
 import json
-import boto3
-import uuid
-from boto3.dynamodb.conditions import Key
-from datetime import datetime, timedelta
-
-# Initialize AWS resources
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["USERS_TABLE"])
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
-audit_table = dynamodb.Table(GENERAL_AUDIT_TABLE)
-
-# --- Helper: Audit Logger ---
-def log_event(event_type, actor, target=None, status="SUCCESS", details=None, ip=None):
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "targetUserId": target.get("id") if target else None,
-        "status": status,
-        "details": details or {},
-        "ipAddress": ip,
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-    print("AUDIT_LOG:", json.dumps(record))
-    try:
-        audit_table.put_item(Item=record)
-    except Exception as e:
-        print(f"⚠️ Failed to log audit event: {e}")
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from filevault_common import RequestContext, aws, delegation, flush_after, instrumented, log, log_event
+from filevault_common import response as _http_response
+from filevault_common.batch import MAX_ATTEMPTS, RETRYABLE_CANCELLATIONS, TRANSACT_CHUNK, backoff
+from filevault_common.batch import batch_get_items, transact_write
+
+# Demoted-editor cleanup (Case 3), requested by update-role with this action
+CLEANUP_ACTION = "cleanupEditor"
+CLEANUP_PAGE_SIZE = int(os.getenv("CLEANUP_PAGE_SIZE", "200"))
+CLEANUP_CONCURRENCY = int(os.getenv("CLEANUP_CONCURRENCY", "8"))
+# Stop starting new pages this close to the Lambda timeout
+CLEANUP_TIME_MARGIN_MS = int(os.getenv("CLEANUP_TIME_MARGIN_MS", "20000"))
+API_TIME_BUDGET_MS = 20000
+# Viewer ids listed in the completion audit record
+AUDIT_SAMPLE_SIZE = 100
+CHECKPOINT_ATTRIBUTE = "delegationCleanup"
+
+# Bulk assignment (PATCH /api/users/{id}/delegates)
+MAX_BULK_DELEGATIONS = int(os.getenv("MAX_BULK_DELEGATIONS", "500"))
 
+@instrumented
+@flush_after
 def lambda_handler(event, context):
-    print("DEBUG event:", json.dumps(event))
+    log.debug_event(event)
 
     # Identify actor (admin or system)
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    actor_id = claims.get("sub", "system")
-    actor_email = claims.get("email", "system@internal")
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+    ctx = RequestContext.from_event(event)
+    actor_id = ctx.user_id or "system"
+    actor_email = ctx.email or "system@internal"
+    ip = ctx.ip
+    table = aws.table("USERS_TABLE")
 
     # Extract path parameters
     path_params = event.get("pathParameters") or {}
@@ -53,24 +48,48 @@ def lambda_handler(event, context):
     has_editor_id_key = "editorId" in body or "delegatedEditor" in body
     delegated_editor_id = body.get("delegatedEditor") or body.get("editorId")
 
+    # Requests through API Gateway must come from an Admin; update-role
+    # invokes this function directly, without a requestContext
+    if "requestContext" in event and not ctx.is_admin:
+        log_event(
+            "UnauthorizedDelegationUpdateAttempt",
+            actor={"id": actor_id, "email": actor_email},
+            target={"id": viewer_id},
+            status="DENIED",
+            ip=ip
+        )
+        return response(403, {"error": "Forbidden – Admins only"})
+
     if not viewer_id:
         return response(400, {"error": "Missing userId in path parameters"})
 
+    if event.get("routeKey") == "PATCH /api/users/{id}/delegates":
+        return bulk_assign(viewer_id, body, {"id": actor_id, "email": actor_email}, ip)
+
     # ============================================================
     # 🧩 Case 1: Assign or reassign a Viewer to an Editor
     # ============================================================
     if delegated_editor_id:
-        print(f"Assigning Viewer {viewer_id} → Editor {delegated_editor_id}")
+        log.info("Assigning Viewer %s → Editor %s", viewer_id, delegated_editor_id)
         try:
+            updated = {
+                "delegatedEditor": delegated_editor_id,
+                "updatedAt": datetime.utcnow().isoformat()
+            }
             result = table.update_item(
                 Key={"userId": viewer_id},
                 UpdateExpression="SET delegatedEditor = :e, updatedAt = :t",
                 ExpressionAttributeValues={
-                    ":e": delegated_editor_id,
-                    ":t": datetime.utcnow().isoformat()
+                    ":e": updated["delegatedEditor"],
+                    ":t": updated["updatedAt"]
                 },
-                ReturnValues="UPDATED_NEW"
+                ReturnValues="UPDATED_OLD"
             )
+            # Both the new and any previous editor must drop cached delegations
+            previous_editor = result.get("Attributes", {}).get("delegatedEditor")
+            delegation.bump_version(delegated_editor_id)
+            if previous_editor and previous_editor != delegated_editor_id:
+                delegation.bump_version(previous_editor)
             log_event(
                 "DelegationAssigned",
                 actor={"id": actor_id, "email": actor_email},
@@ -78,13 +97,13 @@ def lambda_handler(event, context):
                 details={"assignedEditor": delegated_editor_id},
                 ip=ip
             )
-            print(f"✅ Viewer {viewer_id} assigned to Editor {delegated_editor_id}")
+            log.info("✅ Viewer %s assigned to Editor %s", viewer_id, delegated_editor_id)
             return response(200, {
                 "message": f"Viewer {viewer_id} assigned to Editor {delegated_editor_id}",
-                "updated": result.get("Attributes", {})
+                "updated": updated
             })
         except Exception as e:
-            print(f"❌ Error updating delegate: {e}")
+            log.error("❌ Error updating delegate: %s", e)
             log_event(
                 "DelegationUpdateFailed",
                 actor={"id": actor_id, "email": actor_email},
@@ -97,10 +116,10 @@ def lambda_handler(event, context):
 
     # ============================================================
     # 🧩 Case 2: Remove delegation from a specific Viewer
-    # (when editorId/delegatedEditor is explicitly None/undefined)
+    # (when editorId/delegatedEditor is explicitly None/null)
     # ============================================================
     elif has_editor_id_key:
-        print(f"Removing delegation from Viewer {viewer_id}")
+        log.info("Removing delegation from Viewer %s", viewer_id)
         try:
             # First check if the user exists and has a delegation
             user_item = table.get_item(Key={"userId": viewer_id}).get("Item")
@@ -118,6 +137,7 @@ def lambda_handler(event, context):
                 },
                 ReturnValues="UPDATED_NEW"
             )
+            delegation.bump_version(previous_editor)
             log_event(
                 "DelegationRemoved",
                 actor={"id": actor_id, "email": actor_email},
@@ -125,13 +145,13 @@ def lambda_handler(event, context):
                 details={"previousEditor": previous_editor},
                 ip=ip
             )
-            print(f"✅ Removed delegation from Viewer {viewer_id}")
+            log.info("✅ Removed delegation from Viewer %s", viewer_id)
             return response(200, {
                 "message": f"Delegation removed from viewer {viewer_id}",
                 "updated": result.get("Attributes", {})
             })
         except Exception as e:
-            print(f"❌ Error removing delegation: {e}")
+            log.error("❌ Error removing delegation: %s", e)
             log_event(
                 "DelegationUpdateFailed",
                 actor={"id": actor_id, "email": actor_email},
@@ -144,64 +164,342 @@ def lambda_handler(event, context):
 
     # ============================================================
     # 🧩 Case 3: Remove all Viewers linked to a demoted Editor
-    # (when called from update-role Lambda without editorId key)
+    # (when update-role, or a continuation, sends {"action": "cleanupEditor"})
     # ============================================================
+    elif body.get("action") == CLEANUP_ACTION:
+        return cleanup_editor(event, context, viewer_id, {"id": actor_id, "email": actor_email}, ip)
+
+    return response(400, {"error": f"Provide delegatedEditor, or action \"{CLEANUP_ACTION}\""})
+
+
+# ───────────────────────────────────────────
+# Bulk assignment: PATCH /api/users/{id}/delegates
+# ───────────────────────────────────────────
+def bulk_assign(editor_id, body, actor, ip):
+    """
+    Assign (or reassign) many viewers to editor_id.
+
+    Viewers are loaded with one batch_get_item pass and written in
+    TransactWriteItems chunks. Each write is conditional on the viewer's
+    delegatedEditor still being what was read, so a viewer changed or
+    deleted meanwhile comes back as 409 rather than being overwritten; the
+    rest of its chunk is retried without it. Actions cancelled only by a
+    conflict or throttling are retried with backoff, not failed.
+    """
+    viewer_ids = body.get("viewerIds")
+    if not isinstance(viewer_ids, list) or not viewer_ids:
+        return response(400, {"error": "viewerIds must be a non-empty list"})
+    viewer_ids = list(dict.fromkeys(str(v) for v in viewer_ids))
+    if len(viewer_ids) > MAX_BULK_DELEGATIONS:
+        return response(400, {"error": f"At most {MAX_BULK_DELEGATIONS} viewers per request"})
+
+    try:
+        items = batch_get_items(
+            "USERS_TABLE",
+            [{"userId": uid} for uid in [editor_id] + viewer_ids],
+            projection="userId, #r, delegatedEditor",
+            names={"#r": "role"},
+        )
+    except Exception as e:
+        log.error("❌ ERROR loading users: %s", e)
+        return response(500, {"error": "Failed to load users", "details": str(e)})
+    by_id = {item["userId"]: item for item in items}
+
+    editor = by_id.get(editor_id)
+    if not editor:
+        return response(404, {"error": f"Editor {editor_id} not found"})
+    if editor.get("role") != "Editor":
+        return response(400, {"error": f"User {editor_id} is not an Editor"})
+
+    results = {}
+    to_write = []
+    for viewer_id in viewer_ids:
+        viewer = by_id.get(viewer_id)
+        if viewer_id == editor_id:
+            results[viewer_id] = {"status": 400, "error": "An editor cannot be delegated to themselves"}
+        elif not viewer:
+            results[viewer_id] = {"status": 404, "error": f"User {viewer_id} not found"}
+        elif viewer.get("delegatedEditor") == editor_id:
+            results[viewer_id] = {"status": 200, "changed": False}
+        else:
+            to_write.append((viewer_id, viewer.get("delegatedEditor")))
+
+    now = datetime.utcnow().isoformat()
+    for start in range(0, len(to_write), TRANSACT_CHUNK):
+        pending = to_write[start:start + TRANSACT_CHUNK]
+        attempt = 0
+        while pending:
+            try:
+                codes = transact_write([_assign_action(v, prev, editor_id, now) for v, prev in pending])
+            except Exception as e:
+                log.error("❌ ERROR writing delegations: %s", e)
+                for viewer_id, _ in pending:
+                    results[viewer_id] = {"status": 500, "error": str(e)}
+                break
+            if codes is None:
+                for viewer_id, previous in pending:
+                    results[viewer_id] = {"status": 200, "changed": True, "previousEditor": previous}
+                break
+            retry, contended = [], False
+            for (viewer_id, previous), code in zip(pending, codes):
+                if code == "None" or code in RETRYABLE_CANCELLATIONS:
+                    retry.append((viewer_id, previous))
+                    contended = contended or code != "None"
+                elif code == "ConditionalCheckFailed":
+                    results[viewer_id] = {"status": 409, "error": "Viewer was changed or deleted during the request"}
+                else:
+                    results[viewer_id] = {"status": 500, "error": code}
+            if contended:
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS:
+                    for viewer_id, _ in retry:
+                        results[viewer_id] = {"status": 500, "error": f"Still conflicting after {MAX_ATTEMPTS} attempts"}
+                    break
+                backoff(attempt)
+            pending = retry
+
+    assigned = [v for v in viewer_ids if results[v].get("changed")]
+    previous_editors = {results[v]["previousEditor"] for v in assigned} - {None}
+    if assigned:
+        delegation.bump_version(editor_id)
+        for previous in previous_editors:
+            delegation.bump_version(previous)
+
+    failed = [v for v in viewer_ids if results[v]["status"] != 200]
+    log_event(
+        "DelegationBulkAssigned",
+        actor=actor,
+        target={"id": editor_id},
+        status="SUCCESS" if not failed else "PARTIAL",
+        details={
+            "assignedEditor": editor_id,
+            "assigned": assigned,
+            "reassignedFrom": {v: results[v]["previousEditor"] for v in assigned if results[v]["previousEditor"]},
+            "failed": failed,
+        },
+        ip=ip
+    )
+
+    return response(200, {
+        "results": [{"viewerId": v, **results[v]} for v in viewer_ids],
+        "assigned": len(assigned),
+        "failed": len(failed),
+    })
+
+
+def _assign_action(viewer_id, previous_editor, editor_id, now):
+    if previous_editor:
+        condition = "delegatedEditor = :prev"
+        values = {":e": editor_id, ":t": now, ":prev": previous_editor}
     else:
-        print(f"Removing all Viewers assigned to demoted Editor {viewer_id}")
+        condition = "attribute_exists(userId) AND attribute_not_exists(delegatedEditor)"
+        values = {":e": editor_id, ":t": now}
+    return {"Update": {
+        "TableName": "USERS_TABLE",
+        "Key": {"userId": viewer_id},
+        "UpdateExpression": "SET delegatedEditor = :e, updatedAt = :t",
+        "ConditionExpression": condition,
+        "ExpressionAttributeValues": values,
+    }}
+
+
+# ───────────────────────────────────────────
+# Case 3: paged, checkpointed cleanup
+# ───────────────────────────────────────────
+def cleanup_editor(event, context, editor_id, actor, ip):
+    """
+    Unlink every viewer delegated to editor_id, one delegatedEditor-index
+    page at a time.
+
+    After each page the editor's item records a checkpoint (the page's
+    LastEvaluatedKey and running totals), so a retried or continued
+    invocation resumes after the last finished page instead of starting
+    over. Each unlink is conditional on the viewer still pointing at this
+    editor, which makes replaying a page harmless and leaves viewers that
+    were reassigned meanwhile alone. When the time budget runs out the
+    function re-invokes itself asynchronously to carry on.
+    """
+    from_api = "requestContext" in event
+    table = aws.table("USERS_TABLE")
+    checkpoint = _load_checkpoint(table, editor_id)
+    persisted = checkpoint is not None
+
+    if checkpoint is None:
+        log.info("Removing all Viewers assigned to demoted Editor %s", editor_id)
+        checkpoint = {"startedAt": datetime.utcnow().isoformat(), "unlinked": 0, "skipped": 0,
+                      "viewerIds": [], "actorId": actor["id"], "actorEmail": actor["email"]}
         log_event(
             "DelegationCleanupStarted",
-            actor={"id": actor_id, "email": actor_email},
-            target={"id": viewer_id},
+            actor=actor,
+            target={"id": editor_id},
             details={"reason": "Editor demoted to Viewer"},
             ip=ip
         )
+    else:
+        log.info("Resuming cleanup for Editor %s: %s viewer(s) already unlinked", editor_id, checkpoint["unlinked"])
+        checkpoint["resumed"] = True
+        # Continuations run as "system"; keep crediting whoever started it
+        actor = {"id": checkpoint.get("actorId"), "email": checkpoint.get("actorEmail")}
+
+    # API Gateway stops waiting after 30 s, async invocations get the full timeout
+    budget_ms = context.get_remaining_time_in_millis() - CLEANUP_TIME_MARGIN_MS if context else 0
+    if from_api:
+        budget_ms = min(budget_ms, API_TIME_BUDGET_MS)
+    deadline = time.monotonic() + budget_ms / 1000
+
+    try:
+        while True:
+            kwargs = {
+                "IndexName": "delegatedEditor-index",
+                "KeyConditionExpression": aws.key("delegatedEditor").eq(editor_id),
+                "ProjectionExpression": "userId",
+                "Limit": CLEANUP_PAGE_SIZE,
+            }
+            if checkpoint.get("lastKey"):
+                kwargs["ExclusiveStartKey"] = checkpoint["lastKey"]
+            page = table.query(**kwargs)
+            viewer_ids = [v["userId"] for v in page.get("Items", []) if v.get("userId")]
+
+            unlinked, skipped, failed = _unlink_viewers(editor_id, viewer_ids)
+            checkpoint["unlinked"] += len(unlinked)
+            checkpoint["skipped"] += len(skipped)
+            room = AUDIT_SAMPLE_SIZE - len(checkpoint["viewerIds"])
+            checkpoint["viewerIds"] += unlinked[:max(0, room)]
+            if failed:
+                # Keep lastKey where it was so the retry replays this page
+                _save_checkpoint(table, editor_id, checkpoint)
+                persisted = True
+                raise RuntimeError(f"{len(failed)} viewer(s) could not be unlinked: {failed[:10]}")
+
+            checkpoint["lastKey"] = page.get("LastEvaluatedKey")
+            log.debug("Unlinked %s viewer(s), skipped %s in this page", len(unlinked), len(skipped))
+            if not checkpoint["lastKey"]:
+                if not checkpoint.pop("resumed", False):
+                    break
+                # A resumed run skipped the pages before its checkpoint;
+                # sweep once more from the start for viewers linked since
+                continue
+            _save_checkpoint(table, editor_id, checkpoint)
+            persisted = True
+            if time.monotonic() >= deadline and context:
+                return _continue_later(event, context, editor_id, checkpoint)
+    except Exception as e:
+        log.error("❌ Error cleaning up viewers: %s", e)
+        log_event(
+            "DelegationUpdateFailed",
+            actor=actor,
+            target={"id": editor_id},
+            status="FAILED",
+            details={"error": str(e), "operation": "cleanup", "unlinkedSoFar": checkpoint["unlinked"]},
+            ip=ip
+        )
+        if not from_api:
+            raise  # async invocation: Lambda retries and resumes from the checkpoint
+        return response(500, {"error": "Failed to unlink viewers", "details": str(e)})
 
+    if persisted:
+        _clear_checkpoint(table, editor_id)
+    delegation.bump_version(editor_id)
+    log_event(
+        "DelegationCleanupCompleted",
+        actor=actor,
+        target={"id": editor_id},
+        details={
+            "unlinked": checkpoint["unlinked"],
+            "skipped": checkpoint["skipped"],
+            "startedAt": checkpoint["startedAt"],
+            "viewerIds": checkpoint["viewerIds"],
+            "viewerIdsTruncated": checkpoint["unlinked"] > len(checkpoint["viewerIds"]),
+        },
+        ip=ip
+    )
+    log.info("✅ Unlinked %s viewer(s) from Editor %s", checkpoint["unlinked"], editor_id)
+    return response(200, {
+        "message": f"Unlinked {checkpoint['unlinked']} viewer(s) from demoted editor {editor_id}",
+        "unlinked": checkpoint["unlinked"],
+        "skipped": checkpoint["skipped"],
+    })
+
+
+def _unlink_viewers(editor_id, viewer_ids):
+    """Clear delegatedEditor on viewer_ids in parallel; returns (unlinked, skipped, failed) id lists."""
+    now = datetime.utcnow().isoformat()
+
+    def unlink(viewer_id):
+        table = aws.shared_table("USERS_TABLE")
         try:
-            resp = table.query(
-                IndexName="delegatedEditor-index",
-                KeyConditionExpression=Key("delegatedEditor").eq(viewer_id)
+            table.update_item(
+                Key={"userId": viewer_id},
+                UpdateExpression="REMOVE delegatedEditor SET updatedAt = :t",
+                ConditionExpression="delegatedEditor = :e",
+                ExpressionAttributeValues={":e": editor_id, ":t": now}
             )
-            viewers = resp.get("Items", [])
-            print(f"DEBUG Found {len(viewers)} viewers to unlink.")
-
-            for v in viewers:
-                table.update_item(
-                    Key={"userId": v["userId"]},
-                    UpdateExpression="REMOVE delegatedEditor"
-                )
-                print(f"✅ Unlinked Viewer {v['userId']} from Editor {viewer_id}")
-                log_event(
-                    "DelegationUnlinked",
-                    actor={"id": actor_id, "email": actor_email},
-                    target={"id": v["userId"]},
-                    details={"previousEditor": viewer_id},
-                    ip=ip
-                )
-
-            return response(200, {
-                "message": f"Unlinked {len(viewers)} viewer(s) from demoted editor {viewer_id}"
-            })
+            return "unlinked"
+        except table.client.exceptions.ConditionalCheckFailedException:
+            return "skipped"  # already unlinked or reassigned
         except Exception as e:
-            print(f"❌ Error cleaning up viewers: {e}")
-            log_event(
-                "DelegationUpdateFailed",
-                actor={"id": actor_id, "email": actor_email},
-                target={"id": viewer_id},
-                status="FAILED",
-                details={"error": str(e), "operation": "cleanup"},
-                ip=ip
-            )
-            return response(500, {"error": "Failed to unlink viewers", "details": str(e)})
+            log.warning("⚠️ Failed to unlink Viewer %s: %s", viewer_id, e)
+            return "failed"
+
+    outcomes = {"unlinked": [], "skipped": [], "failed": []}
+    if viewer_ids:
+        with ThreadPoolExecutor(max_workers=min(CLEANUP_CONCURRENCY, len(viewer_ids))) as pool:
+            for viewer_id, outcome in zip(viewer_ids, pool.map(unlink, viewer_ids)):
+                outcomes[outcome].append(viewer_id)
+    return outcomes["unlinked"], outcomes["skipped"], outcomes["failed"]
+
+
+def _load_checkpoint(table, editor_id):
+    item = table.get_item(
+        Key={"userId": editor_id},
+        ProjectionExpression=CHECKPOINT_ATTRIBUTE,
+        ConsistentRead=True,
+    ).get("Item") or {}
+    checkpoint = item.get(CHECKPOINT_ATTRIBUTE)
+    if checkpoint:
+        checkpoint["unlinked"] = int(checkpoint.get("unlinked", 0))
+        checkpoint["skipped"] = int(checkpoint.get("skipped", 0))
+        checkpoint["viewerIds"] = list(checkpoint.get("viewerIds") or [])
+    return checkpoint
+
+
+def _save_checkpoint(table, editor_id, checkpoint):
+    table.update_item(
+        Key={"userId": editor_id},
+        UpdateExpression="SET #c = :c",
+        ConditionExpression="attribute_exists(userId)",
+        ExpressionAttributeNames={"#c": CHECKPOINT_ATTRIBUTE},
+        ExpressionAttributeValues={
+            ":c": {k: v for k, v in checkpoint.items() if v is not None},
+        },
+    )
+
+
+def _clear_checkpoint(table, editor_id):
+    table.update_item(
+        Key={"userId": editor_id},
+        UpdateExpression="REMOVE #c",
+        ExpressionAttributeNames={"#c": CHECKPOINT_ATTRIBUTE},
+    )
+
+
+def _continue_later(event, context, editor_id, checkpoint):
+    """Hand the rest of the cleanup to a fresh asynchronous invocation."""
+    aws.client("lambda").invoke(
+        FunctionName=context.function_name,
+        InvocationType="Event",
+        Payload=json.dumps({
+            "pathParameters": {"id": editor_id},
+            "body": json.dumps({"action": CLEANUP_ACTION}),
+        }),
+    )
+    log.info("⏳ Cleanup for Editor %s continues asynchronously after %s viewer(s)", editor_id, checkpoint["unlinked"])
+    return response(202, {
+        "message": f"Unlinked {checkpoint['unlinked']} viewer(s) so far; cleanup continues in the background",
+        "unlinked": checkpoint["unlinked"],
+    })
 
 
 # ✅ Helper for consistent CORS & responses
 def response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "PATCH,OPTIONS",
-        },
-        "body": json.dumps(body)
-    }
+    return _http_response(status, body, methods="PATCH,OPTIONS")
@@ -10,14 +10,28 @@ resource "aws_lambda_function" "update_role" {
 
   filename         = "${path.module}/update_role.zip"
   source_code_hash = filebase64sha256("${path.module}/update-role/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
+
+  # API Gateway gives up after 30 s; MAX_BULK_ROLE_CHANGES is sized to fit
+  timeout          = 30
+  memory_size      = 256
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, {
       USERS_TABLE            = var.users_table_name
       USER_POOL_ID           = var.user_pool_id
       UPDATE_DELEGATE_LAMBDA = aws_lambda_function.update_delegate.function_name
       GENERAL_AUDIT_TABLE    = var.general_audit_table_name
-    }
+
+      # Bulk PATCH /api/users/roles: ~3 Cognito calls per changed user at
+      # COGNITO_RPS must finish inside the API Gateway timeout
+      MAX_BULK_ROLE_CHANGES   = "75"
+      ROLE_UPDATE_CONCURRENCY = "4"
+      COGNITO_RPS             = "10"
+      # botocore backs off client-side when Cognito starts throttling
+      AWS_RETRY_MODE          = "adaptive"
+      AWS_MAX_ATTEMPTS        = "6"
+    })
   }
 }
 
@@ -41,7 +41,9 @@ resource "aws_iam_role_policy" "upload_policy" {
         Action = [
           "s3:PutObject",
           "s3:GetObject",
-          "s3:PutObjectAcl"
+          "s3:PutObjectAcl",
+          "s3:AbortMultipartUpload",
+          "s3:ListMultipartUploadParts"
         ],
         Resource = "arn:aws:s3:::${var.bucket_name}/*"
       },
@@ -52,11 +54,24 @@ resource "aws_iam_role_policy" "upload_policy" {
         Action = [
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
-          "dynamodb:GetItem"
+          "dynamodb:GetItem",
+          "dynamodb:DeleteItem",
+          "dynamodb:BatchWriteItem"
         ],
         Resource = "arn:aws:dynamodb:${var.region}:${var.account_id}:table/FileVaultFiles"
       },
 
+      # DynamoDB Access - Blob Index (deduplication refcounts)
+      {
+        Effect = "Allow",
+        Action = [
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem"
+        ],
+        Resource = var.blobs_table_arn
+      },
+
       # DynamoDB Access - Users Table (Delegation Lookups)
       {
         Effect = "Allow",
@@ -104,15 +119,22 @@ resource "aws_lambda_function" "upload" {
 
   filename         = "${path.module}/upload.zip"
   source_code_hash = filebase64sha256("${path.module}/upload/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
+    variables = merge(local.logging_env, local.sync_env, {
       FILES_BUCKET        = var.bucket_name
       KMS_KEY_ID          = var.kms_key_id
       FILES_TABLE         = var.files_table_name
       USERS_TABLE         = var.users_table_name
       GENERAL_AUDIT_TABLE = var.general_audit_table_name
-    }
+      BLOBS_TABLE         = var.blobs_table_name
+      DEDUP_SCOPE         = var.dedup_scope
+
+      # Multipart uploads
+      MULTIPART_PART_SIZE     = 16777216
+      MULTIPART_PRESIGN_BATCH = 100
+    })
   }
 }
 
@@ -127,6 +149,16 @@ resource "aws_lambda_permission" "allow_apigw_upload" {
   source_arn    = "${var.api_execution_arn}/*/*/api/files/upload-url"
 }
 
+resource "aws_lambda_permission" "allow_apigw_upload_multipart" {
+  for_each = toset(["upload-parts", "complete", "abort"])
+
+  statement_id  = "AllowAPIGatewayInvokeUpload-${each.key}"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.upload.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${var.api_execution_arn}/*/*/api/files/*/${each.key}"
+}
+
 # ───────────────────────────────────────────
 # Output (ARN for API Gateway Integration)
 # ───────────────────────────────────────────
@@ -1,78 +1,78 @@
 import os
+import re
 import json
-import boto3
+import math
 import uuid
-from datetime import datetime, timedelta
-from boto3.dynamodb.conditions import Key
-from botocore.client import Config
+import base64
+from datetime import datetime
 
-# --- AWS clients ---
-s3 = boto3.client("s3", config=Config(signature_version="s3v4"))
-dynamodb = boto3.resource("dynamodb")
+from filevault_common import RequestContext, aws, blobs, catalog, delegation, flush_after, instrumented, log, log_event
+from filevault_common import response as _http_response
 
 # --- Environment variables ---
 BUCKET_NAME = os.getenv("FILES_BUCKET", "filevault-files")
 KMS_KEY_ID = os.getenv("KMS_KEY_ID")
-FILES_TABLE = os.getenv("FILES_TABLE")
-USERS_TABLE = os.getenv("USERS_TABLE")
-GENERAL_AUDIT_TABLE = os.getenv("GENERAL_AUDIT_TABLE")
 
-files_table = dynamodb.Table(FILES_TABLE)
-users_table = dynamodb.Table(USERS_TABLE)
+URL_EXPIRY_SECONDS = 3600
 
-# --- Audit Logger ---
-def log_event(event_type, actor, target=None, file_id=None, status="SUCCESS", details=None, ip=None):
-    table = dynamodb.Table(GENERAL_AUDIT_TABLE)
-    record = {
-        "auditId": str(uuid.uuid4()),
-        "eventType": event_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "actorUserId": actor.get("id"),
-        "actorEmail": actor.get("email"),
-        "targetUserId": target.get("id") if target else None,
-        "fileId": file_id,
-        "status": status,
-        "ipAddress": ip,
-        "details": details or {},
-        "ttl": int((datetime.utcnow() + timedelta(days=90)).timestamp())
-    }
-    print("AUDIT_LOG:", json.dumps(record))
-    table.put_item(Item=record)
+# Object metadata the finalize_upload Lambda uses to find the file record
+# and, for deduplicated content, the blob whose hash it must verify
+FILE_ID_METADATA = "file-id"
+BLOB_ID_METADATA = "blob-id"
 
+# --- Multipart settings ---
+# S3 allows 10,000 parts of 5 MiB..5 GiB each (the last part may be smaller).
+PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("MULTIPART_PART_SIZE", str(16 * 1024 * 1024))))
+MAX_PARTS = 10000
+MAX_OBJECT_SIZE = 5 * 1024 ** 4
+PRESIGN_BATCH = int(os.getenv("MULTIPART_PRESIGN_BATCH", "100"))
 
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+@instrumented
+@flush_after
 def handler(event, context):
-    print("DEBUG event:", json.dumps(event))
-    ip = event.get("requestContext", {}).get("identity", {}).get("sourceIp", "unknown")
+    log.debug_event(event)
 
     # --- Parse user identity from token ---
-    claims = event.get("requestContext", {}).get("authorizer", {}).get("jwt", {}).get("claims", {})
-    user_id = claims.get("sub")
-    user_email = claims.get("email")
-    groups_claim = claims.get("cognito:groups", [])
-
-    # Normalize Cognito groups
-    if isinstance(groups_claim, str):
-        groups = [
-            g.strip()
-            for g in groups_claim.strip("[]").replace('"', "").replace("'", "").split(",")
-            if g.strip()
-        ]
-    else:
-        groups = groups_claim or []
+    ctx = RequestContext.from_event(event)
+    ip = ctx.ip
+    user_id = ctx.user_id
+    user_email = ctx.email
+    groups = ctx.groups
 
-    user_role = groups[0] if groups else "Viewers"
-    print(f"DEBUG user_id={user_id}, email={user_email}, role={user_role}")
+    user_role = ctx.role or "Viewers"
+    log.debug("user_id=%s, email=%s, role=%s", user_id, user_email, user_role)
 
     if not user_id or not user_email:
         return response(403, {"error": "Invalid or missing user token"})
 
+    # --- Multipart follow-up calls ---
+    route_key = event.get("routeKey")
+    if route_key == "POST /api/files/{id}/upload-parts":
+        return _presign_parts(event, ctx)
+    if route_key == "POST /api/files/{id}/complete":
+        return _complete_multipart(event, ctx)
+    if route_key == "POST /api/files/{id}/abort":
+        return _abort_multipart(event, ctx)
+
     try:
         body = json.loads(event.get("body", "{}"))
         filename = body["filename"]
         content_type = body.get("contentType", "application/octet-stream")
         target_user_id = body.get("targetUserId")
+        multipart = bool(body.get("multipart"))
+        file_size = int(body["fileSize"]) if multipart else None
+        if multipart and not 0 < file_size <= MAX_OBJECT_SIZE:
+            raise ValueError("fileSize must be between 1 byte and 5 TiB")
+        sha256 = body.get("sha256")
+        if sha256 is not None:
+            sha256 = str(sha256).lower()
+            if not SHA256_PATTERN.match(sha256):
+                raise ValueError("sha256 must be a hex-encoded SHA-256 digest")
     except Exception as e:
-        print(f"ERROR parsing request body: {e}")
+        log.error("ERROR parsing request body: %s", e)
         return response(400, {"error": f"Invalid request body: {str(e)}"})
 
     upload_user_id = user_id
@@ -81,6 +81,7 @@ def handler(event, context):
     # --- Handle delegated upload (Admin/Editor uploading for someone else) ---
     try:
         if target_user_id and target_user_id != user_id:
+            users_table = aws.table("USERS_TABLE")
             resp = users_table.get_item(Key={"userId": target_user_id})
             target_user = resp.get("Item")
 
@@ -95,12 +96,7 @@ def handler(event, context):
                 upload_user_id = target_user_id
                 upload_user_email = target_email
             elif "Editors" in groups:
-                delegated = users_table.query(
-                    IndexName="delegatedEditor-index",
-                    KeyConditionExpression=Key("delegatedEditor").eq(user_id)
-                ).get("Items", [])
-                delegated_ids = [v.get("userId") for v in delegated if "userId" in v]
-                if target_user_id not in delegated_ids:
+                if not delegation.is_delegated(user_id, target_user_id):
                     log_event("UnauthorizedUploadAttempt",
                               {"id": user_id, "email": user_email},
                               target={"id": target_user_id}, status="DENIED",
@@ -112,11 +108,40 @@ def handler(event, context):
                 return response(403, {"error": "Only Admins or Editors can upload for others"})
 
     except Exception as e:
-        print(f"ERROR determining upload target: {e}")
+        log.error("ERROR determining upload target: %s", e)
         return response(500, {"error": "Failed to verify upload target", "details": str(e)})
 
     file_id = str(uuid.uuid4())
     s3_key = f"uploads/{upload_user_id}/{filename}"
+    now = datetime.utcnow().isoformat()
+    record = {
+        "fileId": file_id,
+        "ownerId": upload_user_id,
+        "ownerEmail": upload_user_email,
+        "fileName": filename,
+        "s3Key": s3_key,
+        "uploadedAt": now,
+        "updatedAt": now,
+        "status": "PENDING",
+        "uploadedBy": user_email,
+        "uploadedById": user_id,
+        "roleAtUpload": user_role,
+        **catalog.name_keys(filename),
+    }
+
+    # --- Content-addressed deduplication ---
+    if sha256:
+        try:
+            done = _deduplicate(ctx, record, sha256)
+        except Exception as e:
+            log.warning("⚠️ Dedup lookup failed, uploading normally: %s", e)
+            done = None
+        if done:
+            return done
+        s3_key = record["s3Key"]
+
+    if multipart:
+        return _initiate_multipart(ctx, record, content_type, file_size)
 
     # --- Generate S3 Presigned URL ---
     try:
@@ -125,51 +150,41 @@ def handler(event, context):
             "Key": s3_key,
             "ContentType": content_type,
             "ServerSideEncryption": "aws:kms",
+            "Metadata": {FILE_ID_METADATA: file_id},
         }
         if KMS_KEY_ID:
             params["SSEKMSKeyId"] = KMS_KEY_ID
 
         required_headers = {
             "x-amz-server-side-encryption": "aws:kms",
+            f"x-amz-meta-{FILE_ID_METADATA}": file_id,
         }
         if KMS_KEY_ID:
             required_headers["x-amz-server-side-encryption-aws-kms-key-id"] = KMS_KEY_ID
+        if record.get("blobId"):
+            # S3 rejects the PUT unless the body matches the claimed hash
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+            params["ChecksumSHA256"] = checksum
+            params["Metadata"][BLOB_ID_METADATA] = record["blobId"]
+            required_headers["x-amz-checksum-sha256"] = checksum
+            required_headers[f"x-amz-meta-{BLOB_ID_METADATA}"] = record["blobId"]
 
-        presigned_url = s3.generate_presigned_url(
+        presigned_url = aws.client("s3").generate_presigned_url(
             "put_object",
             Params=params,
-            ExpiresIn=3600,
+            ExpiresIn=URL_EXPIRY_SECONDS,
             HttpMethod="PUT"
         )
     except Exception as e:
-        print(f"ERROR generating presigned URL: {e}")
+        log.error("ERROR generating presigned URL: %s", e)
+        _release_claim(record)
         return response(500, {"error": "Failed to generate upload URL", "details": str(e)})
 
     # --- Record upload metadata ---
-    try:
-        files_table.put_item(Item={
-            "fileId": file_id,
-            "ownerId": upload_user_id,
-            "ownerEmail": upload_user_email,
-            "fileName": filename,
-            "s3Key": s3_key,
-            "uploadedAt": datetime.utcnow().isoformat(),
-            "status": "PENDING",
-            "uploadedBy": user_email,
-            "roleAtUpload": user_role,
-        })
-        log_event("FileUploadInitiated",
-                  {"id": user_id, "email": user_email},
-                  target={"id": upload_user_id},
-                  file_id=file_id, ip=ip)
-    except Exception as e:
-        print(f"ERROR writing file metadata: {e}")
-        log_event("FileUploadFailed",
-                  {"id": user_id, "email": user_email},
-                  target={"id": upload_user_id},
-                  file_id=file_id, status="FAILED",
-                  details={"error": str(e)}, ip=ip)
-        return response(500, {"error": "Failed to write metadata", "details": str(e)})
+    error = _record_upload(ctx, record)
+    if error:
+        _release_claim(record)
+        return error
 
     # ✅ Return presigned URL + headers
     return response(200, {
@@ -181,14 +196,281 @@ def handler(event, context):
     })
 
 
+def _record_upload(ctx, record, details=None):
+    """Write the PENDING FileVaultFiles item; returns an error response on failure."""
+    actor = {"id": ctx.user_id, "email": ctx.email}
+    try:
+        aws.table("FILES_TABLE").put_item(Item=record)
+        log_event("FileUploadInitiated", actor,
+                  target={"id": record["ownerId"]},
+                  file_id=record["fileId"], details=details, ip=ctx.ip)
+    except Exception as e:
+        log.error("ERROR writing file metadata: %s", e)
+        log_event("FileUploadFailed", actor,
+                  target={"id": record["ownerId"]},
+                  file_id=record["fileId"], status="FAILED",
+                  details={"error": str(e)}, ip=ctx.ip)
+        return response(500, {"error": "Failed to write metadata", "details": str(e)})
+    return None
+
+
+# ───────────────────────────────────────────
+# Deduplication
+# ───────────────────────────────────────────
+def _deduplicate(ctx, record, sha256):
+    """
+    Point the record at an existing verified blob and return the response, or
+    claim the hash for this upload (retargeting record to the blob key) and
+    return None so the normal upload flow continues.
+    """
+    owner_id = record["ownerId"]
+    blob_id = blobs.blob_id(sha256, owner_id)
+
+    blob = blobs.add_reference(blob_id)
+    if blob:
+        record.update({
+            "s3Key": blob["s3Key"],
+            "sha256": sha256,
+            "blobId": blob_id,
+            "status": "AVAILABLE",
+            "sizeBytes": blob.get("sizeBytes"),
+            "etag": blob.get("etag"),
+            "completedAt": record["uploadedAt"],
+        })
+        try:
+            aws.table("FILES_TABLE").put_item(Item={k: v for k, v in record.items() if v is not None})
+        except Exception:
+            blobs.release(blob_id)
+            raise
+        log_event("FileUploadDeduplicated", {"id": ctx.user_id, "email": ctx.email},
+                  target={"id": owner_id}, file_id=record["fileId"],
+                  details={"blobId": blob_id, "sizeBytes": blob.get("sizeBytes")}, ip=ctx.ip)
+        return response(200, {
+            "deduplicated": True,
+            "uploadUrl": None,
+            "fileKey": blob["s3Key"],
+            "fileId": record["fileId"],
+            "targetOwner": record["ownerEmail"],
+        })
+
+    s3_key = blobs.blob_key(sha256, owner_id, record["fileId"])
+    if blobs.claim(blob_id, sha256, s3_key):
+        record.update({"s3Key": s3_key, "sha256": sha256, "blobId": blob_id})
+    # else: the same content is still being uploaded elsewhere; store this copy normally
+    return None
+
+
+def _release_claim(record):
+    if record.get("blobId"):
+        try:
+            blobs.release(record["blobId"])
+        except Exception as e:
+            log.warning("⚠️ Failed to release blob claim %s: %s", record["blobId"], e)
+
+
+# ───────────────────────────────────────────
+# Multipart upload
+# ───────────────────────────────────────────
+def _plan_parts(file_size):
+    """Smallest part size (doubling from PART_SIZE) that fits in MAX_PARTS parts."""
+    part_size = PART_SIZE
+    while math.ceil(file_size / part_size) > MAX_PARTS:
+        part_size *= 2
+    return part_size, math.ceil(file_size / part_size)
+
+
+def _part_urls(s3_key, upload_id, part_numbers):
+    s3 = aws.client("s3")
+    return [
+        {
+            "partNumber": n,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": BUCKET_NAME, "Key": s3_key, "UploadId": upload_id, "PartNumber": n},
+                ExpiresIn=URL_EXPIRY_SECONDS,
+                HttpMethod="PUT",
+            ),
+        }
+        for n in part_numbers
+    ]
+
+
+def _initiate_multipart(ctx, record, content_type, file_size):
+    part_size, part_count = _plan_parts(file_size)
+
+    try:
+        params = {
+            "Bucket": BUCKET_NAME,
+            "Key": record["s3Key"],
+            "ContentType": content_type,
+            "ServerSideEncryption": "aws:kms",
+            "Metadata": {FILE_ID_METADATA: record["fileId"]},
+        }
+        if KMS_KEY_ID:
+            params["SSEKMSKeyId"] = KMS_KEY_ID
+        if record.get("blobId"):
+            params["Metadata"][BLOB_ID_METADATA] = record["blobId"]
+        upload_id = aws.client("s3").create_multipart_upload(**params)["UploadId"]
+        parts = _part_urls(record["s3Key"], upload_id, range(1, min(part_count, PRESIGN_BATCH) + 1))
+    except Exception as e:
+        log.error("ERROR initiating multipart upload: %s", e)
+        _release_claim(record)
+        return response(500, {"error": "Failed to initiate multipart upload", "details": str(e)})
+
+    record.update({
+        "uploadId": upload_id,
+        "fileSize": file_size,
+        "partSize": part_size,
+        "partCount": part_count,
+    })
+    error = _record_upload(ctx, record, details={"multipart": True, "partCount": part_count})
+    if error:
+        _abort_quietly(record["s3Key"], upload_id)
+        _release_claim(record)
+        return error
+
+    # Part PUTs carry no SSE headers: the encryption settings were fixed at initiate time.
+    return response(200, {
+        "fileId": record["fileId"],
+        "fileKey": record["s3Key"],
+        "targetOwner": record["ownerEmail"],
+        "uploadId": upload_id,
+        "partSize": part_size,
+        "partCount": part_count,
+        "parts": parts,
+    })
+
+
+def _load_pending_upload(event, ctx):
+    """Return (record, None) for a multipart upload the caller may finish, else (None, error)."""
+    file_id = (event.get("pathParameters") or {}).get("id")
+    if not file_id:
+        return None, response(400, {"error": "Missing file id"})
+
+    item = aws.table("FILES_TABLE").get_item(Key={"fileId": file_id}, ConsistentRead=True).get("Item")
+    if not item or not item.get("uploadId"):
+        return None, response(404, {"error": "No multipart upload in progress for this file"})
+    if item.get("uploadedById") != ctx.user_id and not ctx.is_admin:
+        log_event("UnauthorizedUploadAttempt", {"id": ctx.user_id, "email": ctx.email},
+                  target={"id": item.get("ownerId")}, file_id=file_id, status="DENIED",
+                  details={"reason": "Not the uploader", "route": event.get("routeKey")}, ip=ctx.ip)
+        return None, response(403, {"error": "You are not authorized to modify this upload"})
+    return item, None
+
+
+def _presign_parts(event, ctx):
+    try:
+        body = json.loads(event.get("body") or "{}")
+        part_numbers = sorted({int(n) for n in body["partNumbers"]})
+    except Exception as e:
+        return response(400, {"error": f"Invalid request body: {str(e)}"})
+
+    item, error = _load_pending_upload(event, ctx)
+    if error:
+        return error
+
+    part_count = int(item["partCount"])
+    if not part_numbers or part_numbers[0] < 1 or part_numbers[-1] > part_count:
+        return response(400, {"error": f"partNumbers must be between 1 and {part_count}"})
+    if len(part_numbers) > PRESIGN_BATCH:
+        return response(400, {"error": f"At most {PRESIGN_BATCH} parts per request"})
+
+    try:
+        parts = _part_urls(item["s3Key"], item["uploadId"], part_numbers)
+    except Exception as e:
+        log.error("ERROR presigning parts: %s", e)
+        return response(500, {"error": "Failed to generate part URLs", "details": str(e)})
+    return response(200, {"fileId": item["fileId"], "parts": parts})
+
+
+def _complete_multipart(event, ctx):
+    try:
+        body = json.loads(event.get("body") or "{}")
+        parts = sorted(
+            ({"PartNumber": int(p["partNumber"]), "ETag": str(p["etag"])} for p in body["parts"]),
+            key=lambda p: p["PartNumber"],
+        )
+    except Exception as e:
+        return response(400, {"error": f"Invalid request body: {str(e)}"})
+
+    item, error = _load_pending_upload(event, ctx)
+    if error:
+        return error
+
+    expected = list(range(1, int(item["partCount"]) + 1))
+    if [p["PartNumber"] for p in parts] != expected:
+        return response(400, {"error": f"Expected one ETag for each of parts 1..{len(expected)}"})
+
+    actor = {"id": ctx.user_id, "email": ctx.email}
+    try:
+        result = aws.client("s3").complete_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=item["s3Key"],
+            UploadId=item["uploadId"],
+            MultipartUpload={"Parts": parts},
+        )
+        aws.table("FILES_TABLE").update_item(
+            Key={"fileId": item["fileId"]},
+            UpdateExpression="SET #s = :available, completedAt = :now, updatedAt = :now, etag = :etag REMOVE uploadId",
+            ConditionExpression="uploadId = :upload_id",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":available": "AVAILABLE",
+                ":now": datetime.utcnow().isoformat(),
+                ":etag": result.get("ETag", "").strip('"'),
+                ":upload_id": item["uploadId"],
+            },
+        )
+    except Exception as e:
+        log.error("ERROR completing multipart upload: %s", e)
+        log_event("FileUploadFailed", actor, target={"id": item["ownerId"]},
+                  file_id=item["fileId"], status="FAILED",
+                  details={"error": str(e), "stage": "complete"}, ip=ctx.ip)
+        return response(500, {"error": "Failed to complete upload", "details": str(e)})
+
+    log_event("FileUploadCompleted", actor, target={"id": item["ownerId"]},
+              file_id=item["fileId"], details={"partCount": len(parts)}, ip=ctx.ip)
+    return response(200, {"fileId": item["fileId"], "fileKey": item["s3Key"], "status": "AVAILABLE"})
+
+
+def _abort_quietly(s3_key, upload_id):
+    s3 = aws.client("s3")
+    try:
+        s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=s3_key, UploadId=upload_id)
+    except s3.exceptions.NoSuchUpload:
+        pass
+    except Exception as e:
+        log.warning("⚠️ Failed to abort multipart upload %s: %s", upload_id, e)
+        return False
+    return True
+
+
+def _abort_multipart(event, ctx):
+    item, error = _load_pending_upload(event, ctx)
+    if error:
+        return error
+
+    if not _abort_quietly(item["s3Key"], item["uploadId"]):
+        return response(500, {"error": "Failed to abort upload"})
+
+    table = aws.table("FILES_TABLE")
+    try:
+        table.delete_item(
+            Key={"fileId": item["fileId"]},
+            ConditionExpression="uploadId = :upload_id AND #s = :pending",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={":upload_id": item["uploadId"], ":pending": "PENDING"},
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass  # completed or aborted concurrently
+    else:
+        _release_claim(item)
+        catalog.record_deletions([item])
+
+    log_event("FileUploadAborted", {"id": ctx.user_id, "email": ctx.email},
+              target={"id": item["ownerId"]}, file_id=item["fileId"], ip=ctx.ip)
+    return response(200, {"fileId": item["fileId"], "status": "ABORTED"})
+
+
 def response(status, body):
-    return {
-        "statusCode": status,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "POST,OPTIONS",
-        },
-        "body": json.dumps(body),
-    }
+    return _http_response(status, body, methods="POST,OPTIONS")
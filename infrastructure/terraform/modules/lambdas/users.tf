@@ -43,7 +43,11 @@ resource "aws_iam_role_policy" "admin_dynamodb_access" {
           "dynamodb:Query",
           "dynamodb:GetItem"
         ],
-        Resource = var.users_table_arn
+        Resource = [
+          var.users_table_arn,
+          "${var.users_table_arn}/index/role-index",
+          "${var.users_table_arn}/index/email-prefix-index"
+        ]
       }
     ]
   })
@@ -68,7 +72,8 @@ resource "aws_iam_policy" "admin_user_management" {
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
           "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:Scan",
+          "dynamodb:BatchGetItem"
         ],
         Resource = [
           var.users_table_arn,
@@ -123,11 +128,14 @@ resource "aws_lambda_function" "list_users" {
 
   filename         = "${path.module}/users.zip"
   source_code_hash = filebase64sha256("${path.module}/users/main.py")
+  layers           = [aws_lambda_layer_version.filevault_common.arn]
 
   environment {
-    variables = {
-      USERS_TABLE = var.users_table_name
-    }
+    variables = merge(local.logging_env, {
+      USERS_TABLE         = var.users_table_name
+      USERS_PAGE_SIZE     = "50"
+      USERS_MAX_PAGE_SIZE = "500"
+    })
   }
 }
 
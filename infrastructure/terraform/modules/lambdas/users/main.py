@@ -1,81 +1,77 @@
 import os
-import boto3
-from boto3.dynamodb.conditions import Key
-import json
-from decimal import Decimal
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["USERS_TABLE"])
+from filevault_common import RequestContext, aws, directory, instrumented, log, response
+from filevault_common.pagination import PaginationError, collect_page, decode_cursor, encode_cursor, parse_limit
 
-# helper to encode DynamoDB Decimal safely into JSON
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(o)
-        return super(DecimalEncoder, self).default(o)
+# Pagination settings
+DEFAULT_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "500"))
 
-def lambda_handler(event, context):
-    # Debug: print full event for inspection
-    print("DEBUG full event:", json.dumps(event, indent=2))
-
-    # --- Extract Claims ---
-    claims = {}
-    if "requestContext" in event and "authorizer" in event["requestContext"]:
-        auth_ctx = event["requestContext"]["authorizer"]
-        if "jwt" in auth_ctx:  # HTTP API format
-            claims = auth_ctx.get("jwt", {}).get("claims", {})
-        elif "claims" in auth_ctx:  # REST API format
-            claims = auth_ctx.get("claims", {})
+ROLES = {"Admin", "Editor", "Viewer"}
 
-    print("DEBUG authorizer claims:", json.dumps(claims, indent=2))
 
-    # --- Normalize Groups ---
-    groups_claim = claims.get("cognito:groups", [])
-    if isinstance(groups_claim, str):
-        cleaned = groups_claim.strip("[]").replace("'", "").replace('"', "")
-        groups = [g.strip() for g in cleaned.split(",") if g.strip()]
-    elif isinstance(groups_claim, list):
-        groups = groups_claim
-    else:
-        groups = []
-
-    print("DEBUG normalized groups:", groups)
+@instrumented
+def lambda_handler(event, context):
+    # --- Extract Claims ---
+    ctx = RequestContext.from_event(event)
+    log.debug("list users: user_id=%s, groups=%s", ctx.user_id, ctx.groups)
 
     # --- Authorization Guard ---
-    if "Admins" not in groups:
-        print("DEBUG forbidden request, groups:", groups)
-        return {
-            "statusCode": 403,
-            "body": json.dumps({"error": "Forbidden – Admins only", "debug_groups": groups})
-        }
+    if not ctx.is_admin:
+        return response(403, {"error": "Forbidden – Admins only"})
 
-    # --- Business Logic: List Users ---
+    # --- Query parameters ---
     params = event.get("queryStringParameters") or {}
     role = params.get("role")
-    print("DEBUG query role filter:", role)
+    email_prefix = (params.get("email") or "").strip().lower()
+    if role and role not in ROLES:
+        return response(400, {"error": f"Invalid role: {role}"})
+    try:
+        limit = parse_limit(params.get("limit"), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        cursor = decode_cursor(params.get("cursor"))
+    except PaginationError as e:
+        return response(400, {"error": str(e)})
+
+    # --- Business Logic: List Users ---
+    mode, operation, kwargs = _plan(role, email_prefix)
+    if cursor and cursor.get("mode") != mode:
+        return response(400, {"error": "Cursor does not belong to this listing"})
 
     try:
-        if role:
-            # Ensure the GSI exists before using role-index
-            resp = table.query(
-                IndexName="role-index",
-                KeyConditionExpression=Key("role").eq(role)
-            )
-            items = resp.get("Items", [])
-        else:
-            resp = table.scan()
-            items = resp.get("Items", [])
+        items, last_key = collect_page(operation, kwargs, limit, (cursor or {}).get("lek"))
+    except Exception as e:
+        log.error("ERROR listing users: %s", e)
+        return response(500, {"error": "Internal server error", "details": str(e)})
 
-        print("DEBUG DynamoDB items:", items)
+    log.debug("listed %s users (mode=%s, more=%s)", len(items), mode, last_key is not None)
+    return response(200, {
+        "users": items,
+        "count": len(items),
+        "nextCursor": encode_cursor({"mode": mode, "lek": last_key}) if last_key else None,
+    })
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(items, cls=DecimalEncoder)
-        }
 
-    except Exception as e:
-        print("ERROR listing users:", str(e))
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "Internal server error", "details": str(e)})
-        }
+def _plan(role, email_prefix):
+    """Pick the cheapest access path: email-prefix-index, role-index, or a projected scan."""
+    table = aws.table("USERS_TABLE")
+    projection, names = directory.list_projection()
+    kwargs = {"ProjectionExpression": projection, "ExpressionAttributeNames": names}
+
+    if email_prefix:
+        kwargs["IndexName"] = "email-prefix-index"
+        kwargs["KeyConditionExpression"] = (
+            aws.key("emailInitial").eq(email_prefix[0])
+            & aws.key("emailLower").begins_with(email_prefix)
+        )
+        if role:
+            kwargs["FilterExpression"] = aws.attr("role").eq(role)
+        return "email", table.query, kwargs
+
+    if role:
+        # Newest users first
+        kwargs["IndexName"] = "role-index"
+        kwargs["KeyConditionExpression"] = aws.key("role").eq(role)
+        kwargs["ScanIndexForward"] = False
+        return "role", table.query, kwargs
+
+    return "scan", table.scan, kwargs
@@ -76,16 +76,32 @@ variable "files_table_arn" {
   type        = string
 }
 
+variable "blobs_table_name" {
+  description = "Name of the DynamoDB FileVaultBlobs deduplication index"
+  type        = string
+}
+
+variable "blobs_table_arn" {
+  description = "ARN of the DynamoDB FileVaultBlobs deduplication index"
+  type        = string
+}
+
+variable "dedup_scope" {
+  description = "Upload deduplication scope: \"owner\" (per user) or \"global\" (across users)"
+  type        = string
+  default     = "owner"
+}
+
 # ───────────────────────────────────────────
 # Audit Logging Tables (General + Deletion)
 # ───────────────────────────────────────────
 variable "general_audit_table_name" {
-  description = "Name of the general FileVaultAuditLog table for standard operations"
+  description = "Name of the general FileVaultAuditEvents table for standard operations"
   type        = string
 }
 
 variable "general_audit_table_arn" {
-  description = "ARN of the general FileVaultAuditLog table"
+  description = "ARN of the general FileVaultAuditEvents table"
   type        = string
 }
 
@@ -98,3 +114,40 @@ variable "deletion_audit_table_arn" {
   description = "ARN of the FileVaultDeletionAuditLog table"
   type        = string
 }
+
+variable "general_audit_stream_arn" {
+  description = "Stream ARN of the general audit table (TTL deletions are archived)"
+  type        = string
+}
+
+variable "deletion_audit_stream_arn" {
+  description = "Stream ARN of the FileVaultDeletionAuditLog table (TTL deletions are archived)"
+  type        = string
+}
+
+# ───────────────────────────────────────────
+# Logging (filevault_common.log)
+# ───────────────────────────────────────────
+variable "log_level" {
+  description = "Lowest level the functions log: DEBUG, INFO, WARNING or ERROR"
+  type        = string
+  default     = "INFO"
+}
+
+variable "log_debug_sample_rate" {
+  description = "Fraction of invocations (0-1) that log at DEBUG regardless of log_level"
+  type        = number
+  default     = 0
+}
+
+variable "log_sample_rates" {
+  description = "Per-route DEBUG sample rates overriding log_debug_sample_rate, e.g. \"GET /api/files=0.01,PATCH /api/users/{id}/delegate=1\""
+  type        = string
+  default     = ""
+}
+
+variable "sync_tombstone_days" {
+  description = "Days deletion tombstones are kept in FileVaultFiles; delta syncs older than this fall back to a full listing"
+  type        = number
+  default     = 30
+}
@@ -1,6 +1,88 @@
 #############################################
-# DynamoDB - General Audit Log Table
+# DynamoDB - General Audit Log Table (sharded)
 #############################################
+# eventShard = "<eventType>#<shard>" spreads each event type over
+# AUDIT_SHARDS partitions, and eventKey = "<timestamp>#<auditId>" keeps two
+# events with the same timestamp from overwriting each other. See
+# filevault_common.audit for how writers and readers use the keys.
+resource "aws_dynamodb_table" "audit_events" {
+  name         = "FileVaultAuditEvents"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "eventShard"
+  range_key    = "eventKey"
+
+  # TTL deletions flow to the audit_archive Lambda (audit/ in the files bucket)
+  stream_enabled   = true
+  stream_view_type = "OLD_IMAGE"
+
+  # --- Table Attributes (must include all used in GSIs)
+  attribute {
+    name = "eventShard"
+    type = "S"
+  }
+
+  attribute {
+    name = "eventKey"
+    type = "S"
+  }
+
+  attribute {
+    name = "actorUserId"
+    type = "S"
+  }
+
+  attribute {
+    name = "targetUserId"
+    type = "S"
+  }
+
+  # --- Global Secondary Indexes
+  global_secondary_index {
+    name            = "actorUserId-index"
+    hash_key        = "actorUserId"
+    range_key       = "eventKey"
+    projection_type = "ALL"
+  }
+
+  global_secondary_index {
+    name            = "targetUserId-index"
+    hash_key        = "targetUserId"
+    range_key       = "eventKey"
+    projection_type = "ALL"
+  }
+
+  # --- TTL Configuration
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Project = "SecureFileVault"
+    Purpose = "GeneralAuditLogging"
+  }
+}
+
+output "general_audit_table_name" {
+  value = aws_dynamodb_table.audit_events.name
+}
+
+output "general_audit_table_arn" {
+  value = aws_dynamodb_table.audit_events.arn
+}
+
+output "general_audit_stream_arn" {
+  value = aws_dynamodb_table.audit_events.stream_arn
+}
+
+#############################################
+# DynamoDB - Legacy General Audit Log Table
+#############################################
+# Keyed on (eventType, timestamp): one hot partition per event type, and
+# same-timestamp events overwrite each other. Nothing writes here any more;
+# copy it with `migrate.py audit-shard-keys`, then remove it (its items
+# expire through TTL within 90 days anyway). It has no archive stream: the
+# copies in FileVaultAuditEvents are archived when they expire.
 resource "aws_dynamodb_table" "general_audit_log" {
   name         = "FileVaultAuditLog"
   billing_mode = "PAY_PER_REQUEST"
@@ -55,14 +137,10 @@ resource "aws_dynamodb_table" "general_audit_log" {
   }
 }
 
-output "general_audit_table_name" {
+output "legacy_audit_table_name" {
   value = aws_dynamodb_table.general_audit_log.name
 }
 
-output "general_audit_table_arn" {
-  value = aws_dynamodb_table.general_audit_log.arn
-}
-
 ###########################################################
 # DynamoDB - Deletion Audit Log Table (for admin deletes)
 ###########################################################
@@ -71,6 +149,10 @@ resource "aws_dynamodb_table" "deletion_audit_log" {
   billing_mode = "PAY_PER_REQUEST"
   hash_key     = "auditId"
 
+  # TTL deletions flow to the audit_archive Lambda (audit/ in the files bucket)
+  stream_enabled   = true
+  stream_view_type = "OLD_IMAGE"
+
   attribute {
     name = "auditId"
     type = "S"
@@ -94,3 +176,7 @@ output "deletion_audit_table_name" {
 output "deletion_audit_table_arn" {
   value = aws_dynamodb_table.deletion_audit_log.arn
 }
+
+output "deletion_audit_stream_arn" {
+  value = aws_dynamodb_table.deletion_audit_log.stream_arn
+}
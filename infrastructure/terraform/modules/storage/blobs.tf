@@ -0,0 +1,26 @@
+# Content-addressed blob index used for upload deduplication.
+# One item per stored content hash; refCount tracks the FileVaultFiles
+# records pointing at the blob's S3 object.
+resource "aws_dynamodb_table" "filevault_blobs" {
+  name         = "FileVaultBlobs"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "blobId"
+
+  attribute {
+    name = "blobId"
+    type = "S"
+  }
+
+  tags = {
+    Project = var.project_name
+    Purpose = "FileVault content deduplication index"
+  }
+}
+
+output "filevault_blobs_name" {
+  value = aws_dynamodb_table.filevault_blobs.name
+}
+
+output "filevault_blobs_arn" {
+  value = aws_dynamodb_table.filevault_blobs.arn
+}
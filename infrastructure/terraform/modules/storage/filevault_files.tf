@@ -25,6 +25,16 @@ resource "aws_dynamodb_table" "filevault_files" {
     type = "S"
   }
 
+  attribute {
+    name = "uploadedAt"
+    type = "S"
+  }
+
+  attribute {
+    name = "updatedAt"
+    type = "S"
+  }
+
   # Existing index: query by owner email
   global_secondary_index {
     name            = "ownerEmail-index"
@@ -39,6 +49,27 @@ resource "aws_dynamodb_table" "filevault_files" {
     projection_type = "ALL"
   }
 
+  # One owner's files by upload date: backs the file listing's key-range
+  # filters and sort order. Projects filevault_common.catalog.LIST_ATTRIBUTES
+  # plus fileNameLower for filename-prefix search.
+  global_secondary_index {
+    name               = "ownerId-uploadedAt-index"
+    hash_key           = "ownerId"
+    range_key          = "uploadedAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["ownerEmail", "fileName", "fileNameLower", "s3Key", "status", "sizeBytes", "uploadedBy"]
+  }
+
+  # One owner's changes by updatedAt, deletion tombstones included: backs
+  # delta sync (GET /api/files?since=...). Projects catalog.SYNC_ATTRIBUTES.
+  global_secondary_index {
+    name               = "ownerId-updatedAt-index"
+    hash_key           = "ownerId"
+    range_key          = "updatedAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["ownerEmail", "fileName", "s3Key", "uploadedAt", "status", "sizeBytes", "uploadedBy", "deletedFileId"]
+  }
+
   # Optional: keep your delegated editor index if you use it elsewhere
   global_secondary_index {
     name            = "editor-index"
@@ -46,6 +77,12 @@ resource "aws_dynamodb_table" "filevault_files" {
     projection_type = "ALL"
   }
 
+  # Expires deletion tombstones (SYNC_TOMBSTONE_DAYS)
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
   tags = {
     Project = var.project_name
     Purpose = "FileVault file ownership metadata"
@@ -50,7 +50,9 @@ resource "aws_s3_bucket_cors_configuration" "filevault" {
   }
 }
 
-# Basic bucket policy to deny unencrypted uploads
+# Basic bucket policy to deny non-KMS uploads.
+# IfExists: UploadPart requests carry no SSE header (the encryption is fixed by
+# CreateMultipartUpload), and default bucket encryption covers a missing header.
 resource "aws_s3_bucket_policy" "filevault" {
   bucket = aws_s3_bucket.filevault.id
   policy = jsonencode({
@@ -63,7 +65,7 @@ resource "aws_s3_bucket_policy" "filevault" {
         Action    = "s3:PutObject"
         Resource  = "${aws_s3_bucket.filevault.arn}/*"
         Condition = {
-          StringNotEquals = {
+          StringNotEqualsIfExists = {
             "s3:x-amz-server-side-encryption" = "aws:kms"
           }
         }
@@ -83,12 +85,13 @@ resource "aws_s3_bucket_versioning" "filevault" {
 resource "aws_s3_bucket_lifecycle_configuration" "filevault" {
   bucket = aws_s3_bucket.filevault.id
 
+  # User files (uploads/ holds every object the file APIs write)
   rule {
     id     = "archive-30-days"
     status = "Enabled"
 
     filter {
-      prefix = "" # apply to all objects in the bucket
+      prefix = "uploads/"
     }
 
     transition {
@@ -99,5 +102,53 @@ resource "aws_s3_bucket_lifecycle_configuration" "filevault" {
     expiration {
       days = 180
     }
+
+    # Parts of abandoned multipart uploads are billed until aborted
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 7
+    }
+  }
+
+  # Audit exports (GET /api/audit/exports) are handed out as presigned links
+  rule {
+    id     = "expire-exports"
+    status = "Enabled"
+
+    filter {
+      prefix = "exports/"
+    }
+
+    expiration {
+      days = var.export_retention_days
+    }
+  }
+
+  # Long-term audit archive written by the audit_archive Lambda; partitions
+  # are read by date, so they can go to Glacier Instant Retrieval
+  rule {
+    id     = "audit-archive"
+    status = "Enabled"
+
+    filter {
+      prefix = "audit/"
+    }
+
+    transition {
+      days          = 30
+      storage_class = "STANDARD_IA"
+    }
+
+    transition {
+      days          = 180
+      storage_class = "GLACIER_IR"
+    }
+
+    expiration {
+      days = var.audit_archive_retention_days
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 30
+    }
   }
 }
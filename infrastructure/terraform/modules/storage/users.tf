@@ -15,12 +15,51 @@ resource "aws_dynamodb_table" "filevault_users" {
     type = "S"
   }
 
+  # For the admin user directory (see filevault_common/directory.py)
+  attribute {
+    name = "role"
+    type = "S"
+  }
+
+  attribute {
+    name = "createdAt"
+    type = "S"
+  }
+
+  attribute {
+    name = "emailInitial"
+    type = "S"
+  }
+
+  attribute {
+    name = "emailLower"
+    type = "S"
+  }
+
   global_secondary_index {
     name            = "delegatedEditor-index"
     hash_key        = "delegatedEditor"
     projection_type = "ALL"
   }
 
+  # Users per role, newest first
+  global_secondary_index {
+    name               = "role-index"
+    hash_key           = "role"
+    range_key          = "createdAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["email", "name", "fullName", "delegatedEditor", "lastLogin", "status"]
+  }
+
+  # Email prefix lookup: partitioned by first letter, begins_with on the rest
+  global_secondary_index {
+    name               = "email-prefix-index"
+    hash_key           = "emailInitial"
+    range_key          = "emailLower"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["email", "name", "fullName", "role", "delegatedEditor", "createdAt", "lastLogin", "status"]
+  }
+
   tags = {
     Project = "SecureFileVault"
     Purpose = "UserManagement"
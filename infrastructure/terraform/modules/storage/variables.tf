@@ -7,3 +7,15 @@ variable "env" {
   type        = string
   default     = "dev"
 }
+
+variable "audit_archive_retention_days" {
+  description = "Days archived audit records are kept under audit/ in the files bucket"
+  type        = number
+  default     = 2555 # 7 years
+}
+
+variable "export_retention_days" {
+  description = "Days audit exports are kept under exports/ in the files bucket"
+  type        = number
+  default     = 7
+}